@@ -0,0 +1,136 @@
+"""Query plans and timings of the read endpoints, with and without the transaction indexes.
+
+Usage: python -m benchmarks.query_plans [--transactions=N] [--accounts=N]
+
+Builds two throwaway SQLite databases with the same synthetic data - one
+with the indexes declared on the models dropped - runs the services behind
+the read endpoints against both, and prints `EXPLAIN QUERY PLAN` for every
+statement they issue together with the time taken.
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from sqlalchemy import event
+from florin import db
+from florin.constants import TBD_CATEGORY_ID
+from florin.services import accounts, charts, transactions
+
+
+class BenchmarkApp(object):
+    pass
+
+
+ENDPOINTS = [
+    ('GET /api/accounts', lambda app: accounts.get(app)),
+    ('GET /api/accounts/1', lambda app: transactions.get(app, '1', {})),
+    ('GET /api/accounts/_all', lambda app: transactions.get(app, '_all', {})),
+    ('GET /api/accounts/1?onlyUncategorized=true',
+     lambda app: transactions.get(app, '1', {'onlyUncategorized': 'true'})),
+    ('GET /api/accounts/_all/categorySummary',
+     lambda app: accounts.get_summary(app, '_all', {'startDate': '2016-01-01', 'endDate': '2016-03-31'})),
+    ('GET /api/charts/accountBalances',
+     lambda app: charts.get_account_balance_chart_data(app, {'startDate': '2016-01-01', 'endDate': '2016-12-31'})),
+]
+
+
+def populate(dbfile, num_accounts, num_transactions):
+    engine = db.get_engine(dbfile)
+    db.Base.metadata.create_all(engine)
+    categories = [dict(id=1, name='Expense', parent_id=None, type='expense'),
+                  dict(id=2, name='Income', parent_id=None, type='income'),
+                  dict(id=TBD_CATEGORY_ID, name='TBD', parent_id=None, type='expense')]
+    categories.extend(dict(id=i, name='Expense {}'.format(i), parent_id=1, type='expense') for i in xrange(3, 30))
+    start_date = datetime.date(2010, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(db.AccountType.__table__.insert(), [{'name': 'chequing'}])
+        conn.execute(db.Category.__table__.insert(), categories)
+        conn.execute(db.Account.__table__.insert(), [
+            dict(id=i, institution='Bank {}'.format(i), name='Account', type='chequing', deleted=False)
+            for i in xrange(1, num_accounts + 1)
+        ])
+        conn.execute(db.AccountBalance.__table__.insert(), [
+            dict(account_id=i, date=datetime.date(2016, month, 1), balance=random.uniform(0, 10000))
+            for i in xrange(1, num_accounts + 1) for month in xrange(1, 13)
+        ])
+        conn.execute(db.Transaction.__table__.insert(), [
+            dict(date=start_date + datetime.timedelta(days=random.randint(0, 365 * 8)),
+                 info='', payee='Payee {}'.format(random.randint(0, 500)), memo='',
+                 amount=random.uniform(-200, 200),
+                 category_id=random.choice(categories)['id'],
+                 transaction_type='debit',
+                 account_id=random.randint(1, num_accounts),
+                 checksum=uuid.uuid4().hex,
+                 deleted=random.random() < 0.05)
+            for _ in xrange(num_transactions)
+        ])
+    return engine
+
+
+def drop_indexes(engine):
+    for index in db.Transaction.__table__.indexes:
+        index.drop(engine)
+
+
+def run(dbfile, label):
+    app = BenchmarkApp()
+    db.init(app, dbfile)
+    engine = app.session.get_bind()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        # the plan is the same for every parameter set of an executemany
+        statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    print('=== {} ==='.format(label))
+    for name, endpoint in ENDPOINTS:
+        del statements[:]
+        started_at = time.time()
+        endpoint(app)
+        elapsed = time.time() - started_at
+        print('{} ({:.1f} ms)'.format(name, elapsed * 1000))
+        conn = engine.raw_connection()
+        for statement, parameters in statements:
+            plan = conn.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            print('    ' + ' '.join(statement.split())[:100])
+            for row in plan:
+                print('        ' + row[-1])
+        conn.close()
+        app.session.expunge_all()
+    event.remove(engine, 'before_cursor_execute', capture)
+    print('')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transactions', type=int, default=200000)
+    parser.add_argument('--accounts', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        without_indexes = os.path.join(workdir, 'without_indexes.sqlite')
+        with_indexes = os.path.join(workdir, 'with_indexes.sqlite')
+        random.seed(0)
+        engine = populate(without_indexes, args.accounts, args.transactions)
+        drop_indexes(engine)
+        # in WAL mode the latest pages are in the -wal file; move them to the database file before copying it
+        engine.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        engine.dispose()
+        shutil.copy(without_indexes, with_indexes)
+        for index in db.Transaction.__table__.indexes:
+            index.create(db.get_engine(with_indexes))
+
+        run(without_indexes, 'without indexes')
+        run(with_indexes, 'with indexes')
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Listing rows as ORM instances with `to_dict` versus through read models.
+
+Usage: python -m benchmarks.read_models [--transactions=N] [--accounts=N] [--repeat=N]
+
+Builds a throwaway SQLite database with synthetic data, reads the
+transactions, accounts and account balances the list endpoints return both
+ways, checks that both give the same dicts and prints the best time of each.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from sqlalchemy import not_
+from sqlalchemy.orm import subqueryload
+from florin import db
+from florin.db import Account, Transaction, get_read_model
+from florin.services import accounts
+from .query_plans import populate
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in xrange(repeat):
+        started = time.time()
+        fn()
+        timings.append(time.time() - started)
+    return min(timings)
+
+
+def _list_transactions_orm(session, per_page):
+    query = session.query(Transaction).filter(not_(Transaction.deleted)).order_by(Transaction.date.desc())
+    return [transaction.to_dict() for transaction in query.limit(per_page)]
+
+
+def _list_transactions(session, per_page):
+    read_model = get_read_model(Transaction)
+    query = read_model.query(session).filter(not_(Transaction.deleted)).order_by(Transaction.date.desc())
+    return [read_model.to_dict(row) for row in read_model.all(session, query.limit(per_page))]
+
+
+def _list_balances_orm(session):
+    rows = session.query(Account).filter(not_(Account.deleted)).options(subqueryload(Account.balances)).all()
+    counts = Account.get_uncategorized_transaction_counts([account.id for account in rows])
+    return [
+        account.to_dict(extra_fields=['balances'], overrides={'uncategorized_transaction_count': counts[account.id]})
+        for account in rows
+    ]
+
+
+def _list_balances(session):
+    balances = accounts._get_balances_by_account(session)
+    rows = accounts.ACCOUNT_READ_MODEL.all(session, accounts.query_rows(session))
+    return [dict(account, balances=balances[account['id']]) for account in accounts.to_dicts(rows)]
+
+
+def _balance_dicts(accounts):
+    return [dict(account, balances=[balance if isinstance(balance, dict) else balance.to_dict()
+                                    for balance in account['balances']])
+            for account in accounts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--transactions', type=int, default=200000)
+    parser.add_argument('--accounts', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        engine = populate(os.path.join(tmpdir, 'florin.sqlite'), args.accounts, args.transactions)
+        session = db.make_session(engine)
+        db.Base.session = session
+
+        def clear(fn):
+            def run():
+                session.expunge_all()
+                return fn()
+            return run
+
+        cases = [
+            ('transactions, 100 per page', lambda: _list_transactions_orm(session, 100),
+             lambda: _list_transactions(session, 100), None),
+            ('transactions, 10000 per page', lambda: _list_transactions_orm(session, 10000),
+             lambda: _list_transactions(session, 10000), None),
+            ('accounts with balances', lambda: _list_balances_orm(session),
+             lambda: _list_balances(session), _balance_dicts),
+        ]
+        for label, orm, read_model, normalize in cases:
+            normalize = normalize or (lambda rows: rows)
+            assert normalize(clear(orm)()) == normalize(read_model())
+            orm_time = best_of(args.repeat, clear(orm))
+            read_model_time = best_of(args.repeat, clear(read_model))
+            print '{}: ORM {:.4f}s, read model {:.4f}s ({:.1f}x)'.format(
+                label, orm_time, read_model_time, orm_time / read_model_time)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""JSON serialization of a large transaction page.
+
+Usage: python -m benchmarks.serialization [--transactions=N] [--repeat=N]
+
+Serializes the response of `GET /api/accounts/<id>` for N synthetic
+transactions with `flask.jsonify` and with the app's own serializer, checks
+that both produce the same bytes and prints the best time of each, pretty
+printed and compact (X-Requested-With: XMLHttpRequest).
+"""
+import argparse
+import datetime
+import random
+import time
+import uuid
+import flask
+from florin import db
+from florin.app import app, make_json_response
+from florin.constants import TBD_CATEGORY_ID
+
+
+def make_response_data(num_transactions):
+    start = datetime.date(2016, 1, 1)
+    transactions = [
+        db.Transaction(id=i + 1,
+                       date=start + datetime.timedelta(days=random.randint(0, 365)),
+                       info=None,
+                       payee=uuid.uuid4().hex[:12].upper(),
+                       memo=u'MEMO {}'.format(i),
+                       amount=round(random.gauss(-50, 55), 2),
+                       transaction_type=random.choice(['debit', 'credit']),
+                       category_id=TBD_CATEGORY_ID,
+                       checksum=uuid.uuid4().hex)
+        for i in xrange(num_transactions)
+    ]
+    return {
+        'transactions': [transaction.to_dict() for transaction in transactions],
+        'total': num_transactions,
+    }
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in xrange(repeat):
+        started = time.time()
+        fn()
+        timings.append(time.time() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--transactions', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    data = make_response_data(args.transactions)
+    for label, headers in [('pretty printed', {}), ('compact', {'X-Requested-With': 'XMLHttpRequest'})]:
+        with app.test_request_context(headers=headers):
+            assert flask.jsonify(data).get_data() == make_json_response(data).get_data()
+            stock = best_of(args.repeat, lambda: flask.jsonify(data))
+            ours = best_of(args.repeat, lambda: make_json_response(data))
+        print '{} transactions, {}: flask.jsonify {:.3f}s, florin {:.3f}s ({:.1f}x)'.format(
+            args.transactions, label, stock, ours, stock / ours)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,27 @@
 import base64
+import collections
+import hashlib
+import itertools
 import os
 import functools
 import flask
 import logging
 import datetime
-from decimal import Decimal
 from flask_cors import CORS
-from flask.json import JSONEncoder
-from . import db
-from .services import charts, transactions, exceptions, accounts, categories, uploads
+from . import db, serialization
+from .serialization import MyJSONEncoder
+from .cache import LRUCache
+from .services import (
+    cache_versions, charts, exports, transactions, exceptions, accounts, categories, uploads, rules, jobs)
 from StringIO import StringIO
 
 
 logging.basicConfig(level='DEBUG')
 
 
+RESPONSE_CACHE_SIZE = 256
+
+
 def handle_exceptions(fn):
     @functools.wraps(fn)
     def wrapper(*args, **kwargs):
@@ -30,35 +37,112 @@ def handle_exceptions(fn):
     return wrapper
 
 
+def make_json_response(data):
+    """Same response as `flask.jsonify(data)`, serialized by `app.json_dumps`.
+
+    When a top level value of `data` is a `serialization.Stream` the response
+    is streamed instead, with the request context kept alive until it is sent.
+    """
+    indent = None
+    separators = (',', ':')
+    if app.config['JSONIFY_PRETTYPRINT_REGULAR'] and not flask.request.is_xhr:
+        indent = 2
+        separators = (', ', ': ')
+
+    kwargs = dict(default=serialization.make_default(app.json_encoder().default),
+                  indent=indent,
+                  separators=separators,
+                  sort_keys=app.config['JSON_SORT_KEYS'],
+                  ensure_ascii=app.config['JSON_AS_ASCII'])
+    if isinstance(data, dict) and any(isinstance(value, serialization.Stream) for value in data.itervalues()):
+        body = itertools.chain(serialization.iterdumps(data, **kwargs), ['\n'])
+        return app.response_class(flask.stream_with_context(body), mimetype=app.config['JSONIFY_MIMETYPE'])
+
+    body = app.json_dumps(data, **kwargs)
+    return app.response_class((body, '\n'), mimetype=app.config['JSONIFY_MIMETYPE'])
+
+
 def jsonify(success_status_code=200):
     def decorator(fn):
         @functools.wraps(fn)
         def wrapper(*args, **kwargs):
             response = fn(*args, **kwargs)
-            return flask.jsonify(response), success_status_code
+            return make_json_response(response), success_status_code
         return wrapper
     return decorator
 
 
-class MyJSONEncoder(JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return str(round(obj, 2))
-        if isinstance(obj, float):
-            return str(round(Decimal(str(obj)), 2))
-        if isinstance(obj, datetime.date):
-            return obj.strftime('%Y-%m-%d')
-        if isinstance(obj, db.ToDictMixin):
-            return obj.to_dict()
+CachedResponse = collections.namedtuple('CachedResponse', ['etag', 'last_modified', 'data', 'mimetype'])
+
+response_cache = LRUCache(RESPONSE_CACHE_SIZE)
+
 
-        return super(MyJSONEncoder, self).default(obj)
+def cached(*dependencies):
+    """Serve a GET route from memory until the data it depends on changes.
+
+    `dependencies` are passed to `cache_versions.get_generation`. Responses are
+    keyed on the route and its normalized arguments and carry an ETag derived
+    from the data generation, so a matching If-None-Match costs one query.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            request = flask.request
+            # `make_json_response` pretty-prints for all but XHR requests
+            key = (request.endpoint,
+                   tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))),
+                   request.is_xhr)
+            generation = cache_versions.get_generation(app.session, dependencies, kwargs.get('account_id'))
+            etag = hashlib.sha1(repr((key, generation))).hexdigest()
+            if etag in request.if_none_match:
+                response = flask.Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            entry = response_cache.get(key)
+            if entry is None or entry.etag != etag:
+                response = flask.make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if response.is_streamed:
+                    # too big to keep; still good for a 304 next time
+                    response.set_etag(etag)
+                    response.cache_control.no_cache = True
+                    return response
+                entry = CachedResponse(etag=etag,
+                                       last_modified=datetime.datetime.utcnow().replace(microsecond=0),
+                                       data=response.get_data(),
+                                       mimetype=response.mimetype)
+                response_cache.put(key, entry)
+
+            response = flask.Response(entry.data, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+            response.last_modified = entry.last_modified
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
 
 
 def create_app():
     app = flask.Flask(__name__)
     app.json_encoder = MyJSONEncoder
+    # anything with the signature of `json.dumps`, `flask.json.dumps` for one
+    app.json_dumps = serialization.dumps
     CORS(app)
-    db.init(app, os.getenv('DBFILE'))
+    # forked before anything opens a connection or starts a thread
+    uploads.start_parse_pool(int(os.getenv('PARSE_PROCESSES', uploads.PARSE_PROCESSES)))
+    dbfile = os.getenv('DBFILE')
+    db.init(app, dbfile)
+    if dbfile and dbfile != ':memory:':
+        # imports run in the background; the workers of an in-memory database would each see a database of their own
+        jobs.start(app, {uploads.IMPORT_JOB: uploads.run_import_job}, int(os.getenv('JOB_WORKERS', jobs.WORKERS)))
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        app.session.remove()
+
     return app
 
 
@@ -66,19 +150,28 @@ app = create_app()
 
 
 @app.route('/api/import', methods=['POST'])
-@jsonify()
+@jsonify(success_status_code=202)
 @handle_exceptions
 def import_statement():
-    request_json = flask.request.json
-    if not request_json.get('account_id'):
+    request = flask.request
+    if request.mimetype == 'application/json':
+        # the statement base64 encoded in {"account_id": ..., "data": ...}
+        params = request.json
+        data = params.get('data')
+        if data:
+            data = base64.b64decode(data)
+    else:
+        # the statement as is in the body, e.g. POST /api/import?account_id=1 with application/octet-stream
+        params = request.args
+        data = request.get_data()
+    if not params.get('account_id'):
         raise exceptions.InvalidRequest("account_id is required")
-    if not request_json.get('data'):
+    if not data:
         raise exceptions.InvalidRequest("data is required")
 
-    file_storage = StringIO(base64.b64decode(request_json.get('data')))
-    response = uploads.upload(app, {'statement.ofx': file_storage})
+    response = uploads.upload(app, {'statement.ofx': StringIO(data)})
     file_upload_id = response['id']
-    response = uploads.link(app, file_upload_id, {'accountId': request_json.get('account_id')})
+    response = uploads.link(app, file_upload_id, {'accountId': params.get('account_id')})
     return response
 
 
@@ -90,13 +183,21 @@ def upload_files():
 
 
 @app.route('/api/fileUploads/<file_upload_id>/linkAccount', methods=['POST'])
-@jsonify()
+@jsonify(success_status_code=202)
 @handle_exceptions
 def link_file_upload_with_account(file_upload_id):
     return uploads.link(app, file_upload_id, flask.request.json)
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jsonify()
+@handle_exceptions
+def get_job(job_id):
+    return jobs.get(app, job_id)
+
+
 @app.route('/api/accounts', methods=['GET'])
+@cached('accounts')
 @jsonify()
 @handle_exceptions
 def get_accounts():
@@ -125,26 +226,75 @@ def delete_accounts(account_id):
 
 
 @app.route('/api/categories', methods=['GET'])
-@jsonify()
 @handle_exceptions
 def get_categories():
-    return categories.get(app)
+    tree = categories.get_tree(app.session)
+    response = flask.jsonify({'categories': tree.categories})
+    response.set_etag(categories.get_etag(tree))
+    response.cache_control.no_cache = True
+    return response.make_conditional(flask.request)
 
 
 @app.route('/api/accounts/<account_id>', methods=['GET'])
+@cached('account')
 @jsonify()
 @handle_exceptions
 def get_transactions(account_id):
     return transactions.get(app, account_id, flask.request.args)
 
 
+@app.route('/api/accounts/<account_id>/transactions/export', methods=['GET'])
+@handle_exceptions
+def export_transactions(account_id):
+    export = exports.export(app, account_id, flask.request.args)
+    response = app.response_class(flask.stream_with_context(export.chunks), mimetype=export.mimetype)
+    response.headers['Content-Disposition'] = 'attachment; filename={}'.format(export.filename)
+    return response
+
+
 @app.route('/api/accounts/<account_id>/categorySummary', methods=['GET'])
+@cached('accounts', 'categories')
 @jsonify()
 @handle_exceptions
 def get_account_summary(account_id):
     return accounts.get_summary(app, account_id, flask.request.args)
 
 
+@app.route('/api/rules', methods=['GET'])
+@jsonify()
+@handle_exceptions
+def get_rules():
+    return rules.get(app)
+
+
+@app.route('/api/rules', methods=['POST'])
+@jsonify(success_status_code=201)
+@handle_exceptions
+def post_rules():
+    return rules.post(app, flask.request.json)
+
+
+@app.route('/api/rules/<rule_id>', methods=['DELETE'])
+@jsonify()
+@handle_exceptions
+def delete_rule(rule_id):
+    return rules.delete(app, rule_id)
+
+
+@app.route('/api/rules/apply', methods=['POST'])
+@jsonify()
+@handle_exceptions
+def apply_rules():
+    return rules.apply(app, flask.request.get_json(silent=True))
+
+
+@app.route('/api/transactions', methods=['PATCH'])
+@jsonify()
+@handle_exceptions
+def bulk_update_transactions():
+    return transactions.bulk_update(app, flask.request.json)
+
+
 @app.route('/api/transactions/<transaction_id>', methods=['PUT'])
 @jsonify()
 @handle_exceptions
@@ -160,6 +310,7 @@ def delete_transaction(transaction_id):
 
 
 @app.route('/api/accounts/<account_id>/balances', methods=['GET'])
+@cached('accounts')
 @jsonify()
 @handle_exceptions
 def get_account_balances(account_id):
@@ -181,6 +332,7 @@ def delete_account_balances(account_id, id):
 
 
 @app.route('/api/charts/accountBalances', methods=['GET'])
+@cached('accounts')
 @jsonify()
 @handle_exceptions
 def get_account_balance_chart_data():
@@ -188,6 +340,7 @@ def get_account_balance_chart_data():
 
 
 @app.route('/api/accountTypes', methods=['GET'])
+@cached('account_types')
 @jsonify()
 @handle_exceptions
 def get_account_types():
@@ -1,4 +1,8 @@
 from .base import init, get_engine, make_session  # noqa
 from .base import ToDictMixin  # noqa
 from .base import Base, Account, AccountBalance, AccountType, Transaction, Category, FileUpload  # noqa
-from .base import db_transaction  # noqa
+from .base import CategorizationRule, Job  # noqa
+from .base import ZlibReader  # noqa
+from .base import DailyBalance, DailyBalanceChange, CategoryMonthlyTotal, CacheVersion, BulkAccountWrite  # noqa
+from .base import db_transaction, bulk_account_write  # noqa
+from .read_models import ReadModel, get_read_model  # noqa
@@ -2,12 +2,19 @@ import contextlib
 import hashlib
 import sqlalchemy
 import logging
+import os
+import zlib
 from florin.constants import TBD_CATEGORY_ID
-from sqlalchemy import func, not_
-from sqlalchemy.orm import sessionmaker, relationship
+from .pragmas import get_sqlite_pragmas, make_connect_listener
+from StringIO import StringIO
+from sqlalchemy import DDL, event, func, not_, text, type_coerce
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship, deferred, object_session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import (
-    Column, Integer, String, ForeignKey, Date, Float, UnicodeText, DateTime, Text, Boolean, UniqueConstraint)
+    Column, Integer, String, ForeignKey, Date, Float, UnicodeText, DateTime, Boolean, UniqueConstraint, Index,
+    LargeBinary)
 
 
 Base = declarative_base()
@@ -25,15 +32,89 @@ class ToDictMixin(object):
         except KeyError:
             return getattr(self, key)
 
-    def to_dict(self, extra_fields=None):
+    def to_dict(self, extra_fields=None, overrides=None):
         assert hasattr(self, '__export__')
         total_fields = list(self.__export__)
         total_fields.extend(extra_fields or [])
+        overrides = overrides or {}
         return {
-            k: self._get_value(k) for k in total_fields
+            k: overrides[k] if k in overrides else self._get_value(k) for k in total_fields
         }
 
 
+class ZlibCompressed(TypeDecorator):
+    """Bytes stored zlib compressed in a BLOB; reads back the original bytes"""
+    impl = LargeBinary
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else zlib.compress(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else zlib.decompress(value)
+
+
+class ZlibReader(object):
+    """Read-only file object over bytes stored by `ZlibCompressed`, decompressed as they are read"""
+
+    # decompressed bytes per step
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, compressed):
+        self.compressed = compressed
+        self._size = None
+        self._rewind()
+
+    def _rewind(self):
+        self._decompressor = zlib.decompressobj()
+        self._offset = 0
+        self._buffer = ''
+        self._position = 0
+
+    def _decompress(self):
+        """Decompress the next chunk into the buffer; False once there is nothing left"""
+        if self._decompressor is None:
+            return False
+        data = self._decompressor.unconsumed_tail
+        if not data:
+            if self._offset >= len(self.compressed):
+                self._buffer += self._decompressor.flush()
+                self._decompressor = None
+                return True
+            data = self.compressed[self._offset:self._offset + self.CHUNK_SIZE]
+            self._offset += len(data)
+        self._buffer += self._decompressor.decompress(data, self.CHUNK_SIZE)
+        return True
+
+    def read(self, size=-1):
+        while (size < 0 or len(self._buffer) < size) and self._decompress():
+            pass
+        if size < 0:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self._position += len(data)
+        return data
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            if self._size is None:
+                # the size is not stored anywhere; decompress up to the end, keeping none of it
+                while self.read(self.CHUNK_SIZE):
+                    pass
+                self._size = self._position
+            offset += self._size
+        # going back means starting over
+        if offset < self._position:
+            self._rewind()
+        while self._position < offset and self.read(min(offset - self._position, self.CHUNK_SIZE)):
+            pass
+
+
 class SearchByIdMixin(object):
     @classmethod
     def get_by_id(cls, id):
@@ -69,6 +150,21 @@ class Account(Base, ToDictMixin, SearchByIdMixin, QueryMixin):
         )
         return query.one()[0]
 
+    @classmethod
+    def get_uncategorized_transaction_counts(cls, account_ids):
+        """Batched version of `uncategorized_transaction_count` for many accounts in one query"""
+        if not account_ids:
+            return {}
+        query = (
+            cls.session.query(Transaction.account_id, func.count(Transaction.id))
+            .filter(Transaction.account_id.in_(account_ids))
+            .filter(not_(Transaction.deleted))
+            .filter(Transaction.category_id == TBD_CATEGORY_ID)
+            .group_by(Transaction.account_id)
+        )
+        counts = dict(query.all())
+        return {account_id: counts.get(account_id, 0) for account_id in account_ids}
+
 
 class AccountType(Base, ToDictMixin, QueryMixin):
     __tablename__ = 'account_types'
@@ -90,6 +186,18 @@ class AccountBalance(Base, ToDictMixin, SearchByIdMixin, QueryMixin):
 
 class Transaction(Base, ToDictMixin, SearchByIdMixin, QueryMixin):
     __tablename__ = 'transactions'
+    # partial indexes over live rows; keep in sync with migrations/20261018_01_Hx7Qp-add-transaction-indexes.py
+    __table_args__ = (
+        # transaction listing by account, balance chart deltas
+        Index('ix_transactions_account_id_date', 'account_id', 'date', 'amount', sqlite_where=text('deleted = 0')),
+        # uncategorized transaction counts, onlyUncategorized listing
+        Index('ix_transactions_account_id_category_id', 'account_id', 'category_id', 'date',
+              sqlite_where=text('deleted = 0')),
+        # category summaries
+        Index('ix_transactions_category_id_date', 'category_id', 'date', 'amount', sqlite_where=text('deleted = 0')),
+        # transaction listing across all accounts
+        Index('ix_transactions_date', 'date', sqlite_where=text('deleted = 0')),
+    )
     __export__ = ['id', 'date', 'info', 'payee', 'memo', 'amount', 'transaction_type', 'category_id']
 
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -130,32 +238,379 @@ class Category(Base, ToDictMixin, SearchByIdMixin):
     parent = relationship('Category', remote_side=[id])
 
 
+class CategorizationRule(Base, ToDictMixin, SearchByIdMixin, QueryMixin):
+    """Puts the transactions it matches in its category; the rule with the lowest id wins.
+
+    A transaction matches when all the conditions that are set hold: payee and memo
+    contain the words of the pattern in a row (case and punctuation aside), the amount
+    is within [min_amount, max_amount] and it belongs to the account.
+    """
+    __tablename__ = 'categorization_rules'
+    __export__ = ['id', 'category_id', 'payee', 'memo', 'min_amount', 'max_amount', 'account_id']
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    category_id = Column(Integer, ForeignKey('categories.id'), nullable=False)
+    payee = Column(String(255), nullable=True)
+    memo = Column(String(255), nullable=True)
+    min_amount = Column(Float(as_decimal=True), nullable=True)
+    max_amount = Column(Float(as_decimal=True), nullable=True)
+    account_id = Column(Integer, ForeignKey('accounts.id'), nullable=True)
+
+
 class FileUpload(Base, SearchByIdMixin, QueryMixin):
     __tablename__ = 'file_uploads'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     filename = Column(String(255), nullable=False)
     uploaded_at = Column(DateTime, nullable=False)
-    file_content = Column(Text, nullable=False)  # base64-encoded
+    # keep in sync with migrations/20261018_06_Fc5Ub-compress-file-uploads.py; only loaded when accessed,
+    # which linking an upload whose statement is still cached never does
+    file_content = deferred(Column(ZlibCompressed, nullable=False))
     account_id = Column(Integer, ForeignKey('accounts.id'), nullable=True)
     account_signature = Column(String(128), nullable=True)
 
+    def open_file_content(self):
+        """The file content as a `ZlibReader` over the stored bytes, rather than all of it decompressed at once"""
+        if 'file_content' in self.__dict__:
+            return StringIO(self.file_content)
+        compressed = (
+            object_session(self).query(type_coerce(FileUpload.__table__.c.file_content, LargeBinary))
+            .filter(FileUpload.id == self.id).scalar()
+        )
+        return ZlibReader(compressed)
+
 
-def get_engine(dbfile):
-    return sqlalchemy.create_engine('sqlite:///{}'.format(dbfile))
+class Job(Base, ToDictMixin, SearchByIdMixin, QueryMixin):
+    """A unit of background work, run by the worker threads of `florin.services.jobs`.
+
+    `owner` is the claim of the worker running the job and `updated_at` its last
+    heartbeat; `progress` counts what the job has committed so far so that a job
+    taken over after a restart carries on from there.
+    """
+    __tablename__ = 'jobs'
+    __export__ = ['id', 'kind', 'status', 'file_upload_id', 'account_id', 'total_imported', 'total_skipped',
+                  'error', 'created_at', 'updated_at']
+    __table_args__ = (Index('ix_jobs_status', 'status', 'id'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(32), nullable=False)
+    status = Column(String(16), nullable=False)
+    file_upload_id = Column(Integer, ForeignKey('file_uploads.id'), nullable=True)
+    account_id = Column(Integer, ForeignKey('accounts.id'), nullable=True)
+    owner = Column(String(32), nullable=True)
+    progress = Column(Integer, nullable=False, default=0)
+    total_imported = Column(Integer, nullable=False, default=0)
+    total_skipped = Column(Integer, nullable=False, default=0)
+    error = Column(UnicodeText, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    def to_dict(self, extra_fields=None, overrides=None):
+        # the JSON encoder would cut datetimes down to their date; these are UTC times
+        overrides = dict(overrides or {})
+        for key in ('created_at', 'updated_at'):
+            overrides.setdefault(key, getattr(self, key).strftime('%Y-%m-%dT%H:%M:%SZ'))
+        return super(Job, self).to_dict(extra_fields, overrides)
+
+
+class DailyBalance(Base, ToDictMixin, QueryMixin):
+    """Materialized balance history, maintained by `florin.services.daily_balances`"""
+    __tablename__ = 'daily_balances'
+    __export__ = ['date', 'balance']
+
+    account_id = Column(Integer, ForeignKey('accounts.id'), primary_key=True)
+    date = Column(Date, primary_key=True)
+    balance = Column(Float(as_decimal=True), nullable=False)
+
+
+class DailyBalanceChange(Base, QueryMixin):
+    """Queue of (account_id, date) whose daily balances need to be recomputed, filled by triggers.
+
+    A change queued again replaces the one before it under a new id, which is
+    how `refresh` tells the changes it read from those queued meanwhile;
+    AUTOINCREMENT keeps the ids growing even once the queue is emptied.
+    """
+    __tablename__ = 'daily_balance_changes'
+    __table_args__ = (UniqueConstraint('account_id', 'date'), {'sqlite_autoincrement': True})
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, nullable=False)
+    date = Column(Date, nullable=False)
+
+
+class CategoryMonthlyTotal(Base, QueryMixin):
+    """Live transaction totals per account, category and month, maintained by triggers.
+
+    Amounts are kept in integer cents so that adding and removing transactions never drifts.
+    """
+    __tablename__ = 'category_monthly_totals'
+
+    account_id = Column(Integer, primary_key=True)
+    category_id = Column(Integer, primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    amount_cents = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False)
+
+
+class CacheVersion(Base, QueryMixin):
+    """Counters bumped by triggers whenever the data behind a cache changes"""
+    __tablename__ = 'cache_versions'
+
+    key = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False)
+
+
+class BulkAccountWrite(Base):
+    """Accounts whose transactions are being rewritten by `bulk_account_write`; only ever set within its transaction"""
+    __tablename__ = 'bulk_account_writes'
+
+    account_id = Column(Integer, primary_key=True)
+
+
+# Row updates of transactions skip the triggers of derived tables while the
+# account is in bulk_account_writes and the row stays in it;
+# `bulk_account_write` brings the derived tables up to date instead.
+SKIP_BULK_ACCOUNT_WRITES = """NOT EXISTS (
+        SELECT 1 FROM bulk_account_writes WHERE account_id = OLD.account_id AND account_id = NEW.account_id)"""
+
+
+# Any write to transactions or account_balances - through the services, the
+# bulk import or by hand - queues the affected dates for the daily balances.
+# Keep in sync with migrations/20261018_02_Rb4Lw-add-daily-balances.py and
+# migrations/20261018_07_Kp4Tq-add-bulk-account-writes.py
+DAILY_BALANCE_TRIGGERS = [
+    """
+    CREATE TRIGGER transactions_insert_daily_balances AFTER INSERT ON transactions
+    WHEN NEW.account_id IS NOT NULL AND NEW.deleted = 0
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (NEW.account_id, NEW.date);
+    END
+    """,
+    """
+    CREATE TRIGGER transactions_update_daily_balances AFTER UPDATE OF date, amount, account_id, deleted ON transactions
+    WHEN {skip}
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+        SELECT OLD.account_id, OLD.date WHERE OLD.account_id IS NOT NULL;
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+        SELECT NEW.account_id, NEW.date WHERE NEW.account_id IS NOT NULL;
+    END
+    """.format(skip=SKIP_BULK_ACCOUNT_WRITES),
+    """
+    CREATE TRIGGER transactions_delete_daily_balances AFTER DELETE ON transactions
+    WHEN OLD.account_id IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (OLD.account_id, OLD.date);
+    END
+    """,
+    """
+    CREATE TRIGGER account_balances_insert_daily_balances AFTER INSERT ON account_balances
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (NEW.account_id, NEW.date);
+    END
+    """,
+    """
+    CREATE TRIGGER account_balances_update_daily_balances AFTER UPDATE ON account_balances
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (OLD.account_id, OLD.date);
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (NEW.account_id, NEW.date);
+    END
+    """,
+    """
+    CREATE TRIGGER account_balances_delete_daily_balances AFTER DELETE ON account_balances
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (OLD.account_id, OLD.date);
+    END
+    """,
+]
+
+
+# Keep in sync with migrations/20261018_03_Mq2Vc-add-category-monthly-totals.py and
+# migrations/20261018_07_Kp4Tq-add-bulk-account-writes.py
+CATEGORY_MONTHLY_TOTAL_TRIGGERS = [
+    """
+    CREATE TRIGGER transactions_insert_category_monthly_totals AFTER INSERT ON transactions
+    WHEN NEW.account_id IS NOT NULL AND NEW.deleted = 0
+    BEGIN
+        INSERT OR IGNORE INTO category_monthly_totals (account_id, category_id, month, amount_cents, count)
+        VALUES (NEW.account_id, NEW.category_id, date(NEW.date, 'start of month'), 0, 0);
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents + CAST(ROUND(NEW.amount * 100) AS INTEGER), count = count + 1
+        WHERE account_id = NEW.account_id AND category_id = NEW.category_id
+        AND month = date(NEW.date, 'start of month');
+    END
+    """,
+    """
+    CREATE TRIGGER transactions_update_category_monthly_totals
+    AFTER UPDATE OF date, amount, account_id, category_id, deleted ON transactions
+    WHEN {skip}
+    BEGIN
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents - CAST(ROUND(OLD.amount * 100) AS INTEGER), count = count - 1
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month') AND OLD.deleted = 0;
+        DELETE FROM category_monthly_totals
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month') AND count = 0;
+        INSERT OR IGNORE INTO category_monthly_totals (account_id, category_id, month, amount_cents, count)
+        SELECT NEW.account_id, NEW.category_id, date(NEW.date, 'start of month'), 0, 0
+        WHERE NEW.account_id IS NOT NULL AND NEW.deleted = 0;
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents + CAST(ROUND(NEW.amount * 100) AS INTEGER), count = count + 1
+        WHERE account_id = NEW.account_id AND category_id = NEW.category_id
+        AND month = date(NEW.date, 'start of month') AND NEW.deleted = 0;
+    END
+    """.format(skip=SKIP_BULK_ACCOUNT_WRITES),
+    """
+    CREATE TRIGGER transactions_delete_category_monthly_totals AFTER DELETE ON transactions
+    WHEN OLD.account_id IS NOT NULL AND OLD.deleted = 0
+    BEGIN
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents - CAST(ROUND(OLD.amount * 100) AS INTEGER), count = count - 1
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month');
+        DELETE FROM category_monthly_totals
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month') AND count = 0;
+    END
+    """,
+]
+
+
+# Keep in sync with migrations/20261018_04_Tz8Kd-add-cache-versions.py
+CACHE_VERSION_TRIGGERS = [
+    """
+    CREATE TRIGGER categories_{event}_cache_versions AFTER {EVENT} ON categories
+    BEGIN
+        INSERT OR IGNORE INTO cache_versions (key, version) VALUES ('categories', 0);
+        UPDATE cache_versions SET version = version + 1 WHERE key = 'categories';
+    END
+    """.format(event=event_name.lower(), EVENT=event_name)
+    for event_name in ('INSERT', 'UPDATE', 'DELETE')
+]
+
+
+def _bump_cache_version(key):
+    # key is an SQL expression; nothing is bumped when it is NULL
+    return """
+        INSERT OR IGNORE INTO cache_versions (key, version) SELECT {key}, 0 WHERE {key} IS NOT NULL;
+        UPDATE cache_versions SET version = version + 1 WHERE key = {key};""".format(key=key)
+
+
+def _make_cache_version_trigger(table, event_name, keys, when=None):
+    return """
+    CREATE TRIGGER {table}_{event}_cache_versions AFTER {EVENT} ON {table}{when}
+    BEGIN{body}
+    END
+    """.format(table=table, event=event_name.lower(), EVENT=event_name,
+               when='\n    WHEN {}'.format(when) if when else '',
+               body=''.join(_bump_cache_version(key) for key in keys))
+
+
+# Every write to an account's data bumps its 'account:<id>' version.
+# Keep in sync with migrations/20261018_05_Wn3Js-add-account-cache-versions.py and
+# migrations/20261018_07_Kp4Tq-add-bulk-account-writes.py
+ACCOUNT_CACHE_VERSION_TRIGGERS = [
+    _make_cache_version_trigger(table, event_name, [
+        "'account:' || {}.{}".format(row, column) for row in rows
+    ], when=SKIP_BULK_ACCOUNT_WRITES if (table, event_name) == ('transactions', 'UPDATE') else None)
+    for table, column in [('transactions', 'account_id'), ('account_balances', 'account_id'), ('accounts', 'id')]
+    for event_name, rows in [('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])]
+] + [
+    _make_cache_version_trigger('account_types', event_name, ["'account_types'"])
+    for event_name in ('INSERT', 'UPDATE', 'DELETE')
+]
+
+
+# Keep in sync with migrations/20261018_08_Ry6Nd-add-categorization-rules.py
+CATEGORIZATION_RULE_CACHE_VERSION_TRIGGERS = [
+    _make_cache_version_trigger('categorization_rules', event_name, ["'categorization_rules'"])
+    for event_name in ('INSERT', 'UPDATE', 'DELETE')
+]
+
+
+# create_all skips the tables that exist already; the triggers on them must be skipped too
+for trigger in (DAILY_BALANCE_TRIGGERS + CATEGORY_MONTHLY_TOTAL_TRIGGERS + CACHE_VERSION_TRIGGERS +
+                ACCOUNT_CACHE_VERSION_TRIGGERS + CATEGORIZATION_RULE_CACHE_VERSION_TRIGGERS):
+    event.listen(Base.metadata, 'after_create',
+                 DDL(trigger.replace('CREATE TRIGGER ', 'CREATE TRIGGER IF NOT EXISTS ', 1)))
+
+
+def get_engine(dbfile, pool_size=5, pragmas=None):
+    if not dbfile or dbfile == ':memory:':
+        # every connection to an in-memory database is a new database; keep sqlalchemy's default pool
+        engine = sqlalchemy.create_engine('sqlite://')
+    else:
+        # connections are handed between request threads by the pool, never used by two threads at once
+        engine = sqlalchemy.create_engine('sqlite:///{}'.format(dbfile),
+                                          poolclass=QueuePool,
+                                          pool_size=pool_size,
+                                          connect_args={'check_same_thread': False})
+
+    pragmas = get_sqlite_pragmas() if pragmas is None else pragmas
+    event.listen(engine, 'connect', make_connect_listener(pragmas))
+    return engine
 
 
 def make_session(engine):
     return sessionmaker(bind=engine)()
 
 
+def make_scoped_session(engine):
+    return scoped_session(sessionmaker(bind=engine))
+
+
 def init(app, dbfile):
+    """Attach a thread-local session registry to the app.
+
+    `app.session` proxies to the session of the current thread; the app must
+    call `app.session.remove()` when a request is done with it.
+    """
     engine = get_engine(dbfile)
-    session = make_session(engine)
+    session = make_scoped_session(engine)
     Base.session = session
     app.session = session
 
 
+# what the skipped triggers would have done, for all the rows of the account at once
+BULK_ACCOUNT_WRITE_STATEMENTS = [
+    # daily balances: the changed dates only matter through their range
+    """
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+    SELECT :account_id, date FROM (
+        SELECT min(date) AS date FROM transactions WHERE account_id = :account_id AND deleted = 0
+        UNION SELECT max(date) FROM transactions WHERE account_id = :account_id AND deleted = 0
+    ) WHERE date IS NOT NULL
+    """,
+    "DELETE FROM category_monthly_totals WHERE account_id = :account_id",
+    """
+    INSERT INTO category_monthly_totals (account_id, category_id, month, amount_cents, count)
+    SELECT account_id, category_id, date(date, 'start of month'), SUM(CAST(ROUND(amount * 100) AS INTEGER)), COUNT(*)
+    FROM transactions WHERE account_id = :account_id AND deleted = 0
+    GROUP BY account_id, category_id, date(date, 'start of month')
+    """,
+    "INSERT OR IGNORE INTO cache_versions (key, version) VALUES ('account:' || :account_id, 0)",
+    "UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || :account_id",
+]
+
+
+@contextlib.contextmanager
+def bulk_account_write(session, account_id):
+    """Update many transactions of an account with set based statements, without per row triggers.
+
+    Within the block, updates of transactions that stay in the account don't
+    touch the derived tables; they are brought up to date with the account as
+    a whole when the block exits. Must be used within a `db_transaction`.
+    """
+    params = {'account_id': account_id}
+    session.execute(BULK_ACCOUNT_WRITE_STATEMENTS[0], params)  # the dates as they were
+    session.execute(BulkAccountWrite.__table__.insert(), params)
+    yield session
+    session.execute(BulkAccountWrite.__table__.delete().where(BulkAccountWrite.account_id == account_id))
+    for statement in BULK_ACCOUNT_WRITE_STATEMENTS:
+        session.execute(statement, params)
+
+
 @contextlib.contextmanager
 def db_transaction(session):
     try:
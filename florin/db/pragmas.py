@@ -0,0 +1,76 @@
+"""SQLite connection tuning.
+
+Every new connection gets the pragmas of the selected profile applied.
+The profile is picked with the SQLITE_PROFILE environment variable (next to
+DBFILE):
+
+    performance (default)   WAL journaling, relaxed fsync, large page cache
+    default                 sqlite's own defaults
+
+and individual pragmas can be overridden on top of the profile, e.g.
+SQLITE_SYNCHRONOUS=FULL or SQLITE_MMAP_SIZE=0. An empty value turns the
+pragma off.
+"""
+import os
+import re
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+PRAGMAS = ['journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout']
+
+
+PROFILES = {
+    'performance': {
+        # readers don't block the writer (and vice versa) during imports
+        'journal_mode': 'WAL',
+        # in WAL mode, only checkpoints fsync; commits stay durable across application crashes
+        'synchronous': 'NORMAL',
+        # negative values are in KiB: 64MB page cache
+        'cache_size': '-65536',
+        'mmap_size': str(256 * 1024 * 1024),
+        'temp_store': 'MEMORY',
+        'busy_timeout': '5000',
+    },
+    'default': {},
+}
+
+
+VALID_VALUE = re.compile(r'^-?\w+$')
+
+
+def get_sqlite_pragmas(environ=None):
+    """Ordered list of (pragma, value) for the profile selected in the environment"""
+    environ = os.environ if environ is None else environ
+    profile_name = environ.get('SQLITE_PROFILE', 'performance')
+    if profile_name not in PROFILES:
+        raise ValueError('Invalid SQLITE_PROFILE: "{}"'.format(profile_name))
+
+    profile = dict(PROFILES[profile_name])
+    for pragma in PRAGMAS:
+        value = environ.get('SQLITE_{}'.format(pragma.upper()))
+        if value is not None:
+            profile[pragma] = value
+
+    pragmas = []
+    for pragma in PRAGMAS:
+        value = profile.get(pragma)
+        if not value:
+            continue
+        if not VALID_VALUE.match(value):
+            raise ValueError('Invalid value for SQLITE_{}: "{}"'.format(pragma.upper(), value))
+        pragmas.append((pragma, value))
+    return pragmas
+
+
+def make_connect_listener(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in pragmas:
+                cursor.execute('PRAGMA {}={}'.format(pragma, value))
+        finally:
+            cursor.close()
+    return on_connect
@@ -0,0 +1,55 @@
+"""Read only rows for listing models without ORM instances.
+
+A `ReadModel` selects only a model's exported columns. Its rows are plain
+Core result rows or namedtuples, with no identity map and no attribute
+instrumentation behind them, and `to_dict` turns them into the same dicts
+as `ToDictMixin.to_dict` of the model.
+"""
+import collections
+
+
+class ReadModel(object):
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = tuple(fields)
+        self.columns = [getattr(model, field) for field in self.fields]
+        self.row_type = collections.namedtuple('{}Row'.format(model.__name__), self.fields)
+
+        fields = self.fields
+
+        def to_dict(row):
+            return dict(zip(fields, row))
+        self.to_dict = to_dict
+
+    def query(self, session):
+        """An ORM query of the columns; filter and order it as usual, then read it with `all` or `iter_batches`"""
+        return session.query(*self.columns)
+
+    def all(self, session, query):
+        make = self.row_type._make
+        return [make(row) for row in session.execute(query.statement)]
+
+    def iter_batches(self, session, query, batch_size):
+        """Generator of lists of at most `batch_size` result rows, read from the database as they are consumed"""
+        result = session.execute(query.statement.execution_options(stream_results=True))
+        try:
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            result.close()
+
+
+_read_models = {}
+
+
+def get_read_model(model, fields=None):
+    """The `ReadModel` of `fields` of `model`, by default its `__export__` fields; built once per model and fields"""
+    fields = tuple(fields or model.__export__)
+    try:
+        return _read_models[model, fields]
+    except KeyError:
+        read_model = _read_models[model, fields] = ReadModel(model, fields)
+        return read_model
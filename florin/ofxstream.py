@@ -0,0 +1,120 @@
+"""Incremental OFX statement reader.
+
+`OfxParser().parse` builds the document tree of the whole file, which for
+multi-year statements costs many times the size of the file itself. The
+`StatementReader` here scans the raw file in chunks instead: every
+<STMTTRN> aggregate is cut out and parsed on its own, and everything else
+(signon, account info, balances - a few KB at most) is collected into a
+"skeleton" that is handed to ofxparse once the scan is done. Transactions and
+statement fields therefore come out exactly as ofxparse would produce them.
+"""
+import re
+from StringIO import StringIO
+from ofxparse import OfxParser
+from ofxparse.ofxparse import OfxFile, OfxParserException, soup_maker
+
+
+CHUNK_SIZE = 64 * 1024
+
+STMTTRN_OPEN = re.compile(r'(?i)<stmttrn>')
+STMTTRN_CLOSE = re.compile(r'(?i)</stmttrn>')
+# bytes to hold back at the end of a chunk in case a tag is split in two
+TAG_OVERLAP = len('</stmttrn>') - 1
+
+
+def get_encoding(headers):
+    # mirrors ofxparse.ofxparse.OfxFile.handle_encoding
+    enc_type = headers.get('ENCODING')
+    if enc_type == 'USASCII':
+        return 'cp{}'.format(headers.get('CHARSET') or '1252')
+    if enc_type in ('UNICODE', 'UTF-8'):
+        return 'utf-8'
+    return 'ascii'
+
+
+def close_tags(sgml):
+    # same as ofxparse.ofxparse.OfxPreprocessedFile, on a single aggregate
+    closing_tags = set(t.upper() for t in re.findall(r'(?i)</([a-z0-9_\.]+)>', sgml))
+    last_open_tag = None
+    output = []
+    for token in re.split(r'(?i)(</?[a-z0-9_\.]+>)', sgml):
+        is_closing_tag = token.startswith('</')
+        is_processing_tag = token.startswith('<?')
+        is_cdata = token.startswith('<!')
+        is_tag = token.startswith('<') and not is_cdata
+        is_open_tag = is_tag and not is_closing_tag and not is_processing_tag
+        if is_tag and last_open_tag is not None:
+            output.append('</{}>'.format(last_open_tag))
+            last_open_tag = None
+        if is_open_tag:
+            tag_name = re.findall(r'(?i)<([a-z0-9_\.]+)>', token)[0]
+            if tag_name.upper() not in closing_tags:
+                last_open_tag = tag_name
+        output.append(token)
+    return ''.join(output)
+
+
+class StatementReader(object):
+    def __init__(self, fh):
+        """fh should be a seekable file-like byte stream object"""
+        self.fh = fh
+        self._ofx = None
+        self.fh.seek(0)
+        self.encoding = get_encoding(OfxFile(StringIO(self.fh.read(10 * 1024))).headers)
+
+    def _read_chunks(self):
+        self.fh.seek(0)
+        while True:
+            chunk = self.fh.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def _scan(self):
+        """Yield the raw <STMTTRN> aggregates; the rest of the file is parsed into `self._ofx` at the end"""
+        skeleton = StringIO()
+        buf = ''
+        in_transaction = False
+        for chunk in self._read_chunks():
+            buf += chunk
+            while True:
+                if not in_transaction:
+                    match = STMTTRN_OPEN.search(buf)
+                    if match is None:
+                        cut = max(len(buf) - TAG_OVERLAP, 0)
+                        skeleton.write(buf[:cut])
+                        buf = buf[cut:]
+                        break
+                    skeleton.write(buf[:match.start()])
+                    buf = buf[match.start():]
+                    in_transaction = True
+                else:
+                    match = STMTTRN_CLOSE.search(buf)
+                    if match is None:
+                        break
+                    yield buf[:match.end()]
+                    buf = buf[match.end():]
+                    in_transaction = False
+
+        if in_transaction:
+            raise OfxParserException('Unterminated <STMTTRN> aggregate')
+        skeleton.write(buf)
+        skeleton.seek(0)
+        self._ofx = OfxParser().parse(skeleton)
+
+    def _parse_transaction(self, raw):
+        soup = soup_maker(close_tags(raw.decode(self.encoding)))
+        return OfxParser.parseTransaction(soup.find('stmttrn'))
+
+    def transactions(self):
+        """Generator of `ofxparse.Transaction`s, parsed one at a time"""
+        for raw in self._scan():
+            yield self._parse_transaction(raw)
+
+    @property
+    def ofx(self):
+        """The `ofxparse.Ofx` for the statement, without its transactions"""
+        if self._ofx is None:
+            for _ in self._scan():
+                pass
+        return self._ofx
@@ -0,0 +1,258 @@
+"""JSON serialization for API responses.
+
+`flask.jsonify` ends up in the pure Python encoder of the json module:
+`sort_keys` and `indent` both rule out its C accelerated path. That encoder
+pays a generator frame per container and a call to `JSONEncoder.default` -
+with its `isinstance` chain - per date, Decimal and model.
+
+`dumps` here produces the very same bytes. It dispatches on exact types,
+turns models into dicts and formats each distinct date once while it walks
+the data, and escapes strings with the C speedups of the json module when
+they are available.
+"""
+import datetime
+from decimal import Decimal
+from json.encoder import encode_basestring, encode_basestring_ascii, INFINITY
+from flask.json import JSONEncoder
+from florin.db import ToDictMixin
+
+
+def _floatstr(value):
+    # same as json.encoder's floatstr with allow_nan=True
+    if value != value:
+        return 'NaN'
+    if value == INFINITY:
+        return 'Infinity'
+    if value == -INFINITY:
+        return '-Infinity'
+    return float.__repr__(value)
+
+
+class MyJSONEncoder(JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(round(obj, 2))
+        if isinstance(obj, float):
+            return str(round(Decimal(str(obj)), 2))
+        if isinstance(obj, datetime.date):
+            return obj.strftime('%Y-%m-%d')
+        if isinstance(obj, ToDictMixin):
+            return obj.to_dict()
+        if isinstance(obj, Stream):
+            return list(obj)
+
+        return super(MyJSONEncoder, self).default(obj)
+
+
+def make_default(fallback):
+    """Convert the objects json can't encode by itself: dates, Decimals and models.
+
+    Must agree with the app's JSON encoder, whose `default` method is the
+    `fallback` for anything else.
+    """
+    dates = {}
+
+    def default(obj):
+        if isinstance(obj, datetime.date):
+            try:
+                return dates[obj]
+            except KeyError:
+                formatted = dates[obj] = obj.strftime('%Y-%m-%d')
+                return formatted
+        if isinstance(obj, Decimal):
+            return str(round(obj, 2))
+        if isinstance(obj, ToDictMixin):
+            return obj.to_dict()
+        return fallback(obj)
+
+    return default
+
+
+class Stream(object):
+    """An iterable encoded as a JSON array; `iterdumps` only consumes it while its output is read"""
+    def __init__(self, iterable):
+        self.iterable = iterable
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+
+class _PendingStream(object):
+    def __init__(self, stream, level):
+        self.stream = stream
+        self.level = level
+
+
+def _make_encoder(default, indent=None, separators=None, sort_keys=False, ensure_ascii=True, defer_streams=False):
+    # returns (chunks, encode, iterencode_list); encode(value, level) appends the output to chunks
+    encode_string = encode_basestring_ascii if ensure_ascii else encode_basestring
+    item_separator, key_separator = separators or (', ', ': ')
+    chunks = []
+    append = chunks.append
+    str_type, unicode_type, int_type, long_type, float_type, bool_type = str, unicode, int, long, float, bool
+    list_types, dict_type = (list, tuple), dict
+
+    def encode_key(key):
+        if isinstance(key, basestring):
+            return key
+        if key is True:
+            return 'true'
+        if key is False:
+            return 'false'
+        if key is None:
+            return 'null'
+        if isinstance(key, float):
+            return _floatstr(key)
+        if isinstance(key, (int, long)):
+            return str(key)
+        raise TypeError('key {!r} is not a string'.format(key))
+
+    def encode(value, level):
+        value_type = type(value)
+        if value_type is str_type or value_type is unicode_type:
+            append(encode_string(value))
+        elif value is None:
+            append('null')
+        elif value_type is bool_type:
+            append('true' if value else 'false')
+        elif value_type is int_type or value_type is long_type:
+            append(str(value))
+        elif value_type is float_type:
+            append(_floatstr(value))
+        elif value_type is dict_type:
+            encode_dict(value, level)
+        elif value_type in list_types:
+            encode_list(value, level)
+        elif isinstance(value, basestring):
+            append(encode_string(value))
+        elif isinstance(value, (int, long)):
+            append('true' if value is True else 'false' if value is False else str(value))
+        elif isinstance(value, float):
+            append(_floatstr(value))
+        elif isinstance(value, list_types):
+            encode_list(value, level)
+        elif isinstance(value, dict):
+            encode_dict(value, level)
+        elif isinstance(value, Stream):
+            if defer_streams:
+                append(_PendingStream(value, level))
+            else:
+                encode_list(value, level)
+        else:
+            encode(default(value), level)
+
+    def _list_delimiters(level):
+        # (opening, separator, closing, level of the items)
+        if indent is None:
+            return '[', item_separator, ']', level
+        newline_indent = '\n' + ' ' * (indent * (level + 1))
+        return '[' + newline_indent, item_separator + newline_indent, '\n' + ' ' * (indent * level) + ']', level + 1
+
+    def encode_list(value, level):
+        opening, separator, closing, level = _list_delimiters(level)
+        first = True
+        for item in value:
+            if first:
+                first = False
+                append(opening)
+            else:
+                append(separator)
+            encode(item, level)
+        append('[]' if first else closing)
+
+    def iterencode_list(value, level, batch_size):
+        """Same as `encode_list`, but yields the output every `batch_size` items"""
+        opening, separator, closing, level = _list_delimiters(level)
+        first = True
+        for count, item in enumerate(value, 1):
+            if first:
+                first = False
+                append(opening)
+            else:
+                append(separator)
+            encode(item, level)
+            if count % batch_size == 0:
+                yield ''.join(chunks)
+                del chunks[:]
+        append('[]' if first else closing)
+        yield ''.join(chunks)
+        del chunks[:]
+
+    encoded_keys = {}
+
+    def encode_dict(value, level):
+        if not value:
+            append('{}')
+            return
+        if indent is None:
+            separator, newline_indent = item_separator, None
+            append('{')
+        else:
+            level += 1
+            newline_indent = '\n' + ' ' * (indent * level)
+            separator = item_separator + newline_indent
+            append('{' + newline_indent)
+        # keys of a dict never compare equal, so sorting the items sorts them by key
+        items = sorted(value.iteritems()) if sort_keys else value.iteritems()
+        first = True
+        for key, item in items:
+            if first:
+                first = False
+            else:
+                append(separator)
+            try:
+                append(encoded_keys[key])
+            except KeyError:
+                encoded_key = encode_string(encode_key(key)) + key_separator
+                if type(key) is str_type or type(key) is unicode_type:
+                    encoded_keys[key] = encoded_key
+                append(encoded_key)
+            # the common scalars inline, everything else through `encode`
+            item_type = type(item)
+            if item_type is str_type or item_type is unicode_type:
+                append(encode_string(item))
+            elif item is None:
+                append('null')
+            elif item_type is int_type:
+                append(str(item))
+            elif item_type is float_type:
+                append(_floatstr(item))
+            else:
+                encode(item, level)
+        if newline_indent is not None:
+            append('\n' + ' ' * (indent * (level - 1)))
+        append('}')
+
+    return chunks, encode, iterencode_list
+
+
+def dumps(obj, default, **kwargs):
+    """Same output as `json.dumps` with the same arguments; `Stream`s are encoded as arrays"""
+    chunks, encode, _ = _make_encoder(default, **kwargs)
+    encode(obj, 0)
+    return ''.join(chunks)
+
+
+def iterdumps(obj, default, batch_size=1000, **kwargs):
+    """Generator of the output of `dumps` in pieces.
+
+    Everything but the `Stream`s in `obj` is encoded up front. Each stream is
+    then consumed `batch_size` items at a time as the output is read, so
+    only a batch is ever held in memory. Streams nested in the items of a
+    stream are encoded with their item.
+    """
+    chunks, encode, _ = _make_encoder(default, defer_streams=True, **kwargs)
+    encode(obj, 0)
+    parts = list(chunks)
+    _, _, iterencode_list = _make_encoder(default, **kwargs)
+
+    buffered = []
+    for part in parts:
+        if isinstance(part, _PendingStream):
+            yield ''.join(buffered)
+            buffered = []
+            for piece in iterencode_list(part.stream, part.level, batch_size):
+                yield piece
+        else:
+            buffered.append(part)
+    yield ''.join(buffered)
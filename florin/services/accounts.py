@@ -1,15 +1,47 @@
+import collections
 import datetime
-import operator
-from collections import defaultdict
 from decimal import Decimal, InvalidOperation
 from .exceptions import ResourceNotFound, InvalidRequest
-from . import params
-from florin.db import Account, AccountBalance, AccountType, Transaction, Category, db_transaction
-from sqlalchemy import func, and_, not_
+from . import categories, category_totals, daily_balances, params
+from florin.db import (
+    Account, AccountBalance, AccountType, Transaction, bulk_account_write, db_transaction, get_read_model)
+from sqlalchemy import and_, not_
 
 
 ALL_ACCOUNTS = object()
 
+# `Account.__export__` but for the uncategorized transaction count, which is not a column
+ACCOUNT_READ_MODEL = get_read_model(Account, ['id', 'institution', 'name', 'type'])
+BALANCE_READ_MODEL = get_read_model(AccountBalance)
+
+
+def query_rows(session):
+    return ACCOUNT_READ_MODEL.query(session).filter(not_(Account.deleted))
+
+
+def to_dicts(rows):
+    """Same as `Account.to_dict` for the rows of `ACCOUNT_READ_MODEL`"""
+    counts = Account.get_uncategorized_transaction_counts([row.id for row in rows])
+    to_dict = ACCOUNT_READ_MODEL.to_dict
+    return [
+        dict(to_dict(row), uncategorized_transaction_count=counts[row.id])
+        for row in rows
+    ]
+
+
+def _get_balances_by_account(session):
+    query = (
+        BALANCE_READ_MODEL.query(session)
+        .join(Account, Account.id == AccountBalance.account_id)
+        .filter(not_(Account.deleted))
+        .order_by(AccountBalance.account_id, AccountBalance.date)
+    )
+    to_dict = BALANCE_READ_MODEL.to_dict
+    balances = collections.defaultdict(list)
+    for row in BALANCE_READ_MODEL.all(session, query):
+        balances[row.account_id].append(to_dict(row))
+    return balances
+
 
 def get_types(app):
     return {
@@ -20,11 +52,11 @@ def get_types(app):
 def get_balances(app, account_id):
     if account_id != '_all':
         raise InvalidRequest('Currently only "_all" is supported for account_id')
-    accounts = Account.query().filter(not_(Account.deleted)).all()
+    session = app.session
+    balances = _get_balances_by_account(session)
+    account_dicts = to_dicts(ACCOUNT_READ_MODEL.all(session, query_rows(session)))
     return {
-        'accountBalances': [
-            account.to_dict(extra_fields=['balances']) for account in accounts
-        ]
+        'accountBalances': [dict(account, balances=balances[account['id']]) for account in account_dicts]
     }
 
 
@@ -53,6 +85,8 @@ def post_balances(app, account_id, request_json):
     with db_transaction(app.session) as session:
         account_balance = AccountBalance(account_id=account_id, date=date, balance=balance)
         session.add(account_balance)
+        session.flush()
+        daily_balances.refresh(session)
     return {'account_id': account.id, 'id': account_balance.id}
 
 
@@ -62,6 +96,8 @@ def delete_balances(app, account_id, id):
         raise ResourceNotFound()
     with db_transaction(app.session) as session:
         session.delete(account_balance)
+        session.flush()
+        daily_balances.refresh(session)
     return {'account_id': account_id, 'id': id}
 
 
@@ -79,48 +115,24 @@ def get_by_id(app, account_id):
 
 def _get_expense_category_summary(app, args):
     start_date, end_date = params.get_date_range_params(args)
-    session = app.session
-    query = (
-        session.query(Category.id, Category.parent_id, Category.name, func.sum(Transaction.amount).label('amount'))
-        .join(Transaction, Transaction.category_id == Category.id)
-        .filter(and_(Transaction.date >= start_date, Transaction.date <= end_date))
-        .filter(Category.type == 'expense')
-        .filter(not_(Transaction.deleted))
-        .group_by(Category.id)
-    )
-
-    result = query.all()
-
-    def reducer(aggregate, (id, parent_id, name, amount)):
-        if parent_id is None:
-            aggregate[id] += amount
-        else:
-            aggregate[parent_id] += amount
-        return aggregate
-
-    result = reduce(reducer, result, defaultdict(float))
+    result = category_totals.get_parent_totals(app.session, start_date, end_date, 'expense')
+    names = categories.get_tree(app.session).names
 
+    # amounts are exact up to here; the API has always served them as JSON numbers
     return [
-        {'category_id': id, 'category_name': Category.get_by_id(id).name, 'amount': abs(amount)}
-        for id, amount in reversed(sorted(result.items(), key=operator.itemgetter(1)))
+        {'category_id': id, 'category_name': names[id], 'amount': float(abs(amount))}
+        for id, amount in result
     ]
 
 
 def _get_income_category_summary(app, args):
     start_date, end_date = params.get_date_range_params(args)
-    session = app.session
-    query = (
-        session.query(Category.id, Category.name, func.sum(Transaction.amount))
-        .filter(and_(Transaction.date >= start_date, Transaction.date <= end_date))
-        .filter(Transaction.category_id == Category.id)
-        .filter(Category.type == 'income')
-        .filter(not_(Transaction.deleted))
-        .group_by(Category.id)
-    )
+    result = category_totals.get_totals(app.session, start_date, end_date, 'income')
+    names = categories.get_tree(app.session).names
 
     return [
-        {'category_id': category_id, 'category_name': category_name, 'amount': abs(amount)}
-        for category_id, category_name, amount in query.all()
+        {'category_id': category_id, 'category_name': names[category_id], 'amount': float(abs(amount))}
+        for category_id, _, amount in result
     ]
 
 
@@ -134,12 +146,10 @@ def get_summary(app, account_id, args):
 
 
 def get(app):
-    query = app.session.query(Account) \
-        .filter(not_(Account.deleted)) \
-        .order_by(Account.institution.desc())  # TODO: why desc?
-    accounts = query.all()
+    session = app.session
+    query = query_rows(session).order_by(Account.institution.desc())  # TODO: why desc?
     return {
-        'accounts': [account.to_dict() for account in accounts]
+        'accounts': to_dicts(ACCOUNT_READ_MODEL.all(session, query))
     }
 
 
@@ -175,9 +185,16 @@ def put(app, account_id, request_json):
 def delete(app, account_id):
     account = get_by_id(app, account_id)
     with db_transaction(app.session) as session:
+        with bulk_account_write(session, account.id):
+            # one statement for all the transactions; those already in the session are updated in place
+            (
+                session.query(Transaction)
+                .filter(Transaction.account_id == account.id)
+                .filter(Transaction.deleted == False)  # noqa
+                .update({Transaction.deleted: True}, synchronize_session='evaluate')
+            )
         account.deleted = True
-        for t in account.transactions:
-            t.deleted = True
-            session.add(t)
         session.add(account)
+        session.flush()
+        daily_balances.refresh(session)
     return {'accountId': account_id}
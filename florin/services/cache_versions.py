@@ -0,0 +1,40 @@
+"""Data versions for caches.
+
+Triggers bump a counter in `cache_versions` on every write to the data behind
+it: 'categories', 'account_types' and one 'account:<id>' per account covering
+the account itself, its transactions and its balances. Counters only ever go
+up, so a changed set of counters means changed data.
+"""
+from florin.db import CacheVersion
+from sqlalchemy import false, or_
+
+
+ACCOUNT_KEY_PREFIX = 'account:'
+
+
+def get_version(session, key):
+    version = session.query(CacheVersion.version).filter(CacheVersion.key == key).scalar()
+    return version or 0
+
+
+def get_generation(session, dependencies, account_id=None):
+    """Sorted ((key, version)) of `dependencies`, which changes whenever their data is written.
+
+    'account' is the account `account_id` (every account for None or '_all'), 'accounts' is
+    every account; anything else is a plain key.
+    """
+    keys = set()
+    all_accounts = False
+    for dependency in dependencies:
+        if dependency == 'accounts' or (dependency == 'account' and account_id in (None, '_all')):
+            all_accounts = True
+        elif dependency == 'account':
+            keys.add(ACCOUNT_KEY_PREFIX + str(account_id))
+        else:
+            keys.add(dependency)
+
+    query = session.query(CacheVersion.key, CacheVersion.version).filter(or_(
+        CacheVersion.key.in_(keys) if keys else false(),
+        CacheVersion.key.startswith(ACCOUNT_KEY_PREFIX) if all_accounts else false(),
+    ))
+    return tuple(sorted(query.all()))
@@ -1,14 +1,45 @@
+import collections
 from florin.db import Category
+from . import cache_versions
 from florin.constants import TBD_CATEGORY_ID, INTERNAL_TRANSFER_CATEGORY_ID, INCOME_PARENT_CATEGORY_ID  # noqa
 
 
-def get(app):
-    categories = app.session.query(Category).all()
+CategoryTree = collections.namedtuple('CategoryTree', ['version', 'categories', 'names'])
+
+# process wide; replaced as a whole, so readers never see a half built tree
+_tree = CategoryTree(version=None, categories=None, names=None)
+
 
+def _build_tree(version, categories):
     flat_categories = [category.to_dict() for category in categories]
-    top_level_categories = [c for c in flat_categories if c['parent_id'] is None]
-    for category in top_level_categories:
-        category['subcategories'] = [c for c in flat_categories if c['parent_id'] == category['id']]
+    subcategories = collections.defaultdict(list)
+    for category in flat_categories:
+        if category['parent_id'] is not None:
+            subcategories[category['parent_id']].append(category)
+
+    top_level_categories = [dict(c, subcategories=subcategories[c['id']])
+                            for c in flat_categories if c['parent_id'] is None]
+    return CategoryTree(version=version,
+                        categories=top_level_categories,
+                        names={c['id']: c['name'] for c in flat_categories})
+
+
+def get_tree(session):
+    """The `CategoryTree` as of the current version; treat it as read only"""
+    global _tree
+    version = cache_versions.get_version(session, 'categories')
+    tree = _tree
+    if tree.version != version:
+        # a write after reading the version only makes the next call rebuild again
+        tree = _tree = _build_tree(version, session.query(Category).order_by(Category.id).all())
+    return tree
+
+
+def get_etag(tree):
+    return 'categories-{}'.format(tree.version)
+
+
+def get(app):
     return {
-        'categories': top_level_categories
+        'categories': get_tree(app.session).categories
     }
@@ -0,0 +1,117 @@
+"""Category totals over a date range.
+
+Whole months are read from `category_monthly_totals`, which triggers keep
+current on every write to transactions. Only the days of a partial first or
+last month are summed from the transactions themselves.
+"""
+import datetime
+from decimal import Decimal
+from florin.db import Category, CategoryMonthlyTotal, Transaction
+from sqlalchemy import Integer, cast, func, not_, union_all
+
+
+def _next_month(date):
+    return (date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def _previous_month(date):
+    return (date.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+
+
+def _is_month_end(date):
+    return date == datetime.date.max or (date + datetime.timedelta(days=1)).day == 1
+
+
+def split_date_range(start_date, end_date):
+    """Split [start_date, end_date] into whole months and the partial months at its edges.
+
+    Returns ((first_month, last_month), [(start, end)]) with all bounds inclusive; the
+    months are None when the range does not cover a single whole month.
+    """
+    if start_date > end_date:
+        return None, []
+
+    first_month = start_date if start_date.day == 1 else _next_month(start_date)
+    last_month = end_date.replace(day=1) if _is_month_end(end_date) else _previous_month(end_date)
+    if first_month > last_month:
+        return None, [(start_date, end_date)]
+
+    edges = []
+    if start_date < first_month:
+        edges.append((start_date, first_month - datetime.timedelta(days=1)))
+    if not _is_month_end(end_date):
+        edges.append((end_date.replace(day=1), end_date))
+    return (first_month, last_month), edges
+
+
+def _to_amount(amount_cents):
+    return Decimal(amount_cents) / 100
+
+
+def _get_parts(session, start_date, end_date):
+    # (category_id, amount_cents) rows to be summed per category, None if the range is empty
+    months, edges = split_date_range(start_date, end_date)
+
+    queries = []
+    if months is not None:
+        first_month, last_month = months
+        queries.append(
+            session.query(CategoryMonthlyTotal.category_id.label('category_id'),
+                          func.sum(CategoryMonthlyTotal.amount_cents).label('amount_cents'))
+            .filter(CategoryMonthlyTotal.month >= first_month)
+            .filter(CategoryMonthlyTotal.month <= last_month)
+            .group_by(CategoryMonthlyTotal.category_id)
+        )
+    for edge_start, edge_end in edges:
+        queries.append(
+            session.query(Transaction.category_id.label('category_id'),
+                          func.sum(cast(func.round(Transaction.amount * 100), Integer)).label('amount_cents'))
+            .filter(Transaction.date >= edge_start)
+            .filter(Transaction.date <= edge_end)
+            .filter(Transaction.account_id.isnot(None))
+            .filter(not_(Transaction.deleted))
+            .group_by(Transaction.category_id)
+        )
+    if not queries:
+        return None
+    return union_all(*[q.statement for q in queries]).alias()
+
+
+def get_totals(session, start_date, end_date, category_type):
+    """[(category_id, parent_id, amount)] of the categories of `category_type`, ordered by id"""
+    parts = _get_parts(session, start_date, end_date)
+    if parts is None:
+        return []
+
+    query = (
+        session.query(Category.id, Category.parent_id, func.sum(parts.c.amount_cents))
+        .join(parts, parts.c.category_id == Category.id)
+        .filter(Category.type == category_type)
+        .group_by(Category.id)
+        .order_by(Category.id)
+    )
+    return [
+        (id, parent_id, _to_amount(amount_cents))
+        for id, parent_id, amount_cents in query.all()
+    ]
+
+
+def get_parent_totals(session, start_date, end_date, category_type):
+    """[(category_id, amount)] of the top level categories, subcategories included, largest amount first"""
+    parts = _get_parts(session, start_date, end_date)
+    if parts is None:
+        return []
+
+    parent_id = func.coalesce(Category.parent_id, Category.id)
+    total = func.sum(parts.c.amount_cents)
+    query = (
+        session.query(parent_id, total)
+        .join(parts, parts.c.category_id == Category.id)
+        .filter(Category.type == category_type)
+        .group_by(parent_id)
+        .order_by(total.desc(), parent_id.desc())
+    )
+    return [
+        (id, _to_amount(amount_cents))
+        for id, amount_cents in query.all()
+    ]
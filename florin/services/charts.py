@@ -1,32 +1,35 @@
-import datetime
 from decimal import Decimal
 from .params import get_date_range_params
-from florin.db import Account, Transaction
-from sqlalchemy import func, not_
+from . import accounts as accounts_service, daily_balances
+from florin.db import Account, db_transaction
+from florin.serialization import Stream
 
 
-def _generate_account_histories(account_balance_by_date, accounts):
-    # reorganize account_balance_by_date into a list of account hisgtories
-    # account_balance_by_date is of the structure:
-    # { DATE: { ACCOUNT_ID: balance} }
-    retval = []
+# charts with more points than this are streamed
+STREAMING_DATA_POINTS = 20000
 
-    def find_account_history_by_id(account_id):
-        for account_history in retval:
-            if account_history.get('account')['id'] == account_id:
-                return account_history
-        return None
 
-    for date, data_points in sorted(account_balance_by_date.items()):
-        for account_id, data_point in data_points.items():
-            account_history = find_account_history_by_id(account_id)
-            if account_history:
-                account_history['history'].append(data_point)
-            else:
-                account_history = {'account': accounts[account_id],
-                                   'history': [data_point]}
-                retval.append(account_history)
-    return retval
+def _sweep(all_date_points, data_points):
+    # Single pass merge of an account's (sorted) data points against the
+    # (sorted) union of all date points. Returns a balance column indexed the
+    # same way as all_date_points: dates before the first data point are 0,
+    # gaps are filled with the most recent known balance.
+    balances = [None] * len(all_date_points)
+    balance = Decimal('0')
+    i, num_data_points = 0, len(data_points)
+    for j, date_point in enumerate(all_date_points):
+        if i < num_data_points and data_points[i]['date'] == date_point:
+            balance = data_points[i]['balance']
+            # skip over data points sharing the same date; the first one wins
+            while i < num_data_points and data_points[i]['date'] == date_point:
+                i += 1
+        balances[j] = balance
+    return balances
+
+
+def _retrofit_history(all_date_points, history):
+    balances = _sweep(all_date_points, history)
+    return [{'date': date_point, 'balance': balance} for date_point, balance in zip(all_date_points, balances)]
 
 
 def retrofit(account_histories):
@@ -36,107 +39,39 @@ def retrofit(account_histories):
     # Output:
     #  All accounts have history data points on all dates included in the
     #  response
-    accounts = {
-        account_history['account']['id']: account_history['account']
-        for account_history in account_histories
-    }
-    all_date_points = sorted(list(set([
+    all_date_points = sorted(set(
         history['date']
         for account_history in account_histories
         for history in account_history['history']
-    ])))
-
-    account_balance_by_date = {
-        date: {}
-        for date in all_date_points
-    }
+    ))
 
-    for account_history in account_histories:
-        account = account_history['account']
-        data_points = account_history['history']
-        i = 0  # i is the index for account_history['history']
-        j = 0  # j is the index for all_date_points
-        # while i < len(data_points) and j < len(all_date_points):
-        while j < len(all_date_points):
-            data_point = data_points[i]
-            date_point = all_date_points[j]
-
-            if data_point['date'] == date_point:
-                # date point exists in the series
-                i = min(i + 1, len(data_points) - 1)
-                j += 1
-                account_balance_by_date[date_point][account['id']] = data_point
-            elif data_point['date'] >= date_point:
-                j += 1
-                balance = Decimal('0') if i == 0 else data_points[i-1]['balance']
-                account_balance_by_date[date_point][account['id']] = {'date': date_point,
-                                                                      'balance': balance}
-            else:
-                j += 1
-                balance = data_points[i]['balance']
-                account_balance_by_date[date_point][account['id']] = {'date': date_point,
-                                                                      'balance': balance}
-
-    return _generate_account_histories(account_balance_by_date, accounts)
+    return [
+        {'account': account_history['account'],
+         'history': _retrofit_history(all_date_points, account_history['history'])}
+        for account_history in account_histories
+    ]
 
 
 def get_account_balance_chart_data(app, args):
     start_date, end_date = get_date_range_params(args)
 
-    accounts = (
-        Account.query()
-        .filter(not_(Account.deleted))
-    ).all()
-
-    response = []
-
-    for account in accounts:
-        account_history = {'account': account.to_dict(),
-                           'history': []}
-        balances_in_date_range = [
-            balance for balance in account.balances
-            if start_date <= balance.date <= end_date
-        ]
-
-        if not balances_in_date_range:
-            continue
-
-        latest_balance = balances_in_date_range[-1]
-
-        if len(balances_in_date_range) == 1:
-            account_history['history'].append({
-                'date': latest_balance.date,
-                'balance': latest_balance.balance
-            })
-        if len(balances_in_date_range) > 1:
-            account_history['history'].append({
-                'date': latest_balance.date,
-                'balance': latest_balance.balance
-            })
-            account_history['history'].append({
-                'date': balances_in_date_range[0].date,
-                'balance': balances_in_date_range[0].balance
-            })
-
-        delta_by_date = (
-            app.session.query(Transaction.date, func.sum(Transaction.amount))
-            .filter(Transaction.account_id == account.id)
-            .filter(not_(Transaction.deleted))
-            .filter(Transaction.date <= min(latest_balance.date, end_date))
-            .filter(Transaction.date >= start_date)
-            .order_by(Transaction.date.desc())
-            .group_by(Transaction.date)
-        ).all()
-
-        next_balance = latest_balance.balance
-        for date, delta_amount in delta_by_date:
-            balance = next_balance - delta_amount
-            account_history['history'].append({
-                'date': date + datetime.timedelta(days=-1),
-                'balance': balance
-            })
-        account_history['history'].sort(key=lambda h: h['date'])
-        response.append(account_history)
-
-    response = retrofit(response)
-    return {'chartData': response}
+    with db_transaction(app.session) as session:
+        daily_balances.refresh(session)
+    all_date_points = daily_balances.get_dates_in_range(session, start_date, end_date)
+    account_ids = daily_balances.get_account_ids_in_range(session, start_date, end_date)
+
+    read_model = accounts_service.ACCOUNT_READ_MODEL
+    accounts = read_model.all(session, read_model.query(session).filter(Account.id.in_(account_ids))
+                              .order_by(Account.id)) if account_ids else []
+    account_dicts = {account_dict['id']: account_dict for account_dict in accounts_service.to_dicts(accounts)}
+
+    # same as retrofit, one account at a time
+    chart_data = (
+        {'account': account_dicts[account_id],
+         'history': _retrofit_history(all_date_points, [{'date': date, 'balance': balance}
+                                                        for date, balance in history])}
+        for account_id, history in daily_balances.iter_in_date_range(session, start_date, end_date)
+    )
+    if len(all_date_points) * len(accounts) > STREAMING_DATA_POINTS:
+        return {'chartData': Stream(chart_data)}
+    return {'chartData': list(chart_data)}
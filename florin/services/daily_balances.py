@@ -0,0 +1,149 @@
+"""Materialized account balance history.
+
+The balance records (`account_balances`) of an account are its anchors. The
+balance on the day before each transaction date is inferred by walking
+backwards from the nearest anchor on or after that date and undoing the
+transactions in between. Transactions after the latest anchor have nothing to
+be inferred from and are ignored.
+
+Triggers queue the (account_id, date) of every write to transactions or
+account_balances in `daily_balance_changes`. `refresh` recomputes only the
+segment of each account's history between the anchors surrounding the
+queued dates.
+"""
+import datetime
+import itertools
+import operator
+from florin.db import Account, AccountBalance, DailyBalance, DailyBalanceChange, Transaction
+from sqlalchemy import func, not_
+
+
+def _compute_points(anchors, deltas):
+    # anchors: [(date, balance)], deltas: [(date, sum of amounts)]
+    # returns {date: balance}
+    anchors = dict(anchors)
+    deltas = dict(deltas)
+    points = dict(anchors)
+    balance = None
+    for date in sorted(set(anchors) | set(deltas), reverse=True):
+        if date in anchors:
+            balance = anchors[date]
+        if date in deltas and balance is not None:
+            balance -= deltas[date]
+            previous_date = date + datetime.timedelta(days=-1)
+            if previous_date not in anchors:
+                points[previous_date] = balance
+    return points
+
+
+def _get_window(session, account_id, min_date, max_date):
+    # anchors surrounding the changed dates; None means unbounded
+    lo = (
+        session.query(func.max(AccountBalance.date))
+        .filter(AccountBalance.account_id == account_id)
+        .filter(AccountBalance.date < min_date)
+    ).scalar()
+    hi = (
+        session.query(func.min(AccountBalance.date))
+        .filter(AccountBalance.account_id == account_id)
+        .filter(AccountBalance.date >= max_date)
+    ).scalar()
+    return lo, hi
+
+
+def _refresh_window(session, account_id, lo, hi):
+    daily_balances = session.query(DailyBalance).filter(DailyBalance.account_id == account_id)
+    anchors = (
+        session.query(AccountBalance.date, AccountBalance.balance)
+        .filter(AccountBalance.account_id == account_id)
+    )
+    deltas = (
+        session.query(Transaction.date, func.sum(Transaction.amount))
+        .filter(Transaction.account_id == account_id)
+        .filter(not_(Transaction.deleted))
+        .group_by(Transaction.date)
+    )
+    if lo is not None:
+        daily_balances = daily_balances.filter(DailyBalance.date >= lo)
+        anchors = anchors.filter(AccountBalance.date >= lo)
+        deltas = deltas.filter(Transaction.date > lo)
+    if hi is not None:
+        daily_balances = daily_balances.filter(DailyBalance.date <= hi)
+        anchors = anchors.filter(AccountBalance.date <= hi)
+        deltas = deltas.filter(Transaction.date <= hi)
+
+    daily_balances.delete(synchronize_session=False)
+    points = _compute_points(anchors.all(), deltas.all())
+    if points:
+        session.execute(DailyBalance.__table__.insert(), [
+            {'account_id': account_id, 'date': date, 'balance': balance}
+            for date, balance in points.items()
+        ])
+
+
+def refresh(session):
+    """Bring daily balances up to date with the queued changes. Must be called within a `db_transaction`"""
+    changes = (
+        session.query(func.max(DailyBalanceChange.id), DailyBalanceChange.account_id,
+                      func.min(DailyBalanceChange.date), func.max(DailyBalanceChange.date))
+        .group_by(DailyBalanceChange.account_id)
+    ).all()
+    if not changes:
+        return
+
+    for _, account_id, min_date, max_date in changes:
+        lo, hi = _get_window(session, account_id, min_date, max_date)
+        _refresh_window(session, account_id, lo, hi)
+
+    # changes queued meanwhile by other writers get a higher id and are kept
+    max_id = max(change[0] for change in changes)
+    session.execute(DailyBalanceChange.__table__.delete().where(DailyBalanceChange.id <= max_id))
+
+
+def rebuild(session):
+    """Recompute the daily balances of all accounts from scratch. Must be called within a `db_transaction`"""
+    session.query(DailyBalanceChange).delete(synchronize_session=False)
+    session.query(DailyBalance).delete(synchronize_session=False)
+    for account_id, in session.query(Account.id).all():
+        _refresh_window(session, account_id, None, None)
+
+
+def _in_date_range(session, columns, start_date, end_date):
+    return (
+        session.query(*columns)
+        .join(Account, Account.id == DailyBalance.account_id)
+        .filter(not_(Account.deleted))
+        .filter(DailyBalance.date >= start_date)
+        .filter(DailyBalance.date <= end_date)
+    )
+
+
+def get_dates_in_range(session, start_date, end_date):
+    """Sorted dates with a balance of any account that is not deleted"""
+    query = _in_date_range(session, [DailyBalance.date], start_date, end_date).distinct().order_by(DailyBalance.date)
+    return [date for date, in query.all()]
+
+
+def get_account_ids_in_range(session, start_date, end_date):
+    query = _in_date_range(session, [DailyBalance.account_id], start_date, end_date).distinct()
+    return sorted(account_id for account_id, in query.all())
+
+
+def iter_in_date_range(session, start_date, end_date, yield_per=1000):
+    """(account_id, [(date, balance)]) by account id, for accounts that are not deleted.
+
+    Rows are read `yield_per` at a time, so only one account is held in memory.
+    """
+    query = (
+        _in_date_range(session, [DailyBalance.account_id, DailyBalance.date, DailyBalance.balance],
+                       start_date, end_date)
+        .order_by(DailyBalance.account_id, DailyBalance.date)
+        .yield_per(yield_per)
+    )
+    for account_id, rows in itertools.groupby(query, key=operator.itemgetter(0)):
+        yield account_id, [(date, balance) for _, date, balance in rows]
+
+
+def get_in_date_range(session, start_date, end_date):
+    """{account_id: [(date, balance)]} for accounts that are not deleted"""
+    return dict(iter_in_date_range(session, start_date, end_date))
@@ -0,0 +1,76 @@
+"""Bulk transaction exports.
+
+Rows are selected with the same `TransactionFilter` and `Sorter` as the
+transaction list, but read as plain Core rows - no ORM objects - a batch at
+a time, and written out as they are read.
+"""
+import collections
+import csv
+import json
+from cStringIO import StringIO
+from florin.db import Transaction, get_read_model
+from florin.serialization import make_default, MyJSONEncoder
+from sqlalchemy import not_
+from . import accounts, exceptions
+from .transactions import TransactionFilter, Sorter
+
+
+EXPORT_FIELDS = ['id', 'account_id', 'date', 'info', 'payee', 'memo', 'amount', 'transaction_type', 'category_id']
+EXPORT_BATCH_SIZE = 5000
+
+Export = collections.namedtuple('Export', ['mimetype', 'filename', 'chunks'])
+
+
+def _encode(value):
+    return value.encode('utf-8') if isinstance(value, unicode) else value
+
+
+def _iter_csv(batches):
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in batches:
+        start = buf.tell()
+        try:
+            # csv can only write unicode that is plain ascii, which is nearly all of it
+            writer.writerows(rows)
+        except UnicodeEncodeError:
+            buf.seek(start)
+            buf.truncate()
+            writer.writerows([_encode(value) for value in row] for row in rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def _iter_ndjson(batches):
+    # without sort_keys the json module encodes with its C accelerated encoder
+    encode = json.JSONEncoder(separators=(',', ':'), default=make_default(MyJSONEncoder().default)).encode
+    for rows in batches:
+        yield ''.join([encode(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in rows])
+
+
+FORMATS = {
+    'csv': ('text/csv', _iter_csv),
+    'ndjson': ('application/x-ndjson', _iter_ndjson),
+}
+
+
+def export(app, account_id, args):
+    """An `Export` whose chunks are only read from the database as they are consumed"""
+    format = args.get('format', 'csv')
+    if format not in FORMATS:
+        raise exceptions.InvalidRequest('Invalid format param: "{}"'.format(format))
+    mimetype, iter_format = FORMATS[format]
+
+    session = app.session
+    account = accounts.get_by_id(app, account_id)
+    read_model = get_read_model(Transaction, EXPORT_FIELDS)
+    query = reduce(lambda query, fn: fn(query),
+                   [TransactionFilter(account, args), Sorter(Transaction, args, 'date:desc')],
+                   read_model.query(session).filter(not_(Transaction.deleted)))
+
+    return Export(mimetype=mimetype,
+                  filename='transactions-{}.{}'.format(account_id, format),
+                  chunks=iter_format(read_model.iter_batches(session, query, EXPORT_BATCH_SIZE)))
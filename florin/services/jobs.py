@@ -0,0 +1,167 @@
+"""Background jobs, run off the jobs table by a pool of worker threads.
+
+A request only adds a job row and returns its id; the worker threads of every
+process claim queued jobs in id order and run the handler of their kind.
+Handlers commit their work in steps with `checkpoint`, which also records the
+job's progress and renews its lease, so a job whose worker went away (the
+process restarted, say) is taken over once the lease runs out and carries on
+from its last checkpoint.
+"""
+import datetime
+import logging
+import threading
+import uuid
+from florin.db import Job, db_transaction
+from sqlalchemy import and_, or_
+from sqlalchemy.orm.exc import NoResultFound
+from .exceptions import ResourceNotFound
+
+
+logger = logging.getLogger(__name__)
+
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+PENDING = (QUEUED, RUNNING)
+
+# worker threads per process, unless the JOB_WORKERS environment variable says otherwise
+WORKERS = 2
+
+# seconds between looks at the jobs table when no job was submitted by this process
+POLL_INTERVAL = 1.0
+
+# seconds a running job can go without a checkpoint before another worker may take it over
+LEASE = 60
+
+
+_wakeup = threading.Event()
+_workers = []
+
+
+class JobLost(Exception):
+    """Another worker took the job over; whatever was not checkpointed must be given up"""
+
+
+def enqueue(session, kind, **fields):
+    """Add a job to the queue; it can be claimed once the caller commits, see `notify`"""
+    now = datetime.datetime.utcnow()
+    job = Job(kind=kind, status=QUEUED, progress=0, total_imported=0, total_skipped=0,
+              created_at=now, updated_at=now, **fields)
+    session.add(job)
+    session.flush()
+    return job
+
+
+def notify():
+    """Wake the workers of this process up, instead of leaving new jobs until their next poll"""
+    _wakeup.set()
+
+
+def get(app, job_id):
+    try:
+        job = Job.get_by_id(job_id)
+    except NoResultFound:
+        raise ResourceNotFound()
+    return {'job': job.to_dict()}
+
+
+def _claimable(now):
+    return or_(Job.status == QUEUED,
+               and_(Job.status == RUNNING, Job.updated_at < now - datetime.timedelta(seconds=LEASE)))
+
+
+def claim(session, now=None, job_id=None):
+    """The oldest job waiting for a worker (or job `job_id`), now running under a new owner; None if there is none"""
+    now = now or datetime.datetime.utcnow()
+    query = session.query(Job.id).filter(_claimable(now))
+    if job_id is not None:
+        query = query.filter(Job.id == job_id)
+    # a few candidates, in case other workers get to the first ones first
+    for job_id, in query.order_by(Job.id).limit(WORKERS + 1).all():
+        owner = uuid.uuid4().hex
+        with db_transaction(session):
+            # only one of the workers racing for the job gets to update it
+            claimed = (
+                session.query(Job).filter(Job.id == job_id).filter(_claimable(now))
+                .update({'status': RUNNING, 'owner': owner, 'updated_at': now}, synchronize_session=False)
+            )
+        if claimed:
+            job = session.query(Job).filter_by(id=job_id).one()
+            # kept apart from `owner`, which reloads after a commit to whoever owns the job by then
+            job.claimed_by = owner
+            return job
+    return None
+
+
+def checkpoint(session, job, **fields):
+    """Commit the work of the job so far along with `fields` of the job, renewing its lease.
+
+    `job` is one returned by `claim`. Raises `JobLost` (after rolling back) when
+    the job is not the worker's any more.
+    """
+    fields['updated_at'] = datetime.datetime.utcnow()
+    updated = (
+        session.query(Job).filter_by(id=job.id, owner=job.claimed_by)
+        .update(fields, synchronize_session='evaluate')
+    )
+    if not updated:
+        session.rollback()
+        raise JobLost('Job {} was taken over'.format(job.id))
+    session.commit()
+
+
+def finish(session, job, status=DONE, error=None):
+    checkpoint(session, job, status=status, owner=None, error=error)
+
+
+def run(session, job, handlers):
+    """Run a claimed job to completion; failures are recorded on the job"""
+    try:
+        handlers[job.kind](session, job)
+    except JobLost:
+        logger.warn('Job {} was taken over by another worker'.format(job.id))
+        session.rollback()
+    except Exception as e:
+        logger.exception('Job {} failed'.format(job.id))
+        session.rollback()
+        try:
+            finish(session, job, FAILED, error=u'{}: {}'.format(type(e).__name__, e))
+        except JobLost:
+            pass
+
+
+def work(app, handlers):
+    """The loop of a worker thread: run claimed jobs one after the other, wait for more when there are none"""
+    while True:
+        job = None
+        try:
+            job = claim(app.session)
+            if job is not None:
+                run(app.session, job, handlers)
+        except Exception:
+            logger.exception('Job worker error')
+        finally:
+            app.session.remove()
+        if job is None:
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+
+
+def start(app, handlers, workers=WORKERS):
+    """Run jobs in `workers` daemon threads of this process. `handlers` maps job kinds to fn(session, job)"""
+    for i in xrange(workers):
+        thread = threading.Thread(target=work, args=(app, handlers), name='jobs-{}'.format(i))
+        thread.daemon = True
+        thread.start()
+        _workers.append(thread)
+
+
+def has_workers():
+    """Whether this process runs jobs in the background; when it doesn't, see `run_now`"""
+    return any(thread.is_alive() for thread in _workers)
+
+
+def run_now(session, job, handlers):
+    """Run a job just enqueued (and committed) in the calling thread, for processes without workers"""
+    claimed = claim(session, job_id=job.id)
+    if claimed is not None:
+        run(session, claimed, handlers)
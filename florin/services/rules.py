@@ -0,0 +1,234 @@
+"""Rule based categorization of transactions.
+
+All the rules are compiled into one `Matcher`. Payee and memo patterns are
+normalized into words and indexed by their first word, so matching a
+transaction costs a dict lookup per word of its payee and memo, however many
+rules there are. The matcher is rebuilt only when the rules change.
+
+The matcher categorizes transactions as they are imported (see
+`uploads.iter_import_batches`), and `apply` runs it over the transactions
+still to be categorized.
+"""
+import collections
+import re
+from decimal import Decimal, InvalidOperation
+from florin.db import (
+    Account, CategorizationRule, Category, Transaction, bulk_account_write, db_transaction, get_read_model)
+from sqlalchemy import bindparam, not_
+from sqlalchemy.orm.exc import NoResultFound
+from . import cache_versions, daily_balances
+from .categories import TBD_CATEGORY_ID
+from .exceptions import InvalidRequest, ResourceNotFound
+
+
+# transactions read per batch when applying rules
+APPLY_BATCH_SIZE = 500
+
+WORD = re.compile(r'[^\W_]+', re.UNICODE)
+
+Rule = collections.namedtuple('Rule', ['id', 'category_id', 'payee', 'memo', 'min_amount', 'max_amount',
+                                       'account_id'])
+
+
+def normalize(text):
+    """The words of `text`, upper cased; punctuation and spacing never make a difference"""
+    if not text:
+        return ()
+    if isinstance(text, str):
+        text = text.decode('utf-8', 'replace')
+    return tuple(WORD.findall(text.upper()))
+
+
+class _WordIndex(object):
+    """Finds which of many word sequences occur in a text, in one pass over the words of the text
+
+    Sequences are looked up whole in a dict; the first word of a sequence only
+    tells which lengths to try, so sequences sharing a first word cost a lookup
+    per distinct length rather than one comparison each.
+    """
+    def __init__(self):
+        self.keys_by_words = collections.defaultdict(list)
+        self.lengths_by_first_word = collections.defaultdict(set)
+
+    def add(self, words, key):
+        self.keys_by_words[words].append(key)
+        self.lengths_by_first_word[words[0]].add(len(words))
+
+    def find(self, words):
+        found = set()
+        for i, word in enumerate(words):
+            for length in self.lengths_by_first_word.get(word, ()):
+                found.update(self.keys_by_words.get(words[i:i + length], ()))
+        return found
+
+
+class Matcher(object):
+    def __init__(self, rules):
+        """`rules` in order of precedence"""
+        self.rules = [rule._replace(payee=normalize(rule.payee), memo=normalize(rule.memo)) for rule in rules]
+        self.payees = _WordIndex()
+        self.memos = _WordIndex()
+        # rules with no words to match on are candidates for every transaction
+        self.unindexed = set()
+        for i, rule in enumerate(self.rules):
+            if rule.payee:
+                self.payees.add(rule.payee, i)
+            if rule.memo:
+                self.memos.add(rule.memo, i)
+            if not rule.payee and not rule.memo:
+                self.unindexed.add(i)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, payee, memo, amount, account_id):
+        """The category id of the first rule matching the transaction, None if none does"""
+        if not self.rules:
+            return None
+        payee_matches = self.payees.find(normalize(payee))
+        memo_matches = self.memos.find(normalize(memo))
+        for i in sorted(payee_matches | memo_matches | self.unindexed):
+            rule = self.rules[i]
+            if rule.payee and i not in payee_matches:
+                continue
+            if rule.memo and i not in memo_matches:
+                continue
+            if rule.account_id is not None and rule.account_id != account_id:
+                continue
+            if rule.min_amount is not None and amount < rule.min_amount:
+                continue
+            if rule.max_amount is not None and amount > rule.max_amount:
+                continue
+            return rule.category_id
+        return None
+
+
+_matcher = (None, Matcher([]))
+
+
+def get_matcher(session):
+    """The `Matcher` of the current rules; treat it as read only"""
+    global _matcher
+    version = cache_versions.get_version(session, 'categorization_rules')
+    matcher_version, matcher = _matcher
+    if matcher_version != version:
+        read_model = get_read_model(CategorizationRule, Rule._fields)
+        query = read_model.query(session).order_by(CategorizationRule.id)
+        matcher = Matcher(Rule._make(row) for row in read_model.all(session, query))
+        _matcher = (version, matcher)
+    return matcher
+
+
+def get(app):
+    return {
+        'rules': [rule.to_dict() for rule in CategorizationRule.query().order_by(CategorizationRule.id).all()]
+    }
+
+
+def _parse_amount(request_json, field):
+    value = request_json.get(field)
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise InvalidRequest("Invalid field '{}'".format(field))
+
+
+def post(app, request_json):
+    session = app.session
+    request_json = request_json.get('rule') if isinstance(request_json, dict) else None
+    if not isinstance(request_json, dict):
+        raise InvalidRequest("Invalid field 'rule'")
+
+    try:
+        Category.get_by_id(request_json.get('category_id'))
+    except NoResultFound:
+        raise InvalidRequest("Invalid field 'category_id'")
+    account_id = request_json.get('account_id')
+    if account_id is not None and session.query(Account).filter_by(id=account_id).count() != 1:
+        raise InvalidRequest("Invalid field 'account_id'")
+    for field in ('payee', 'memo'):
+        if request_json.get(field) is not None and not normalize(request_json[field]):
+            raise InvalidRequest("Invalid field '{}': no words to match".format(field))
+
+    rule = CategorizationRule(category_id=request_json['category_id'],
+                              payee=request_json.get('payee'),
+                              memo=request_json.get('memo'),
+                              min_amount=_parse_amount(request_json, 'min_amount'),
+                              max_amount=_parse_amount(request_json, 'max_amount'),
+                              account_id=account_id)
+    with db_transaction(session):
+        session.add(rule)
+    return {'rule': CategorizationRule.get_by_id(rule.id).to_dict()}
+
+
+def delete(app, rule_id):
+    try:
+        rule = CategorizationRule.get_by_id(rule_id)
+    except NoResultFound:
+        raise ResourceNotFound()
+    with db_transaction(app.session) as session:
+        session.delete(rule)
+    return {'ruleId': rule_id}
+
+
+def _apply_to_account(session, matcher, account_id):
+    # (categorized, processed); uncategorized rows are read in id order, a batch at a time, and
+    # updated by one executemany of a single compiled statement per batch
+    read_model = get_read_model(Transaction, ['id', 'payee', 'memo', 'amount', 'account_id'])
+    query = (
+        read_model.query(session)
+        .filter(Transaction.account_id == account_id)
+        .filter(Transaction.category_id == TBD_CATEGORY_ID)
+        .filter(not_(Transaction.deleted))
+    )
+    update = (
+        Transaction.__table__.update()
+        .where(Transaction.id == bindparam('transaction_id'))
+        .values(category_id=bindparam('new_category_id'))
+    )
+    total_categorized, total_processed = 0, 0
+    last_id = 0
+    while True:
+        batch = query.filter(Transaction.id > last_id).order_by(Transaction.id).limit(APPLY_BATCH_SIZE)
+        rows = read_model.all(session, batch)
+        if not rows:
+            return total_categorized, total_processed
+        last_id = rows[-1].id
+        total_processed += len(rows)
+
+        params = []
+        for row in rows:
+            category_id = matcher.match(row.payee, row.memo, row.amount, row.account_id)
+            if category_id is not None and category_id != TBD_CATEGORY_ID:
+                params.append({'transaction_id': row.id, 'new_category_id': category_id})
+        if params:
+            session.execute(update, params)
+            total_categorized += len(params)
+
+
+def apply(app, request_json):
+    """Categorize the uncategorized transactions of an account (every account by default) by the rules"""
+    session = app.session
+    account_id = (request_json or {}).get('accountId', '_all')
+    matcher = get_matcher(session)
+
+    query = (
+        session.query(Transaction.account_id).distinct()
+        .filter(Transaction.account_id.isnot(None))
+        .filter(Transaction.category_id == TBD_CATEGORY_ID)
+        .filter(not_(Transaction.deleted))
+    )
+    if account_id != '_all':
+        query = query.filter(Transaction.account_id == account_id)
+
+    total_categorized, total_processed = 0, 0
+    with db_transaction(session):
+        for account_id, in (query.all() if len(matcher) else []):
+            # the derived tables are brought up to date once per account instead of once per row
+            with bulk_account_write(session, account_id):
+                categorized, processed = _apply_to_account(session, matcher, account_id)
+            total_categorized, total_processed = total_categorized + categorized, total_processed + processed
+        daily_balances.refresh(session)
+    return {'total_categorized': total_categorized, 'total_processed': total_processed}
@@ -1,10 +1,28 @@
+import base64
+import datetime
+import json
 import math
-from florin.db import Transaction, db_transaction
+import operator
+from decimal import Decimal, InvalidOperation
+from florin.db import Category, Transaction, db_transaction, get_read_model
+from florin.serialization import Stream
 from asbool import asbool
 from .params import get_date_range_params
 from .categories import TBD_CATEGORY_ID, INTERNAL_TRANSFER_CATEGORY_ID
-from . import accounts, exceptions
-from sqlalchemy import and_, not_
+from . import accounts, daily_balances, exceptions
+from sqlalchemy import Date, Float, and_, or_, not_
+from sqlalchemy.orm.exc import NoResultFound
+
+
+# pages bigger than this are streamed
+STREAMING_PAGE_SIZE = 1000
+YIELD_PER = 1000
+
+# ids per statement of a bulk update; stays well below SQLITE_MAX_VARIABLE_NUMBER (999)
+BULK_UPDATE_BATCH_SIZE = 500
+
+# fields a bulk update may change
+BULK_UPDATE_FIELDS = ['date', 'info', 'payee', 'memo', 'amount', 'transaction_type', 'category_id']
 
 
 class Paginator(object):
@@ -19,6 +37,76 @@ class Paginator(object):
         return query.limit(self.per_page).offset((self.page - 1) * self.per_page)
 
 
+class KeysetPaginator(object):
+    """Cursor based pagination: seeks past the last row of the previous page instead of using OFFSET
+
+    Rows are ordered by the sorter's column with `id` as the tie breaker, and
+    the cursor encodes both values of the last row returned.
+    """
+    def __init__(self, sorter, args):
+        self.sorter = sorter
+        self.per_page = int(args.get('perPage', '10'))
+        self.cursor = args.get('cursor') or None
+        self.include_total = asbool(args.get('includeTotal', 'false'))
+        self.total = None
+        self.next_cursor = None
+
+    def _get_sort_column(self):
+        field_name, direction = self.sorter.order_by.split(':')
+        if self.sorter.get_order(field_name, direction) is None:
+            raise exceptions.InvalidRequest('Invalid orderBy param: "{}"'.format(self.sorter.order_by))
+        column = getattr(self.sorter.clazz, field_name)
+        columns = getattr(getattr(column, 'property', None), 'columns', None)
+        # the cursor is encoded from the listed rows, which only have the exported fields
+        if not columns or columns[0].nullable or field_name not in self.sorter.clazz.__export__:
+            raise exceptions.InvalidRequest('orderBy param "{}" is not supported with cursor'.format(
+                self.sorter.order_by))
+        return field_name, direction, column
+
+    def encode_cursor(self, row):
+        field_name, _, _ = self._get_sort_column()
+        value = getattr(row, field_name)
+        if isinstance(value, float):
+            value = repr(value)
+        elif isinstance(value, (datetime.date, Decimal)):
+            value = str(value)
+        return base64.urlsafe_b64encode(json.dumps([value, row.id]))
+
+    def decode_cursor(self, column, cursor):
+        try:
+            value, id = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            if isinstance(column.type, Date):
+                value = datetime.datetime.strptime(value, '%Y-%m-%d').date()
+            elif isinstance(column.type, Float):
+                value = float(value)
+        except (TypeError, ValueError):
+            raise exceptions.InvalidRequest('Invalid cursor: "{}"'.format(cursor))
+        return value, id
+
+    def __call__(self, query):
+        field_name, direction, column = self._get_sort_column()
+        if self.include_total:
+            self.total = query.count()
+
+        if self.cursor is not None:
+            value, id = self.decode_cursor(column, self.cursor)
+            seek = operator.lt if direction == 'desc' else operator.gt
+            id_column = self.sorter.clazz.id
+            query = query.filter(or_(seek(column, value), and_(column == value, seek(id_column, id))))
+
+        return (
+            query.order_by(self.sorter.get_order(field_name, direction), self.sorter.get_order('id', direction))
+            .limit(self.per_page + 1)
+        )
+
+    def paginate(self, rows):
+        """Drop the look-ahead row and work out the cursor for the next page"""
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            self.next_cursor = self.encode_cursor(rows[-1])
+        return rows
+
+
 class TransactionFilter(object):
     def __init__(self, account, args):
         self.start_date, self.end_date = get_date_range_params(args)
@@ -66,22 +154,53 @@ class Sorter(object):
         return query.order_by(order)
 
 
+def _get_by_cursor(session, account, args):
+    filter = TransactionFilter(account, args)
+    sorter = Sorter(Transaction, args, 'date:desc')
+    paginator = KeysetPaginator(sorter, args)
+
+    read_model = get_read_model(Transaction)
+    query = reduce(lambda query, fn: fn(query),
+                   [filter, paginator],
+                   read_model.query(session).filter(not_(Transaction.deleted)))
+    transactions = paginator.paginate(read_model.all(session, query))
+
+    response = {
+        'nextCursor': paginator.next_cursor,
+        'transactions': [read_model.to_dict(row) for row in transactions]
+    }
+    if paginator.include_total:
+        response['total'] = paginator.total
+    return response
+
+
 def get(app, account_id, args):
     session = app.session
     account = accounts.get_by_id(app, account_id)
+    if 'cursor' in args:
+        return _get_by_cursor(session, account, args)
+
     filter = TransactionFilter(account, args)
     paginator = Paginator(args)
     sorter = Sorter(Transaction, args, 'date:desc')
 
+    # plain rows of the exported columns; listing never needs the ORM instances
+    read_model = get_read_model(Transaction)
     query = reduce(lambda query, fn: fn(query),
                    [filter, sorter, paginator],
-                   session.query(Transaction).filter(not_(Transaction.deleted)))
-    transactions = query.all()
+                   read_model.query(session).filter(not_(Transaction.deleted)))
+    if paginator.per_page > STREAMING_PAGE_SIZE:
+        # rows are read and serialized a batch at a time as the response is sent
+        transactions = Stream(read_model.to_dict(row)
+                              for rows in read_model.iter_batches(session, query, YIELD_PER)
+                              for row in rows)
+    else:
+        transactions = [read_model.to_dict(row) for row in read_model.all(session, query)]
 
     return {
         'total_pages': paginator.total_pages,
         'current_page': paginator.page,
-        'transactions': [txn.to_dict() for txn in transactions]
+        'transactions': transactions
     }
 
 
@@ -94,6 +213,8 @@ def delete(app, transaction_id):
     with db_transaction(app.session) as session:
         transaction.deleted = True
         session.add(transaction)
+        session.flush()
+        daily_balances.refresh(session)
     return {'transactionId': transaction_id}
 
 
@@ -108,5 +229,84 @@ def update(app, transaction_id, request_json):
 
     with db_transaction(app.session) as session:
         session.add(transaction)
+        session.flush()
+        daily_balances.refresh(session)
     transaction = app.session.query(Transaction).filter_by(id=transaction_id).one()
     return {'transactions': [transaction.to_dict()]}
+
+
+def _get_bulk_update_changes(request_json):
+    changes = request_json.get('changes')
+    if not isinstance(changes, dict) or not changes:
+        raise exceptions.InvalidRequest('changes is required')
+    changes = dict(changes)
+    for key in changes:
+        if key not in BULK_UPDATE_FIELDS:
+            raise exceptions.InvalidRequest('Invalid field "{}"'.format(key))
+    if 'date' in changes:
+        try:
+            changes['date'] = datetime.datetime.strptime(changes['date'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            raise exceptions.InvalidRequest('Invalid field "date"')
+    if 'amount' in changes:
+        # the triggers maintaining the rollups do arithmetic on it
+        try:
+            if isinstance(changes['amount'], bool):
+                raise InvalidOperation()
+            changes['amount'] = Decimal(str(changes['amount']))
+            if not changes['amount'].is_finite():
+                raise InvalidOperation()
+        except InvalidOperation:
+            raise exceptions.InvalidRequest('Invalid field "amount"')
+    if 'category_id' in changes:
+        try:
+            Category.get_by_id(changes['category_id'])
+        except NoResultFound:
+            raise exceptions.InvalidRequest('Invalid field "category_id"')
+    for key in ('payee', 'transaction_type'):
+        if key in changes and not (isinstance(changes[key], basestring) and changes[key]):
+            raise exceptions.InvalidRequest('Invalid field "{}"'.format(key))
+    for key in ('memo', 'info'):
+        if key in changes and not (changes[key] is None or isinstance(changes[key], basestring)):
+            raise exceptions.InvalidRequest('Invalid field "{}"'.format(key))
+    return {getattr(Transaction, key): value for key, value in changes.items()}
+
+
+def _get_bulk_update_ids(app, request_json):
+    """Sorted ids of the live transactions to update, selected by either `ids` or `filter` of the request"""
+    session = app.session
+    live_ids = session.query(Transaction.id).filter(not_(Transaction.deleted))
+
+    if 'ids' in request_json:
+        ids = request_json['ids']
+        if not isinstance(ids, list) or not all(isinstance(id, (int, long)) for id in ids):
+            raise exceptions.InvalidRequest('ids must be a list of transaction ids')
+        found = set()
+        for i in xrange(0, len(ids), BULK_UPDATE_BATCH_SIZE):
+            batch = ids[i:i + BULK_UPDATE_BATCH_SIZE]
+            found.update(id for id, in live_ids.filter(Transaction.id.in_(batch)).all())
+        return sorted(found)
+
+    args = request_json.get('filter')
+    if not isinstance(args, dict) or 'accountId' not in args:
+        raise exceptions.InvalidRequest('Either ids or a filter with an accountId is required')
+    try:
+        filter = TransactionFilter(accounts.get_by_id(app, args['accountId']), args)
+    except ValueError:
+        raise exceptions.InvalidRequest('Invalid date range')
+    return [id for id, in filter(live_ids).order_by(Transaction.id).all()]
+
+
+def bulk_update(app, request_json):
+    """Apply the same changes to many transactions at once, selected by ids or by a `TransactionFilter`"""
+    if not isinstance(request_json, dict):
+        raise exceptions.InvalidRequest('A JSON object is required')
+    changes = _get_bulk_update_changes(request_json)
+    ids = _get_bulk_update_ids(app, request_json)
+
+    with db_transaction(app.session) as session:
+        for i in xrange(0, len(ids), BULK_UPDATE_BATCH_SIZE):
+            batch = ids[i:i + BULK_UPDATE_BATCH_SIZE]
+            session.query(Transaction).filter(Transaction.id.in_(batch)).update(changes, synchronize_session=False)
+        daily_balances.refresh(session)
+    return {'transactionIds': ids}
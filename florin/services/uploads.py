@@ -1,27 +1,82 @@
+import atexit
 import logging
 import hashlib
-import base64
 import datetime
+import itertools
+import multiprocessing
+import operator
+import os
+import posixpath
+import signal
+import zipfile
+from collections import defaultdict, namedtuple
 from .exceptions import InvalidRequest, ResourceNotFound
-from florin.db import FileUpload, Transaction, Account, AccountBalance, db_transaction
+from florin.cache import LRUCache
+from florin.db import FileUpload, Job, Transaction, Account, AccountBalance, db_transaction
+from florin.ofxstream import StatementReader
 from ofxparse import OfxParser
 from sqlalchemy import func
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import IntegrityError
 from StringIO import StringIO
 from .categories import TBD_CATEGORY_ID
+from . import daily_balances, jobs, rules
 
 
 logger = logging.getLogger(__name__)
 
 
-def ensure_single_file_uploaded(files):
-    file_items = files.items()
-    if len(file_items) != 1:
-        raise InvalidRequest('Only one file can be uploaded at a time')
+# parsed statements of recent uploads, so linking an upload doesn't parse the file again
+PARSED_STATEMENT_CACHE_SIZE = 16
+parsed_statements = LRUCache(PARSED_STATEMENT_CACHE_SIZE)
+
+
+ParsedStatement = namedtuple('ParsedStatement', ['signature', 'balance', 'balance_date', 'transactions'])
+
+
+# statements larger than this (in bytes) are parsed with the streaming reader
+STREAMING_PARSE_THRESHOLD = 1024 * 1024
+
+
+# processes parsing the statements of a multi-file upload, unless the PARSE_PROCESSES environment variable
+# says otherwise; parsing is CPU bound, so threads wouldn't help. Every process of the server (every gunicorn
+# worker) gets a pool of its own, so by default there is none and uploads are parsed in-process
+PARSE_PROCESSES = 0
+_parse_pool = None
+
+# multi-file uploads smaller than this (in bytes, all files together) are parsed in-process;
+# shipping the files to the parse pool and the statements back costs more than it saves
+PARALLEL_PARSE_THRESHOLD = 256 * 1024
+
+
+# rows per checksum lookup and insert, and per commit of an import job;
+# stays well below SQLITE_MAX_VARIABLE_NUMBER (999)
+IMPORT_BATCH_SIZE = 500
+
+
+# the kind of the jobs that import uploads, run by `run_import_job`
+IMPORT_JOB = 'import'
+
+
+def get_file_items(files):
+    """(filename, file) of every uploaded file; `files` is the MultiDict of a request or a {filename: file} dict
+
+    Files of a request go by the name the client gave them, falling back to
+    their field: an <input type="file" multiple> sends them all in one field.
+    """
+    if hasattr(files, 'getlist'):
+        file_items = [(file_storage.filename or key, file_storage)
+                      for key in files for file_storage in files.getlist(key)]
+    else:
+        file_items = files.items()
+    if not file_items:
+        raise InvalidRequest('No file uploaded')
     return file_items
 
 
+def is_archive(filename):
+    return filename.lower().endswith('.zip')
+
+
 def ensure_file_extension(filename):
     filename = filename.lower()
     if filename.endswith('ofx') or filename.endswith('qfx'):
@@ -37,50 +92,245 @@ def calculate_account_signature(ofx_account):
     return 'sha256:' + hashlib.sha256('&'.join([str(getattr(ofx_account, field)) for field in fields])).hexdigest()
 
 
-def upload(app, files):
-    session = app.session
-    file_items = ensure_single_file_uploaded(files)
-    filename, file_storage = file_items[0]
-    ensure_file_extension(filename)
+def _get_existing_checksums(session, checksums):
+    query = session.query(Transaction.checksum).filter(Transaction.checksum.in_(checksums))
+    return set(checksum for checksum, in query.all())
+
 
-    parser = OfxParser()
-    ofxfile = parser.parse(file_storage)
-    account_signature = calculate_account_signature(ofxfile.account)
+def _import_batch(session, rows):
+    seen_checksums = _get_existing_checksums(session, [r['checksum'] for r in rows])
+    new_rows = []
+    for row in rows:
+        if row['checksum'] in seen_checksums:
+            logger.warn('Skip duplicated transaction: {}. checksum: {}'.format(row, row['checksum']))
+            continue
+        seen_checksums.add(row['checksum'])
+        new_rows.append(row)
 
+    if new_rows:
+        session.execute(Transaction.__table__.insert(), new_rows)
+    return len(new_rows), len(rows) - len(new_rows)
+
+
+def iter_import_batches(session, account, ofx_transactions, matcher=None):
+    """Bulk insert ofx transactions into the account, skipping the ones already imported.
+
+    `ofx_transactions` can be any iterable; it is consumed in batches so a
+    streamed statement is never held in memory as a whole. Transactions go to
+    the category of the first rule of `matcher` they match, TBD otherwise.
+    Yields (imported, skipped) once each batch is inserted, so the caller can
+    commit as it goes.
+    """
+    rows = []
+    for t in ofx_transactions:
+        row = dict(date=t.date,
+                   info=t.memo,
+                   payee=t.payee,
+                   memo=t.memo,
+                   amount=t.amount,
+                   transaction_type=t.type,
+                   category_id=TBD_CATEGORY_ID,
+                   account_id=account.id,
+                   deleted=False)
+        row['checksum'] = Transaction._calculate_checksum(row)
+        if matcher:
+            row['category_id'] = matcher.match(t.payee, t.memo, t.amount, account.id) or TBD_CATEGORY_ID
+        rows.append(row)
+        if len(rows) == IMPORT_BATCH_SIZE:
+            yield _import_batch(session, rows)
+            rows = []
+
+    if rows:
+        yield _import_batch(session, rows)
+
+
+def _get_size(file_storage):
+    file_storage.seek(0, os.SEEK_END)
+    size = file_storage.tell()
     file_storage.seek(0)
-    file_upload = FileUpload(filename=filename, uploaded_at=datetime.datetime.utcnow(),
-                             file_content=base64.b64encode(file_storage.read()),
-                             account_signature=account_signature)
+    return size
+
+
+def parse_statement(file_storage):
+    if _get_size(file_storage) > STREAMING_PARSE_THRESHOLD:
+        # only the statement skeleton is parsed here; transactions are streamed when linking
+        ofxfile = StatementReader(file_storage).ofx
+        transactions = None
+    else:
+        ofxfile = OfxParser().parse(file_storage)
+        transactions = list(ofxfile.account.statement.transactions)
+
+    statement = ofxfile.account.statement
+    return ParsedStatement(signature=calculate_account_signature(ofxfile.account),
+                           balance=statement.balance,
+                           balance_date=statement.balance_date,
+                           transactions=transactions)
+
+
+def _parsed_statement_key(file_upload):
+    # ids can be reused once rows are deleted, so pin the key to the upload time too
+    return file_upload.id, file_upload.uploaded_at
+
+
+def _get_file_storage(file_upload):
+    # decompressed as it is read, so a statement streamed by `iter_transactions` is never in memory as a whole
+    return file_upload.open_file_content()
+
+
+def get_parsed_statement(file_upload):
+    parsed_statement = parsed_statements.get(_parsed_statement_key(file_upload))
+    if parsed_statement is None:
+        parsed_statement = parse_statement(_get_file_storage(file_upload))
+    return parsed_statement
+
+
+def iter_transactions(file_upload, parsed_statement):
+    if parsed_statement.transactions is not None:
+        return iter(parsed_statement.transactions)
+    return StatementReader(_get_file_storage(file_upload)).transactions()
+
+
+def iter_archive(filename, file_storage):
+    """(filename, content) of the statements in a zip archive, leaving out folders and hidden files"""
+    try:
+        archive = zipfile.ZipFile(file_storage)
+    except zipfile.BadZipfile:
+        raise InvalidRequest('{} is not a valid zip archive'.format(filename))
+    for info in archive.infolist():
+        basename = posixpath.basename(info.filename)
+        if not basename or basename.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        yield info.filename, archive.read(info)
+
+
+def _parse_file(file):
+    """Parse one (filename, content) into (parsed statement, error); runs in the parse pool"""
+    filename, content = file
+    try:
+        ensure_file_extension(filename)
+        return parse_statement(StringIO(content)), None
+    except InvalidRequest as e:
+        return None, str(e)
+    except Exception as e:
+        return None, 'Invalid statement: {}'.format(e)
+
+
+def _init_parse_process():
+    # the parse processes share the terminal of the server; stopping them is up to `stop_parse_pool`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def start_parse_pool(processes=PARSE_PROCESSES):
+    """Fork the processes of the parse pool, stopped by `stop_parse_pool` when this process exits.
+
+    Must be called before the process starts threads (`jobs.start`) or opens
+    database connections: a fork only carries over the calling thread, so the
+    children could inherit locks held by the others. For the same reason the
+    pool processes are never recycled (no maxtasksperchild), as the pool would
+    fork their replacements from the multi-threaded process.
+    """
+    global _parse_pool
+    # a single process would only parse the files one after the other, like the server's own process
+    if _parse_pool is None and processes > 1:
+        _parse_pool = multiprocessing.Pool(processes, initializer=_init_parse_process)
+        atexit.register(stop_parse_pool)
 
-    with db_transaction(session):
-        session.add(file_upload)
 
+def stop_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.terminate()
+        _parse_pool.join()
+        _parse_pool = None
+
+
+def parse_files(files):
+    """`_parse_file` of each (filename, content), in the parse pool when it was started and they are worth it"""
+    if _parse_pool is not None and len(files) > 1 and \
+            sum(len(content) for _, content in files) >= PARALLEL_PARSE_THRESHOLD:
+        return _parse_pool.map(_parse_file, files, chunksize=1)
+    return map(_parse_file, files)
+
+
+def _get_links(session, signatures):
+    """The account most of the linked uploads of each signature went to, with the share of them it got"""
     query = (
-        FileUpload.query().with_entities(FileUpload.account_id, func.count(FileUpload.id))
+        session.query(FileUpload.account_signature, FileUpload.account_id, func.count(FileUpload.id))
         .filter(FileUpload.account_id != None)  # noqa
-        .filter(FileUpload.account_signature == account_signature)
-        .group_by(FileUpload.account_id)
-        .order_by(func.count(FileUpload.id).desc())
+        .filter(FileUpload.account_signature.in_(signatures))
+        .group_by(FileUpload.account_signature, FileUpload.account_id)
     )
-    result = query.all()
-    if not result:
-        link = {
-            'accountId': None,
-            'confidenceIndex': None
-        }
-    else:
-        account_id = result[0][0]
-        confidence_index = 1.0 * result[0][1] / sum([r[1] for r in result])
-        link = {
+    counts_by_signature = defaultdict(list)
+    for signature, account_id, count in query.all():
+        counts_by_signature[signature].append((count, account_id))
+
+    links = {}
+    for signature, counts in counts_by_signature.items():
+        count, account_id = max(counts)
+        links[signature] = {
             'accountId': account_id,
-            'confidenceIndex': confidence_index
+            'confidenceIndex': 1.0 * count / sum(c for c, _ in counts)
         }
+    return links
+
+
+def save_uploads(session, files):
+    """Store the parsed (filename, content, parsed statement) uploads in one transaction; a report for each"""
+    uploaded_at = datetime.datetime.utcnow()
+    file_uploads = [FileUpload(filename=filename, uploaded_at=uploaded_at, file_content=content,
+                               account_signature=parsed_statement.signature)
+                    for filename, content, parsed_statement in files]
+    with db_transaction(session):
+        session.add_all(file_uploads)
+        session.flush()
 
-    return {
+    for file_upload, (_, _, parsed_statement) in zip(file_uploads, files):
+        parsed_statements.put(_parsed_statement_key(file_upload), parsed_statement)
+
+    links = _get_links(session, set(f.account_signature for f in file_uploads))
+    return [{
+        'filename': file_upload.filename,
         'id': file_upload.id,
-        'signature': account_signature,
-        'link': link,
-    }
+        'signature': file_upload.account_signature,
+        'link': links.get(file_upload.account_signature, {'accountId': None, 'confidenceIndex': None}),
+    } for file_upload in file_uploads]
+
+
+def upload(app, files):
+    """Store uploaded statements, suggesting the account to link each of them with.
+
+    A single statement gets its report back as is; several files, or zip
+    archives of them, get {'fileUploads': [report, ...]} where statements that
+    could not be stored report an `error`. Reports follow the filenames (the
+    order of the upload is lost in the request), and archives the order of
+    their members.
+    """
+    session = app.session
+    file_items = get_file_items(files)
+
+    if len(file_items) == 1 and not is_archive(file_items[0][0]):
+        filename, file_storage = file_items[0]
+        ensure_file_extension(filename)
+        parsed_statement = parse_statement(file_storage)
+        file_storage.seek(0)
+        report, = save_uploads(session, [(filename, file_storage.read(), parsed_statement)])
+        return report
+
+    files = []
+    for filename, file_storage in sorted(file_items, key=operator.itemgetter(0)):
+        if is_archive(filename):
+            files.extend(iter_archive(filename, file_storage))
+        else:
+            files.append((filename, file_storage.read()))
+
+    parsed_files = parse_files(files)
+    saved = iter(save_uploads(session, [(filename, content, parsed)
+                                        for (filename, content), (parsed, error) in zip(files, parsed_files)
+                                        if error is None]))
+    reports = []
+    for (filename, _), (_, error) in zip(files, parsed_files):
+        reports.append(next(saved) if error is None else {'filename': filename, 'error': error})
+    return {'fileUploads': reports}
 
 
 def link(app, file_upload_id, request_json):
@@ -92,6 +342,9 @@ def link(app, file_upload_id, request_json):
 
     if file_upload.account_id is not None:
         raise InvalidRequest('file_upload {} is already associated with an account'.format(file_upload_id))
+    pending_jobs = session.query(Job).filter_by(file_upload_id=file_upload.id).filter(Job.status.in_(jobs.PENDING))
+    if pending_jobs.count():
+        raise InvalidRequest('file_upload {} is already being imported'.format(file_upload_id))
 
     account_id = request_json['accountId']
     if account_id == 'NEW':
@@ -108,42 +361,51 @@ def link(app, file_upload_id, request_json):
         except NoResultFound:
             raise InvalidRequest('Invalid account_id: {}'.format(account_id))
 
-    file_content = base64.b64decode(file_upload.file_content)
-    parser = OfxParser()
-    ofxfile = parser.parse(StringIO(file_content))
-
-    total_imported, total_skipped = 0, 0
-    for t in ofxfile.account.statement.transactions:
-        transaction = Transaction(date=t.date,
-                                  info=t.memo,
-                                  payee=t.payee,
-                                  memo=t.memo,
-                                  amount=t.amount,
-                                  transaction_type=t.type,
-                                  category_id=TBD_CATEGORY_ID,
-                                  account_id=account.id)
-        try:
-            with db_transaction(session):
-                session.add(transaction)
-                total_imported += 1
-        except IntegrityError:
-            total_skipped += 1
-            logger.warn('Skip duplicated transaction: {}. checksum: {}'.format(transaction, transaction.checksum))
+    with db_transaction(session):
+        job = jobs.enqueue(session, IMPORT_JOB, file_upload_id=file_upload.id, account_id=account.id)
+    if jobs.has_workers():
+        jobs.notify()
+    else:
+        # nothing would ever pick the job up (e.g. an in-memory database); import before answering
+        jobs.run_now(session, job, {IMPORT_JOB: run_import_job})
+    return {'job': job.to_dict()}
+
+
+def run_import_job(session, job):
+    """Import the statement of the job's upload into its account, a checkpoint per batch of transactions"""
+    file_upload = session.query(FileUpload).filter_by(id=job.file_upload_id).one()
+    account = session.query(Account).filter_by(id=job.account_id).one()
+    parsed_statement = get_parsed_statement(file_upload)
+
+    # a job taken over after a restart skips what was committed before
+    ofx_transactions = itertools.islice(iter_transactions(file_upload, parsed_statement), job.progress, None)
+    for imported, skipped in iter_import_batches(session, account, ofx_transactions, rules.get_matcher(session)):
+        jobs.checkpoint(session, job,
+                        progress=job.progress + imported + skipped,
+                        total_imported=job.total_imported + imported,
+                        total_skipped=job.total_skipped + skipped)
 
-    file_upload.account_id = account.id
     # record account balance history
     account_balance = AccountBalance(
         account_id=account.id,
-        date=ofxfile.account.statement.balance_date,
-        balance=ofxfile.account.statement.balance
+        date=parsed_statement.balance_date.date(),
+        balance=parsed_statement.balance
     )
+    balance_exists = session.query(
+        session.query(AccountBalance)
+        .filter_by(account_id=account_balance.account_id, date=account_balance.date)
+        .exists()
+    ).scalar()
 
-    try:
-        with db_transaction(session):
-            session.add(file_upload)
-            session.add(account_balance)
-    except IntegrityError:
+    file_upload.account_id = account.id
+    session.add(file_upload)
+    if balance_exists:
         logger.info('Already a record of account balance for account {} on {}'.format(account_balance.account_id,
                                                                                       account_balance.date))
+    else:
+        session.add(account_balance)
+    session.flush()
+    daily_balances.refresh(session)
+    jobs.finish(session, job)
 
-    return {'account_id': account.id, 'total_imported': total_imported, 'total_skipped': total_skipped}
+    parsed_statements.discard(_parsed_statement_key(file_upload))
@@ -0,0 +1,20 @@
+"""
+Add partial indexes over live transactions
+"""
+
+from yoyo import step
+
+__depends__ = {'20170426_01_Li4BF-add-account-types'}
+
+indexes = {
+    'ix_transactions_account_id_date': '(account_id, date, amount)',
+    'ix_transactions_account_id_category_id': '(account_id, category_id, date)',
+    'ix_transactions_category_id_date': '(category_id, date, amount)',
+    'ix_transactions_date': '(date)',
+}
+
+steps = [
+    step('CREATE INDEX {} ON transactions {} WHERE deleted = 0'.format(name, columns),
+         'DROP INDEX {}'.format(name))
+    for name, columns in sorted(indexes.items())
+]
@@ -0,0 +1,90 @@
+"""
+Add materialized daily balances
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_01_Hx7Qp-add-transaction-indexes'}
+
+tables = [
+    """
+    CREATE TABLE daily_balances (
+    account_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    balance FLOAT NOT NULL,
+    PRIMARY KEY (account_id, date),
+    FOREIGN KEY(account_id) REFERENCES accounts (id)
+    );
+    """,
+    """
+    CREATE TABLE daily_balance_changes (
+    account_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    PRIMARY KEY (account_id, date)
+    );
+    """,
+]
+
+triggers = {
+    'transactions_insert_daily_balances': """
+    CREATE TRIGGER transactions_insert_daily_balances AFTER INSERT ON transactions
+    WHEN NEW.account_id IS NOT NULL AND NEW.deleted = 0
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (NEW.account_id, NEW.date);
+    END
+    """,
+    'transactions_update_daily_balances': """
+    CREATE TRIGGER transactions_update_daily_balances AFTER UPDATE OF date, amount, account_id, deleted ON transactions
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+        SELECT OLD.account_id, OLD.date WHERE OLD.account_id IS NOT NULL;
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+        SELECT NEW.account_id, NEW.date WHERE NEW.account_id IS NOT NULL;
+    END
+    """,
+    'transactions_delete_daily_balances': """
+    CREATE TRIGGER transactions_delete_daily_balances AFTER DELETE ON transactions
+    WHEN OLD.account_id IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (OLD.account_id, OLD.date);
+    END
+    """,
+    'account_balances_insert_daily_balances': """
+    CREATE TRIGGER account_balances_insert_daily_balances AFTER INSERT ON account_balances
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (NEW.account_id, NEW.date);
+    END
+    """,
+    'account_balances_update_daily_balances': """
+    CREATE TRIGGER account_balances_update_daily_balances AFTER UPDATE ON account_balances
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (OLD.account_id, OLD.date);
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (NEW.account_id, NEW.date);
+    END
+    """,
+    'account_balances_delete_daily_balances': """
+    CREATE TRIGGER account_balances_delete_daily_balances AFTER DELETE ON account_balances
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (OLD.account_id, OLD.date);
+    END
+    """,
+}
+
+# Queue the whole history of every account, from its first transaction or balance
+# to its last: daily_balances gets filled the next time it is refreshed (or with
+# `inv rebuild-daily-balances`)
+backfill = [
+    """
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+    SELECT account_id, {aggregate}(date) FROM {table} WHERE account_id IS NOT NULL GROUP BY account_id
+    """.format(aggregate=aggregate, table=table)
+    for table in ('transactions', 'account_balances')
+    for aggregate in ('MIN', 'MAX')
+]
+
+steps = (
+    [step(tables[0], 'DROP TABLE daily_balances'),
+     step(tables[1], 'DROP TABLE daily_balance_changes')] +
+    [step(sql, 'DROP TRIGGER {}'.format(name)) for name, sql in sorted(triggers.items())] +
+    [step(sql) for sql in backfill]
+)
@@ -0,0 +1,80 @@
+"""
+Add monthly category totals
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_02_Rb4Lw-add-daily-balances'}
+
+table = """
+    CREATE TABLE category_monthly_totals (
+    account_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    month DATE NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (account_id, category_id, month)
+    );
+"""
+
+triggers = {
+    'transactions_insert_category_monthly_totals': """
+    CREATE TRIGGER transactions_insert_category_monthly_totals AFTER INSERT ON transactions
+    WHEN NEW.account_id IS NOT NULL AND NEW.deleted = 0
+    BEGIN
+        INSERT OR IGNORE INTO category_monthly_totals (account_id, category_id, month, amount_cents, count)
+        VALUES (NEW.account_id, NEW.category_id, date(NEW.date, 'start of month'), 0, 0);
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents + CAST(ROUND(NEW.amount * 100) AS INTEGER), count = count + 1
+        WHERE account_id = NEW.account_id AND category_id = NEW.category_id
+        AND month = date(NEW.date, 'start of month');
+    END
+    """,
+    'transactions_update_category_monthly_totals': """
+    CREATE TRIGGER transactions_update_category_monthly_totals
+    AFTER UPDATE OF date, amount, account_id, category_id, deleted ON transactions
+    BEGIN
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents - CAST(ROUND(OLD.amount * 100) AS INTEGER), count = count - 1
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month') AND OLD.deleted = 0;
+        DELETE FROM category_monthly_totals
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month') AND count = 0;
+        INSERT OR IGNORE INTO category_monthly_totals (account_id, category_id, month, amount_cents, count)
+        SELECT NEW.account_id, NEW.category_id, date(NEW.date, 'start of month'), 0, 0
+        WHERE NEW.account_id IS NOT NULL AND NEW.deleted = 0;
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents + CAST(ROUND(NEW.amount * 100) AS INTEGER), count = count + 1
+        WHERE account_id = NEW.account_id AND category_id = NEW.category_id
+        AND month = date(NEW.date, 'start of month') AND NEW.deleted = 0;
+    END
+    """,
+    'transactions_delete_category_monthly_totals': """
+    CREATE TRIGGER transactions_delete_category_monthly_totals AFTER DELETE ON transactions
+    WHEN OLD.account_id IS NOT NULL AND OLD.deleted = 0
+    BEGIN
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents - CAST(ROUND(OLD.amount * 100) AS INTEGER), count = count - 1
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month');
+        DELETE FROM category_monthly_totals
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month') AND count = 0;
+    END
+    """,
+}
+
+backfill = """
+    INSERT INTO category_monthly_totals (account_id, category_id, month, amount_cents, count)
+    SELECT account_id, category_id, date(date, 'start of month'), SUM(CAST(ROUND(amount * 100) AS INTEGER)), COUNT(*)
+    FROM transactions
+    WHERE account_id IS NOT NULL AND deleted = 0
+    GROUP BY account_id, category_id, date(date, 'start of month')
+"""
+
+steps = (
+    [step(table, 'DROP TABLE category_monthly_totals')] +
+    [step(sql, 'DROP TRIGGER {}'.format(name)) for name, sql in sorted(triggers.items())] +
+    [step(backfill)]
+)
@@ -0,0 +1,32 @@
+"""
+Add cache versions
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_03_Mq2Vc-add-category-monthly-totals'}
+
+table = """
+    CREATE TABLE cache_versions (
+    key VARCHAR(64) NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (key)
+    );
+"""
+
+triggers = {
+    'categories_{}_cache_versions'.format(event.lower()): """
+    CREATE TRIGGER categories_{event}_cache_versions AFTER {EVENT} ON categories
+    BEGIN
+        INSERT OR IGNORE INTO cache_versions (key, version) VALUES ('categories', 0);
+        UPDATE cache_versions SET version = version + 1 WHERE key = 'categories';
+    END
+    """.format(event=event.lower(), EVENT=event)
+    for event in ('INSERT', 'UPDATE', 'DELETE')
+}
+
+steps = (
+    [step(table, 'DROP TABLE cache_versions')] +
+    [step(sql, 'DROP TRIGGER {}'.format(name)) for name, sql in sorted(triggers.items())] +
+    [step("INSERT INTO cache_versions (key, version) VALUES ('categories', 1)")]
+)
@@ -0,0 +1,33 @@
+"""
+Add account cache versions
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_04_Tz8Kd-add-cache-versions'}
+
+
+def bump_cache_version(key):
+    return """
+        INSERT OR IGNORE INTO cache_versions (key, version) SELECT {key}, 0 WHERE {key} IS NOT NULL;
+        UPDATE cache_versions SET version = version + 1 WHERE key = {key};""".format(key=key)
+
+
+def make_trigger(table, event, keys):
+    return """
+    CREATE TRIGGER {table}_{event}_cache_versions AFTER {EVENT} ON {table}
+    BEGIN{body}
+    END
+    """.format(table=table, event=event.lower(), EVENT=event, body=''.join(bump_cache_version(key) for key in keys))
+
+
+triggers = {}
+for table, column in [('transactions', 'account_id'), ('account_balances', 'account_id'), ('accounts', 'id')]:
+    for event, rows in [('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])]:
+        trigger_name = '{}_{}_cache_versions'.format(table, event.lower())
+        triggers[trigger_name] = make_trigger(table, event, ["'account:' || {}.{}".format(row, column) for row in rows])
+for event in ('INSERT', 'UPDATE', 'DELETE'):
+    trigger_name = 'account_types_{}_cache_versions'.format(event.lower())
+    triggers[trigger_name] = make_trigger('account_types', event, ["'account_types'"])
+
+steps = [step(sql, 'DROP TRIGGER {}'.format(name)) for name, sql in sorted(triggers.items())]
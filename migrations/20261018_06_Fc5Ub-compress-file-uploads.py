@@ -0,0 +1,51 @@
+"""
+Store file uploads zlib compressed in a BLOB instead of base64 TEXT
+
+SQLite can't change the type of a column, so the table is rebuilt. The space
+freed is only given back to the file system by a VACUUM.
+"""
+
+import base64
+import sqlite3
+import zlib
+from yoyo import step
+
+__depends__ = {'20261018_05_Wn3Js-add-account-cache-versions'}
+
+
+def create_table(name, file_content_type):
+    return """
+    CREATE TABLE {name} (
+    id INTEGER NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    uploaded_at DATETIME NOT NULL,
+    file_content {file_content_type} NOT NULL,
+    account_id INTEGER,
+    account_signature VARCHAR(128),
+    PRIMARY KEY (id),
+    FOREIGN KEY(account_id) REFERENCES accounts (id)
+    )
+    """.format(name=name, file_content_type=file_content_type)
+
+
+def rebuild(conn, file_content_type, convert):
+    cursor = conn.cursor()
+    cursor.execute(create_table('file_uploads_new', file_content_type))
+    rows = conn.cursor()
+    rows.execute('SELECT id, filename, uploaded_at, file_content, account_id, account_signature FROM file_uploads')
+    for id, filename, uploaded_at, file_content, account_id, account_signature in rows:
+        cursor.execute('INSERT INTO file_uploads_new VALUES (?, ?, ?, ?, ?, ?)',
+                       (id, filename, uploaded_at, convert(file_content), account_id, account_signature))
+    cursor.execute('DROP TABLE file_uploads')
+    cursor.execute('ALTER TABLE file_uploads_new RENAME TO file_uploads')
+
+
+def compress(conn):
+    rebuild(conn, 'BLOB', lambda file_content: sqlite3.Binary(zlib.compress(base64.b64decode(file_content))))
+
+
+def decompress(conn):
+    rebuild(conn, 'TEXT', lambda file_content: base64.b64encode(zlib.decompress(file_content)))
+
+
+steps = [step(compress, decompress)]
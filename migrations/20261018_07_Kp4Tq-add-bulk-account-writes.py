@@ -0,0 +1,70 @@
+"""
+Add bulk account writes, skipped by the transaction update triggers
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_06_Fc5Ub-compress-file-uploads'}
+
+SKIP_BULK_ACCOUNT_WRITES = """
+    WHEN NOT EXISTS (
+        SELECT 1 FROM bulk_account_writes WHERE account_id = OLD.account_id AND account_id = NEW.account_id)"""
+
+update_triggers = {
+    'transactions_update_daily_balances': """
+    CREATE TRIGGER transactions_update_daily_balances
+    AFTER UPDATE OF date, amount, account_id, deleted ON transactions{when}
+    BEGIN
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+        SELECT OLD.account_id, OLD.date WHERE OLD.account_id IS NOT NULL;
+        INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+        SELECT NEW.account_id, NEW.date WHERE NEW.account_id IS NOT NULL;
+    END
+    """,
+    'transactions_update_category_monthly_totals': """
+    CREATE TRIGGER transactions_update_category_monthly_totals
+    AFTER UPDATE OF date, amount, account_id, category_id, deleted ON transactions{when}
+    BEGIN
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents - CAST(ROUND(OLD.amount * 100) AS INTEGER), count = count - 1
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month') AND OLD.deleted = 0;
+        DELETE FROM category_monthly_totals
+        WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+        AND month = date(OLD.date, 'start of month') AND count = 0;
+        INSERT OR IGNORE INTO category_monthly_totals (account_id, category_id, month, amount_cents, count)
+        SELECT NEW.account_id, NEW.category_id, date(NEW.date, 'start of month'), 0, 0
+        WHERE NEW.account_id IS NOT NULL AND NEW.deleted = 0;
+        UPDATE category_monthly_totals
+        SET amount_cents = amount_cents + CAST(ROUND(NEW.amount * 100) AS INTEGER), count = count + 1
+        WHERE account_id = NEW.account_id AND category_id = NEW.category_id
+        AND month = date(NEW.date, 'start of month') AND NEW.deleted = 0;
+    END
+    """,
+    'transactions_update_cache_versions': """
+    CREATE TRIGGER transactions_update_cache_versions AFTER UPDATE ON transactions{when}
+    BEGIN
+        INSERT OR IGNORE INTO cache_versions (key, version)
+        SELECT 'account:' || OLD.account_id, 0 WHERE 'account:' || OLD.account_id IS NOT NULL;
+        UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || OLD.account_id;
+        INSERT OR IGNORE INTO cache_versions (key, version)
+        SELECT 'account:' || NEW.account_id, 0 WHERE 'account:' || NEW.account_id IS NOT NULL;
+        UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || NEW.account_id;
+    END
+    """,
+}
+
+steps = [
+    step(
+        """
+        CREATE TABLE bulk_account_writes (
+        account_id INTEGER NOT NULL,
+        PRIMARY KEY (account_id)
+        )
+        """,
+        'DROP TABLE bulk_account_writes'
+    )
+]
+for name, sql in sorted(update_triggers.items()):
+    steps.append(step('DROP TRIGGER {}'.format(name), sql.format(when='')))
+    steps.append(step(sql.format(when=SKIP_BULK_ACCOUNT_WRITES), 'DROP TRIGGER {}'.format(name)))
@@ -0,0 +1,38 @@
+"""
+Add categorization rules
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_07_Kp4Tq-add-bulk-account-writes'}
+
+table = """
+CREATE TABLE categorization_rules (
+id INTEGER NOT NULL,
+category_id INTEGER NOT NULL,
+payee VARCHAR(255),
+memo VARCHAR(255),
+min_amount FLOAT,
+max_amount FLOAT,
+account_id INTEGER,
+PRIMARY KEY (id),
+FOREIGN KEY(category_id) REFERENCES categories (id),
+FOREIGN KEY(account_id) REFERENCES accounts (id)
+)
+"""
+
+triggers = {
+    'categorization_rules_{}_cache_versions'.format(event.lower()): """
+    CREATE TRIGGER categorization_rules_{event}_cache_versions AFTER {EVENT} ON categorization_rules
+    BEGIN
+        INSERT OR IGNORE INTO cache_versions (key, version)
+        SELECT 'categorization_rules', 0 WHERE 'categorization_rules' IS NOT NULL;
+        UPDATE cache_versions SET version = version + 1 WHERE key = 'categorization_rules';
+    END
+    """.format(event=event.lower(), EVENT=event)
+    for event in ('INSERT', 'UPDATE', 'DELETE')
+}
+
+steps = [step(table, 'DROP TABLE categorization_rules')]
+for name, sql in sorted(triggers.items()):
+    steps.append(step(sql, 'DROP TRIGGER {}'.format(name)))
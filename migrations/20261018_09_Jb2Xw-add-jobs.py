@@ -0,0 +1,33 @@
+"""
+Add jobs, the queue of background work
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_08_Ry6Nd-add-categorization-rules'}
+
+steps = [
+    step(
+        """
+        CREATE TABLE jobs (
+        id INTEGER NOT NULL,
+        kind VARCHAR(32) NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        file_upload_id INTEGER,
+        account_id INTEGER,
+        owner VARCHAR(32),
+        progress INTEGER NOT NULL,
+        total_imported INTEGER NOT NULL,
+        total_skipped INTEGER NOT NULL,
+        error TEXT,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(file_upload_id) REFERENCES file_uploads (id),
+        FOREIGN KEY(account_id) REFERENCES accounts (id)
+        )
+        """,
+        'DROP TABLE jobs'
+    ),
+    step('CREATE INDEX ix_jobs_status ON jobs (status, id)', 'DROP INDEX ix_jobs_status'),
+]
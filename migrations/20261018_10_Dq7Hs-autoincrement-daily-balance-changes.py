@@ -0,0 +1,46 @@
+"""
+Give the daily balance changes queue an AUTOINCREMENT id
+
+`refresh` deletes the changes it processed by id. Plain rowids start over
+once the queue is emptied, so a refresh racing another one could delete a
+change queued in between. The table is recreated, not renamed into place:
+the triggers on transactions and account_balances refer to it by name, and
+SQLite won't rename a table while they point to a missing one.
+"""
+
+from yoyo import step
+
+__depends__ = {'20261018_09_Jb2Xw-add-jobs'}
+
+
+def create_table(columns):
+    return 'CREATE TABLE daily_balance_changes ({})'.format(columns)
+
+
+def recreate(columns):
+    def recreate(conn):
+        cursor = conn.cursor()
+        cursor.execute('CREATE TABLE daily_balance_changes_copy AS SELECT account_id, date FROM daily_balance_changes')
+        cursor.execute('DROP TABLE daily_balance_changes')
+        cursor.execute(create_table(columns))
+        cursor.execute('INSERT INTO daily_balance_changes (account_id, date) '
+                       'SELECT account_id, date FROM daily_balance_changes_copy')
+        cursor.execute('DROP TABLE daily_balance_changes_copy')
+    return recreate
+
+
+steps = [
+    step(
+        recreate("""
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+        account_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        UNIQUE (account_id, date)
+        """),
+        recreate("""
+        account_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        PRIMARY KEY (account_id, date)
+        """),
+    ),
+]
@@ -20,7 +20,7 @@ CREATE TABLE file_uploads (
 	id INTEGER NOT NULL, 
 	filename VARCHAR(255) NOT NULL, 
 	uploaded_at DATETIME NOT NULL, 
-	file_content TEXT NOT NULL, 
+	file_content BLOB NOT NULL, 
 	account_id INTEGER, 
 	account_signature VARCHAR(128), 
 	PRIMARY KEY (id), 
@@ -53,3 +53,238 @@ CREATE TABLE account_balances (
 	CONSTRAINT unique_account_id_and_date UNIQUE (account_id, date), 
 	FOREIGN KEY(account_id) REFERENCES accounts (id)
 );
+CREATE INDEX ix_transactions_account_id_date ON transactions (account_id, date, amount) WHERE deleted = 0;
+CREATE INDEX ix_transactions_account_id_category_id ON transactions (account_id, category_id, date) WHERE deleted = 0;
+CREATE INDEX ix_transactions_category_id_date ON transactions (category_id, date, amount) WHERE deleted = 0;
+CREATE INDEX ix_transactions_date ON transactions (date) WHERE deleted = 0;
+CREATE TABLE daily_balances (
+	account_id INTEGER NOT NULL, 
+	date DATE NOT NULL, 
+	balance FLOAT NOT NULL, 
+	PRIMARY KEY (account_id, date), 
+	FOREIGN KEY(account_id) REFERENCES accounts (id)
+);
+CREATE TABLE daily_balance_changes (
+	id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, 
+	account_id INTEGER NOT NULL, 
+	date DATE NOT NULL, 
+	UNIQUE (account_id, date)
+);
+CREATE TABLE bulk_account_writes (
+	account_id INTEGER NOT NULL, 
+	PRIMARY KEY (account_id)
+);
+CREATE TRIGGER transactions_insert_daily_balances AFTER INSERT ON transactions
+WHEN NEW.account_id IS NOT NULL AND NEW.deleted = 0
+BEGIN
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (NEW.account_id, NEW.date);
+END;
+CREATE TRIGGER transactions_update_daily_balances AFTER UPDATE OF date, amount, account_id, deleted ON transactions
+WHEN NOT EXISTS (
+    SELECT 1 FROM bulk_account_writes WHERE account_id = OLD.account_id AND account_id = NEW.account_id)
+BEGIN
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+    SELECT OLD.account_id, OLD.date WHERE OLD.account_id IS NOT NULL;
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date)
+    SELECT NEW.account_id, NEW.date WHERE NEW.account_id IS NOT NULL;
+END;
+CREATE TRIGGER transactions_delete_daily_balances AFTER DELETE ON transactions
+WHEN OLD.account_id IS NOT NULL
+BEGIN
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (OLD.account_id, OLD.date);
+END;
+CREATE TRIGGER account_balances_insert_daily_balances AFTER INSERT ON account_balances
+BEGIN
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (NEW.account_id, NEW.date);
+END;
+CREATE TRIGGER account_balances_update_daily_balances AFTER UPDATE ON account_balances
+BEGIN
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (OLD.account_id, OLD.date);
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (NEW.account_id, NEW.date);
+END;
+CREATE TRIGGER account_balances_delete_daily_balances AFTER DELETE ON account_balances
+BEGIN
+    INSERT OR REPLACE INTO daily_balance_changes (account_id, date) VALUES (OLD.account_id, OLD.date);
+END;
+CREATE TABLE category_monthly_totals (
+	account_id INTEGER NOT NULL, 
+	category_id INTEGER NOT NULL, 
+	month DATE NOT NULL, 
+	amount_cents INTEGER NOT NULL, 
+	count INTEGER NOT NULL, 
+	PRIMARY KEY (account_id, category_id, month)
+);
+CREATE TRIGGER transactions_insert_category_monthly_totals AFTER INSERT ON transactions
+WHEN NEW.account_id IS NOT NULL AND NEW.deleted = 0
+BEGIN
+    INSERT OR IGNORE INTO category_monthly_totals (account_id, category_id, month, amount_cents, count)
+    VALUES (NEW.account_id, NEW.category_id, date(NEW.date, 'start of month'), 0, 0);
+    UPDATE category_monthly_totals
+    SET amount_cents = amount_cents + CAST(ROUND(NEW.amount * 100) AS INTEGER), count = count + 1
+    WHERE account_id = NEW.account_id AND category_id = NEW.category_id
+    AND month = date(NEW.date, 'start of month');
+END;
+CREATE TRIGGER transactions_update_category_monthly_totals
+AFTER UPDATE OF date, amount, account_id, category_id, deleted ON transactions
+WHEN NOT EXISTS (
+    SELECT 1 FROM bulk_account_writes WHERE account_id = OLD.account_id AND account_id = NEW.account_id)
+BEGIN
+    UPDATE category_monthly_totals
+    SET amount_cents = amount_cents - CAST(ROUND(OLD.amount * 100) AS INTEGER), count = count - 1
+    WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+    AND month = date(OLD.date, 'start of month') AND OLD.deleted = 0;
+    DELETE FROM category_monthly_totals
+    WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+    AND month = date(OLD.date, 'start of month') AND count = 0;
+    INSERT OR IGNORE INTO category_monthly_totals (account_id, category_id, month, amount_cents, count)
+    SELECT NEW.account_id, NEW.category_id, date(NEW.date, 'start of month'), 0, 0
+    WHERE NEW.account_id IS NOT NULL AND NEW.deleted = 0;
+    UPDATE category_monthly_totals
+    SET amount_cents = amount_cents + CAST(ROUND(NEW.amount * 100) AS INTEGER), count = count + 1
+    WHERE account_id = NEW.account_id AND category_id = NEW.category_id
+    AND month = date(NEW.date, 'start of month') AND NEW.deleted = 0;
+END;
+CREATE TRIGGER transactions_delete_category_monthly_totals AFTER DELETE ON transactions
+WHEN OLD.account_id IS NOT NULL AND OLD.deleted = 0
+BEGIN
+    UPDATE category_monthly_totals
+    SET amount_cents = amount_cents - CAST(ROUND(OLD.amount * 100) AS INTEGER), count = count - 1
+    WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+    AND month = date(OLD.date, 'start of month');
+    DELETE FROM category_monthly_totals
+    WHERE account_id = OLD.account_id AND category_id = OLD.category_id
+    AND month = date(OLD.date, 'start of month') AND count = 0;
+END;
+CREATE TABLE cache_versions (
+	key VARCHAR(64) NOT NULL, 
+	version INTEGER NOT NULL, 
+	PRIMARY KEY (key)
+);
+CREATE TRIGGER categories_insert_cache_versions AFTER INSERT ON categories
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) VALUES ('categories', 0);
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'categories';
+END;
+CREATE TRIGGER categories_update_cache_versions AFTER UPDATE ON categories
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) VALUES ('categories', 0);
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'categories';
+END;
+CREATE TRIGGER categories_delete_cache_versions AFTER DELETE ON categories
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) VALUES ('categories', 0);
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'categories';
+END;
+CREATE TRIGGER transactions_insert_cache_versions AFTER INSERT ON transactions
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || NEW.account_id, 0 WHERE 'account:' || NEW.account_id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || NEW.account_id;
+END;
+CREATE TRIGGER transactions_update_cache_versions AFTER UPDATE ON transactions
+WHEN NOT EXISTS (
+    SELECT 1 FROM bulk_account_writes WHERE account_id = OLD.account_id AND account_id = NEW.account_id)
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || OLD.account_id, 0 WHERE 'account:' || OLD.account_id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || OLD.account_id;
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || NEW.account_id, 0 WHERE 'account:' || NEW.account_id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || NEW.account_id;
+END;
+CREATE TRIGGER transactions_delete_cache_versions AFTER DELETE ON transactions
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || OLD.account_id, 0 WHERE 'account:' || OLD.account_id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || OLD.account_id;
+END;
+CREATE TRIGGER account_balances_insert_cache_versions AFTER INSERT ON account_balances
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || NEW.account_id, 0 WHERE 'account:' || NEW.account_id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || NEW.account_id;
+END;
+CREATE TRIGGER account_balances_update_cache_versions AFTER UPDATE ON account_balances
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || OLD.account_id, 0 WHERE 'account:' || OLD.account_id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || OLD.account_id;
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || NEW.account_id, 0 WHERE 'account:' || NEW.account_id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || NEW.account_id;
+END;
+CREATE TRIGGER account_balances_delete_cache_versions AFTER DELETE ON account_balances
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || OLD.account_id, 0 WHERE 'account:' || OLD.account_id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || OLD.account_id;
+END;
+CREATE TRIGGER accounts_insert_cache_versions AFTER INSERT ON accounts
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || NEW.id, 0 WHERE 'account:' || NEW.id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || NEW.id;
+END;
+CREATE TRIGGER accounts_update_cache_versions AFTER UPDATE ON accounts
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || OLD.id, 0 WHERE 'account:' || OLD.id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || OLD.id;
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || NEW.id, 0 WHERE 'account:' || NEW.id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || NEW.id;
+END;
+CREATE TRIGGER accounts_delete_cache_versions AFTER DELETE ON accounts
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account:' || OLD.id, 0 WHERE 'account:' || OLD.id IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account:' || OLD.id;
+END;
+CREATE TRIGGER account_types_insert_cache_versions AFTER INSERT ON account_types
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account_types', 0 WHERE 'account_types' IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account_types';
+END;
+CREATE TRIGGER account_types_update_cache_versions AFTER UPDATE ON account_types
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account_types', 0 WHERE 'account_types' IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account_types';
+END;
+CREATE TRIGGER account_types_delete_cache_versions AFTER DELETE ON account_types
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'account_types', 0 WHERE 'account_types' IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'account_types';
+END;
+CREATE TABLE categorization_rules (
+	id INTEGER NOT NULL, 
+	category_id INTEGER NOT NULL, 
+	payee VARCHAR(255), 
+	memo VARCHAR(255), 
+	min_amount FLOAT, 
+	max_amount FLOAT, 
+	account_id INTEGER, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(category_id) REFERENCES categories (id), 
+	FOREIGN KEY(account_id) REFERENCES accounts (id)
+);
+CREATE TRIGGER categorization_rules_insert_cache_versions AFTER INSERT ON categorization_rules
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'categorization_rules', 0 WHERE 'categorization_rules' IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'categorization_rules';
+END;
+CREATE TRIGGER categorization_rules_update_cache_versions AFTER UPDATE ON categorization_rules
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'categorization_rules', 0 WHERE 'categorization_rules' IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'categorization_rules';
+END;
+CREATE TRIGGER categorization_rules_delete_cache_versions AFTER DELETE ON categorization_rules
+BEGIN
+    INSERT OR IGNORE INTO cache_versions (key, version) SELECT 'categorization_rules', 0 WHERE 'categorization_rules' IS NOT NULL;
+    UPDATE cache_versions SET version = version + 1 WHERE key = 'categorization_rules';
+END;
+CREATE TABLE jobs (
+	id INTEGER NOT NULL, 
+	kind VARCHAR(32) NOT NULL, 
+	status VARCHAR(16) NOT NULL, 
+	file_upload_id INTEGER, 
+	account_id INTEGER, 
+	owner VARCHAR(32), 
+	progress INTEGER NOT NULL, 
+	total_imported INTEGER NOT NULL, 
+	total_skipped INTEGER NOT NULL, 
+	error TEXT, 
+	created_at DATETIME NOT NULL, 
+	updated_at DATETIME NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(file_upload_id) REFERENCES file_uploads (id), 
+	FOREIGN KEY(account_id) REFERENCES accounts (id)
+);
+CREATE INDEX ix_jobs_status ON jobs (status, id);
@@ -17,6 +17,15 @@ def bootstrap(ctx, dbfile):
             continue
 
 
+@task
+def rebuild_daily_balances(ctx, dbfile='florin.sqlite'):
+    from florin.db import get_engine, make_session, db_transaction
+    from florin.services import daily_balances
+    session = make_session(get_engine(dbfile))
+    with db_transaction(session):
+        daily_balances.rebuild(session)
+
+
 @task
 def new_migration(ctx, m):
     ctx.run('yoyo new ./migrations -m "{}"'.format(m), pty=True)
@@ -60,12 +69,14 @@ def clean(ctx):
 
 
 @task
-def run(ctx, dbfile='florin.sqlite', port=9000):
+def run(ctx, dbfile='florin.sqlite', port=9000, threads=1):
     command = [
         'gunicorn', '--access-logfile=-', '--error-logfile=-',
-        '--timeout=9999', '-b 0.0.0.0:{}'.format(port), '--reload',
-        'florin.app:app'
+        '-b 0.0.0.0:{}'.format(port), '--reload',
     ]
+    if int(threads) > 1:
+        command.extend(['--worker-class=gthread', '--threads={}'.format(threads)])
+    command.append('florin.app:app')
     os.environ['DBFILE'] = dbfile
     os.execvpe(command[0], command[:], os.environ)
 
@@ -75,6 +86,23 @@ def run_test_server(ctx):
     run(ctx, 'test.sqlite', 7000)
 
 
+@task
+def benchmark_query_plans(ctx, transactions=200000, accounts=20):
+    ctx.run('python -m benchmarks.query_plans --transactions={} --accounts={}'.format(transactions, accounts),
+            pty=True)
+
+
+@task
+def benchmark_serialization(ctx, transactions=10000):
+    ctx.run('python -m benchmarks.serialization --transactions={}'.format(transactions), pty=True)
+
+
+@task
+def benchmark_read_models(ctx, transactions=200000, accounts=20):
+    ctx.run('python -m benchmarks.read_models --transactions={} --accounts={}'.format(transactions, accounts),
+            pty=True)
+
+
 @task
 def lint(ctx):
     ctx.run('flake8 --max-line-length=120 florin tests')
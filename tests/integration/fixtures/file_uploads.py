@@ -1,5 +1,4 @@
 import datetime
-import base64
 import os
 import pytest
 from florin import db
@@ -17,5 +16,5 @@ def td_ofx():
         id=1,
         filename='foo.ofx',
         uploaded_at=datetime.datetime.utcnow(),
-        file_content=base64.b64encode(file_content)
+        file_content=file_content
     )
@@ -34,6 +34,25 @@ def test_accounts_get___one_account(td_chequing_account):
         ]}
 
 
+def test_accounts_get___uncategorized_transaction_count(td_chequing_account,
+                                                        cibc_savings_account,
+                                                        tangerine_credit_card_account,
+                                                        automobile):
+    for _ in xrange(3):
+        create(account_id=td_chequing_account['id'])
+    create(account_id=tangerine_credit_card_account['id'])
+    create(account_id=tangerine_credit_card_account['id'], category_id=automobile['id'])
+
+    response = requests.get('http://localhost:7000/api/accounts')
+    assert response.status_code == 200
+    counts = {r['id']: r['uncategorized_transaction_count'] for r in response.json()['accounts']}
+    assert counts == {
+        td_chequing_account['id']: 3,
+        cibc_savings_account['id']: 0,
+        tangerine_credit_card_account['id']: 1,
+    }
+
+
 def test_accounts_get___by_id___deleted(deleted_account):
     response = requests.get('http://localhost:7000/api/accounts/{}'.format(deleted_account['id']))
     assert response.status_code == 404
@@ -166,6 +185,58 @@ def test_accounts_get_category_summary(tangerine_credit_card_account,
     assert response_json['categorySummary']['expense'] == expected_expense
 
 
+def test_accounts_get_category_summary___partial_months(td_chequing_account, automobile, mortgage, salary):
+    for date, category, amount in [('2017-01-14', mortgage, '1'), ('2017-01-15', mortgage, '2'),
+                                   ('2017-02-10', mortgage, '4'), ('2017-03-31', automobile, '8'),
+                                   ('2017-04-10', automobile, '16'), ('2017-04-11', automobile, '32'),
+                                   ('2017-03-01', salary, '64')]:
+        create(account_id=td_chequing_account['id'], category_id=category['id'], transaction_type='debit',
+               date=datetime.datetime.strptime(date, '%Y-%m-%d').date(), amount=Decimal(amount))
+
+    response = requests.get('http://localhost:7000/api/accounts/_all/categorySummary',
+                            params={'startDate': '2017-01-15', 'endDate': '2017-04-10'})
+    assert response.status_code == 200
+    response_json = response.json()
+    assert response_json['categorySummary']['expense'] == [
+        {'category_id': automobile['id'], 'category_name': automobile['name'], 'amount': 24},
+        {'category_id': mortgage['id'], 'category_name': mortgage['name'], 'amount': 6},
+    ]
+    assert response_json['categorySummary']['income'] == [
+        {'category_id': salary['id'], 'category_name': salary['name'], 'amount': 64},
+    ]
+
+
+def test_accounts_get___not_modified_until_written(td_chequing_account):
+    response = requests.get('http://localhost:7000/api/accounts')
+    etag = response.headers['ETag']
+    assert 'Last-Modified' in response.headers
+
+    response = requests.get('http://localhost:7000/api/accounts', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    create(account_id=td_chequing_account['id'])
+    response = requests.get('http://localhost:7000/api/accounts', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.json()['accounts'][0]['uncategorized_transaction_count'] == 1
+
+
+def test_accounts_get___cached_per_formatting(td_chequing_account):
+    pretty = requests.get('http://localhost:7000/api/accounts')
+    compact = requests.get('http://localhost:7000/api/accounts', headers={'X-Requested-With': 'XMLHttpRequest'})
+    assert compact.json() == pretty.json()
+    assert '\n  ' in pretty.text
+    assert '\n' not in compact.text.strip()
+    assert compact.headers['ETag'] != pretty.headers['ETag']
+
+
+def test_accounts_get_category_summary___not_modified_per_args(td_chequing_account):
+    url = 'http://localhost:7000/api/accounts/_all/categorySummary'
+    etag = requests.get(url, params={'startDate': '2017-01-01'}).headers['ETag']
+    assert requests.get(url, params={'startDate': '2017-01-01'}, headers={'If-None-Match': etag}).status_code == 304
+    assert requests.get(url, params={'startDate': '2017-02-01'}, headers={'If-None-Match': etag}).status_code == 200
+
+
 def test_account_balances___get(tangerine_credit_card_account, rogers_bank_credit_card_account):  # noqa
     today = datetime.datetime.utcnow().date()
     [balance_create(account_id=tangerine_credit_card_account['id'],
@@ -1,4 +1,6 @@
 import requests
+from florin import db
+from tests.integration import app
 from .utils import reset_database
 from .fixtures.categories import automobile, gasoline, insurance
 
@@ -28,3 +30,24 @@ def test_categories_get___with_subcategories(automobile, gasoline, insurance):
         {'id': 2, 'name': 'Gasoline', 'parent_id': 1, 'type': 'expense'},
         {'id': 3, 'name': 'Insurance', 'parent_id': 1, 'type': 'expense'}
     ]
+
+
+def test_categories_get___not_modified(automobile):
+    response = requests.get('http://localhost:7000/api/categories')
+    etag = response.headers['ETag']
+    response = requests.get('http://localhost:7000/api/categories', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_categories_get___modified_after_write(automobile):
+    response = requests.get('http://localhost:7000/api/categories')
+    etag = response.headers['ETag']
+
+    category = db.Category.get_by_id(automobile['id'])
+    category.name = 'Car'
+    app.session.commit()
+
+    response = requests.get('http://localhost:7000/api/categories', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.json()['categories'][0]['name'] == 'Car'
@@ -1,7 +1,8 @@
+import json
 import requests
 import datetime
 from decimal import Decimal
-from florin.db import Account, AccountBalance
+from florin.db import Account, AccountBalance, Transaction
 from .utils import reset_database
 from .fixtures.transactions import create, fake
 from .fixtures.accounts import *  # noqa
@@ -73,3 +74,71 @@ def test_get_account_balance_chart_data___infer_with_transactions():
         {'date': '2017-02-27', 'balance': 220},
         {'date': '2017-02-28', 'balance': 150},
     ]
+
+
+def test_get_account_balance_chart_data___multiple_accounts_and_dates(tangerine_credit_card_account,
+                                                                      rogers_bank_credit_card_account):
+    session = AccountBalance.session
+    session.add(AccountBalance(account_id=tangerine_credit_card_account['id'],
+                               date=datetime.date(2017, 3, 31),
+                               balance=Decimal('100.00')))
+    session.add(AccountBalance(account_id=rogers_bank_credit_card_account['id'],
+                               date=datetime.date(2017, 3, 15),
+                               balance=Decimal('50.00')))
+    session.commit()
+    create(date=datetime.date(2017, 3, 31), amount=Decimal('-10'),
+           account_id=tangerine_credit_card_account['id'], transaction_type='debit')
+    create(date=datetime.date(2017, 3, 15), amount=Decimal('-20'),
+           account_id=tangerine_credit_card_account['id'], transaction_type='debit')
+    create(date=datetime.date(2017, 3, 15), amount=Decimal('5'),
+           account_id=rogers_bank_credit_card_account['id'], transaction_type='credit')
+    # after the latest balance record: not used to infer the history
+    create(date=datetime.date(2017, 3, 20), amount=Decimal('-99'),
+           account_id=rogers_bank_credit_card_account['id'], transaction_type='debit')
+
+    response = requests.get('http://localhost:7000/api/charts/accountBalances')
+    assert response.status_code == 200
+    chart_data = response.json()['chartData']
+    assert [c['account']['id'] for c in chart_data] == [tangerine_credit_card_account['id'],
+                                                        rogers_bank_credit_card_account['id']]
+    assert [(h['date'], h['balance']) for h in chart_data[0]['history']] == [
+        ('2017-03-14', 130), ('2017-03-15', 130), ('2017-03-30', 110), ('2017-03-31', 100),
+    ]
+    assert [(h['date'], h['balance']) for h in chart_data[1]['history']] == [
+        ('2017-03-14', 45), ('2017-03-15', 50), ('2017-03-30', 50), ('2017-03-31', 50),
+    ]
+
+
+def test_get_account_balance_chart_data___follows_transaction_and_balance_edits(tangerine_credit_card_account):
+    session = AccountBalance.session
+    session.add(AccountBalance(account_id=tangerine_credit_card_account['id'],
+                               date=datetime.date(2017, 3, 31),
+                               balance=Decimal('100.00')))
+    session.commit()
+    create(date=datetime.date(2017, 3, 15), amount=Decimal('-20'),
+           account_id=tangerine_credit_card_account['id'], transaction_type='debit')
+
+    def history():
+        response = requests.get('http://localhost:7000/api/charts/accountBalances')
+        assert response.status_code == 200
+        return [(h['date'], h['balance']) for h in response.json()['chartData'][0]['history']]
+
+    assert history() == [('2017-03-14', 120), ('2017-03-31', 100)]
+
+    transaction = Transaction.query().one()
+    response = requests.put('http://localhost:7000/api/transactions/{}'.format(transaction.id),
+                            headers={'content-type': 'application/json'},
+                            data=json.dumps({'amount': '-30'}))
+    assert response.status_code == 200
+    assert history() == [('2017-03-14', 130), ('2017-03-31', 100)]
+
+    url = 'http://localhost:7000/api/accounts/{}/balances'.format(tangerine_credit_card_account['id'])
+    response = requests.post(url,
+                             headers={'content-type': 'application/json'},
+                             data=json.dumps({'date': '2017-03-20', 'balance': '200'}))
+    assert response.status_code == 200
+    assert history() == [('2017-03-14', 230), ('2017-03-20', 200), ('2017-03-31', 100)]
+
+    response = requests.delete('http://localhost:7000/api/transactions/{}'.format(transaction.id))
+    assert response.status_code == 200
+    assert history() == [('2017-03-20', 200), ('2017-03-31', 100)]
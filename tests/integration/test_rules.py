@@ -0,0 +1,101 @@
+import datetime
+import json
+import requests
+from florin import db
+from .utils import reset_database, wait_for_job
+from .fixtures.accounts import td_chequing_account, tangerine_credit_card_account  # noqa
+from .fixtures.categories import automobile, gasoline  # noqa
+from .fixtures.file_uploads import td_ofx  # noqa
+from .fixtures.transactions import create
+
+
+def setup_function(function):
+    reset_database()
+
+
+def _post_rule(rule):
+    return requests.post('http://localhost:7000/api/rules', headers={'content-type': 'application/json'},
+                         data=json.dumps({'rule': rule}))
+
+
+def _get_categories(account):
+    return [(t.payee, t.category_id) for t in db.Transaction.session.query(db.Transaction)
+            .filter_by(account_id=account['id']).order_by(db.Transaction.id)]
+
+
+def test_rules_post(automobile, tangerine_credit_card_account):  # noqa
+    response = _post_rule({'category_id': automobile['id'], 'payee': 'Shell', 'max_amount': -5,
+                           'account_id': tangerine_credit_card_account['id']})
+    assert response.status_code == 201
+    rule = response.json()['rule']
+    assert rule == {'id': rule['id'], 'category_id': automobile['id'], 'payee': 'Shell', 'memo': None,
+                    'min_amount': None, 'max_amount': -5, 'account_id': tangerine_credit_card_account['id']}
+
+    response = requests.get('http://localhost:7000/api/rules')
+    assert response.json() == {'rules': [rule]}
+
+    response = requests.delete('http://localhost:7000/api/rules/{}'.format(rule['id']))
+    assert response.status_code == 200
+    assert requests.get('http://localhost:7000/api/rules').json() == {'rules': []}
+
+
+def test_rules_post___invalid(automobile):  # noqa
+    for rule, error in [
+        ({'category_id': 999, 'payee': 'Shell'}, "Invalid field 'category_id'"),
+        ({'category_id': automobile['id'], 'account_id': 999}, "Invalid field 'account_id'"),
+        ({'category_id': automobile['id'], 'payee': ' - '}, "Invalid field 'payee': no words to match"),
+        ({'category_id': automobile['id'], 'min_amount': 'abc'}, "Invalid field 'min_amount'"),
+    ]:
+        response = _post_rule(rule)
+        assert response.status_code == 400
+        assert response.json() == {'error': error}
+
+
+def test_rules_delete___not_found():
+    response = requests.delete('http://localhost:7000/api/rules/999')
+    assert response.status_code == 404
+
+
+def test_link_upload_with_account___categorized_by_rules(td_chequing_account, td_ofx, automobile):  # noqa
+    assert _post_rule({'category_id': automobile['id'], 'payee': 'monthly account fee'}).status_code == 201
+
+    response = requests.post('http://localhost:7000/api/fileUploads/{}/linkAccount'.format(td_ofx['id']),
+                             headers={'content-type': 'application/json'},
+                             data=json.dumps({'accountId': td_chequing_account['id']}))
+    assert response.status_code == 202
+    assert wait_for_job(response)['status'] == 'done'
+    assert sorted(set(_get_categories(td_chequing_account))) == [
+        ('ACCT BAL REBATE', 65535), ('MONTHLY ACCOUNT FEE', automobile['id'])]
+
+
+def test_rules_apply(td_chequing_account, tangerine_credit_card_account, automobile, gasoline):  # noqa
+    for account in (td_chequing_account, tangerine_credit_card_account):
+        create(account_id=account['id'], payee='SHELL C12345', amount=-40, transaction_type='expense',
+               date=datetime.date(2017, 1, 10))
+        create(account_id=account['id'], payee='SHELL CAR WASH', amount=-10, transaction_type='expense',
+               date=datetime.date(2017, 1, 11))
+        create(account_id=account['id'], payee='COFFEE', amount=-3, transaction_type='expense',
+               date=datetime.date(2017, 1, 12))
+    create(account_id=td_chequing_account['id'], payee='SHELL', amount=-50, category_id=automobile['id'],
+           transaction_type='expense', date=datetime.date(2017, 1, 13))
+    assert _post_rule({'category_id': gasoline['id'], 'payee': 'shell', 'max_amount': -20}).status_code == 201
+    assert _post_rule({'category_id': automobile['id'], 'payee': 'car wash'}).status_code == 201
+
+    response = requests.post('http://localhost:7000/api/rules/apply', headers={'content-type': 'application/json'},
+                             data=json.dumps({'accountId': td_chequing_account['id']}))
+    assert response.status_code == 200
+    assert response.json() == {'total_categorized': 2, 'total_processed': 3}
+    assert _get_categories(td_chequing_account) == [
+        ('SHELL C12345', gasoline['id']), ('SHELL CAR WASH', automobile['id']), ('COFFEE', 65535),
+        ('SHELL', automobile['id'])]
+    assert [category_id for _, category_id in _get_categories(tangerine_credit_card_account)] == [65535] * 3
+
+    response = requests.get('http://localhost:7000/api/accounts/_all/categorySummary',
+                            params={'startDate': '2017-01-01', 'endDate': '2017-01-31'})
+    assert response.json()['categorySummary']['expense'] == [
+        {'category_id': automobile['id'], 'category_name': 'Automobile', 'amount': 100.0}]
+
+    response = requests.post('http://localhost:7000/api/rules/apply')
+    assert response.json() == {'total_categorized': 2, 'total_processed': 4}
+    assert [category_id for _, category_id in _get_categories(tangerine_credit_card_account)] == [
+        gasoline['id'], automobile['id'], 65535]
@@ -1,10 +1,13 @@
+import csv
 import json
 import datetime
 import requests
+from StringIO import StringIO
 from florin import db
 from .utils import reset_database
 from .fixtures.transactions import create, fake
 from .fixtures.accounts import tangerine_credit_card_account, rogers_bank_credit_card_account  # noqa
+from .fixtures.categories import automobile, gasoline  # noqa
 
 
 def setup_function(function):
@@ -167,6 +170,76 @@ def test_transactions_put___change_memo(tangerine_credit_card_account):
     assert response.json()['transactions'][0]['memo'] == 'XYZ'
 
 
+def _get_ids(account):
+    return [id for id, in db.Transaction.session.query(db.Transaction.id)
+            .filter_by(account_id=account['id']).order_by(db.Transaction.id)]
+
+
+def test_transactions_patch___by_ids(tangerine_credit_card_account, rogers_bank_credit_card_account,  # noqa
+                                     automobile):  # noqa
+    for _ in xrange(3):
+        create(account_id=tangerine_credit_card_account['id'])
+    create(account_id=rogers_bank_credit_card_account['id'])
+    ids = _get_ids(tangerine_credit_card_account)
+    other_id, = _get_ids(rogers_bank_credit_card_account)
+
+    response = requests.patch('http://localhost:7000/api/transactions',
+                              headers={'content-type': 'application/json'},
+                              data=json.dumps({'ids': ids[:2] + [other_id, 99999],
+                                               'changes': {'category_id': 1, 'memo': 'XYZ'}}))
+    assert response.status_code == 200
+    assert response.json() == {'transactionIds': sorted(ids[:2] + [other_id])}
+
+    db.Transaction.session.expire_all()
+    transactions = {t.id: t for t in db.Transaction.query().all()}
+    assert [(transactions[id].category_id, transactions[id].memo) for id in ids[:2] + [other_id]] == [(1, 'XYZ')] * 3
+    assert transactions[ids[2]].category_id == 65535
+
+
+def test_transactions_patch___by_filter(tangerine_credit_card_account, rogers_bank_credit_card_account,  # noqa
+                                        gasoline):  # noqa
+    for day in xrange(1, 5):
+        create(account_id=tangerine_credit_card_account['id'], date=datetime.date(2017, 1, day))
+    ids = _get_ids(tangerine_credit_card_account)
+    create(account_id=tangerine_credit_card_account['id'], date=datetime.date(2017, 1, 5), category_id=1)
+    create(account_id=rogers_bank_credit_card_account['id'], date=datetime.date(2017, 1, 2))
+
+    response = requests.patch('http://localhost:7000/api/transactions',
+                              headers={'content-type': 'application/json'},
+                              data=json.dumps({'filter': {'accountId': tangerine_credit_card_account['id'],
+                                                          'startDate': '2017-01-02',
+                                                          'onlyUncategorized': 'true'},
+                                               'changes': {'category_id': 2}}))
+    assert response.status_code == 200
+    assert response.json() == {'transactionIds': ids[1:]}
+
+    response = requests.get('http://localhost:7000/api/accounts/4?onlyUncategorized=true')
+    assert [t['id'] for t in response.json()['transactions']] == ids[:1]
+
+
+def test_transactions_patch___invalid_request(tangerine_credit_card_account):  # noqa
+    create(account_id=tangerine_credit_card_account['id'])
+    id, = _get_ids(tangerine_credit_card_account)
+    for body, error in [
+        ({'ids': [id]}, 'changes is required'),
+        ({'ids': [id], 'changes': {'checksum': 'x'}}, 'Invalid field "checksum"'),
+        ({'ids': [id], 'changes': {'date': '2017-13-01'}}, 'Invalid field "date"'),
+        ({'ids': [id], 'changes': {'amount': 'abc'}}, 'Invalid field "amount"'),
+        ({'ids': [id], 'changes': {'amount': None}}, 'Invalid field "amount"'),
+        ({'ids': [id], 'changes': {'amount': True}}, 'Invalid field "amount"'),
+        ({'ids': [id], 'changes': {'category_id': 999}}, 'Invalid field "category_id"'),
+        ({'ids': [id], 'changes': {'payee': None}}, 'Invalid field "payee"'),
+        ({'ids': [id], 'changes': {'memo': {'a': 1}}}, 'Invalid field "memo"'),
+        ({'ids': [id], 'changes': {'info': 1}}, 'Invalid field "info"'),
+        ({'ids': 'all', 'changes': {'memo': 'x'}}, 'ids must be a list of transaction ids'),
+        ({'changes': {'memo': 'x'}}, 'Either ids or a filter with an accountId is required'),
+    ]:
+        response = requests.patch('http://localhost:7000/api/transactions',
+                                  headers={'content-type': 'application/json'}, data=json.dumps(body))
+        assert response.status_code == 400
+        assert response.json() == {'error': error}
+
+
 # TODO: order by category name
 # def test_transactions_get___order_by_category_name(tangerine_credit_card_account,               # noqa
 #                                                    automobile, gasoline, insurance, mortgage):  # noqa
@@ -194,3 +267,121 @@ def test_transactions_put___change_memo(tangerine_credit_card_account):
 #     response_json = response.json()
 #     category_names = [category_name(r['category_id']) for r in response_json['transactions']]
 #     assert category_names == sorted(map(category_name, categories))
+
+
+def _walk_cursor_pages(url):
+    pages = []
+    response_json = requests.get(url + '&cursor=').json()
+    pages.append(response_json['transactions'])
+    while response_json['nextCursor'] is not None:
+        response = requests.get(url + '&cursor={}'.format(response_json['nextCursor']))
+        assert response.status_code == 200
+        response_json = response.json()
+        pages.append(response_json['transactions'])
+    return pages
+
+
+def test_transactions_get___cursor_pagination(tangerine_credit_card_account):  # noqa
+    for i in xrange(7):
+        # pairs of transactions on the same date, to exercise the id tie breaker
+        create(account_id=tangerine_credit_card_account['id'], date=datetime.date(2017, 1, 1 + i // 2))
+
+    pages = _walk_cursor_pages('http://localhost:7000/api/accounts/4?perPage=3')
+    assert [len(page) for page in pages] == [3, 3, 1]
+    transactions = [t for page in pages for t in page]
+    assert len(set(t['id'] for t in transactions)) == 7
+    keys = [(t['date'], t['id']) for t in transactions]
+    assert keys == list(reversed(sorted(keys)))
+
+
+def test_transactions_get___cursor_pagination___order_by_amount_asc(tangerine_credit_card_account):  # noqa
+    for _ in xrange(5):
+        create(account_id=tangerine_credit_card_account['id'])
+
+    pages = _walk_cursor_pages('http://localhost:7000/api/accounts/_all?perPage=2&orderBy=amount:asc')
+    transactions = [t for page in pages for t in page]
+    assert len(set(t['id'] for t in transactions)) == 5
+    amounts = [float(t['amount']) for t in transactions]
+    assert amounts == sorted(amounts)
+
+
+def test_transactions_get___cursor_pagination___include_total(tangerine_credit_card_account):  # noqa
+    for _ in xrange(5):
+        create(account_id=tangerine_credit_card_account['id'])
+
+    response = requests.get('http://localhost:7000/api/accounts/4?perPage=2&cursor=')
+    assert 'total' not in response.json()
+    response = requests.get('http://localhost:7000/api/accounts/4?perPage=2&cursor=&includeTotal=true')
+    assert response.json()['total'] == 5
+
+
+def test_transactions_get___cursor_pagination___invalid_cursor(tangerine_credit_card_account):  # noqa
+    response = requests.get('http://localhost:7000/api/accounts/4?cursor=garbage')
+    assert response.status_code == 400
+
+
+def test_transactions_get___cursor_pagination___nullable_order_by(tangerine_credit_card_account):  # noqa
+    response = requests.get('http://localhost:7000/api/accounts/4?cursor=&orderBy=memo:asc')
+    assert response.status_code == 400
+
+
+def test_transactions_get___cursor_pagination___order_by_not_exported(tangerine_credit_card_account):  # noqa
+    for _ in xrange(3):
+        create(account_id=tangerine_credit_card_account['id'])
+    for order_by in ('checksum:asc', 'deleted:asc'):
+        response = requests.get('http://localhost:7000/api/accounts/4?perPage=2&cursor=&orderBy={}'.format(order_by))
+        assert response.status_code == 400
+        assert response.json() == {'error': 'orderBy param "{}" is not supported with cursor'.format(order_by)}
+
+
+def test_transactions_get___large_page_is_streamed(tangerine_credit_card_account):  # noqa
+    session = db.Transaction.session
+    session.add_all(db.Transaction(date=datetime.date(2017, 1, 1) + datetime.timedelta(days=i % 300),
+                                   info=None, payee='PAYEE {}'.format(i), memo='', amount=i, category_id=65535,
+                                   transaction_type='debit', account_id=tangerine_credit_card_account['id'])
+                    for i in xrange(1500))
+    session.commit()
+
+    response = requests.get('http://localhost:7000/api/accounts/4?perPage=2000&orderBy=amount:asc')
+    assert response.status_code == 200
+    assert 'Content-Length' not in response.headers
+    response_json = response.json()
+    assert response_json['total_pages'] == 1
+    assert [t['amount'] for t in response_json['transactions']] == range(1500)
+    assert 'ETag' in response.headers
+
+
+def test_transactions_export___csv(tangerine_credit_card_account):  # noqa
+    create(account_id=tangerine_credit_card_account['id'], date=datetime.date(2017, 1, 1), payee=u'Caf\xe9',
+           memo='a, "b"', amount=-1.5, transaction_type='expense')
+    create(account_id=tangerine_credit_card_account['id'], date=datetime.date(2017, 1, 2), payee='SHOP',
+           memo='', amount=10, transaction_type='income')
+
+    response = requests.get('http://localhost:7000/api/accounts/4/transactions/export?format=csv&orderBy=date:asc')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/csv')
+    assert 'transactions-4.csv' in response.headers['Content-Disposition']
+    rows = list(csv.reader(StringIO(response.content)))
+    assert rows[0] == ['id', 'account_id', 'date', 'info', 'payee', 'memo', 'amount', 'transaction_type',
+                       'category_id']
+    assert [row[2:7] for row in rows[1:]] == [
+        ['2017-01-01', '', 'Caf\xc3\xa9', 'a, "b"', '-1.5'],
+        ['2017-01-02', '', 'SHOP', '', '10.0'],
+    ]
+
+
+def test_transactions_export___ndjson(tangerine_credit_card_account):  # noqa
+    for day in xrange(1, 4):
+        create(account_id=tangerine_credit_card_account['id'], date=datetime.date(2017, 1, day))
+
+    response = requests.get('http://localhost:7000/api/accounts/_all/transactions/export',
+                            params={'format': 'ndjson', 'startDate': '2017-01-02'})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.content.splitlines()]
+    assert [row['date'] for row in rows] == ['2017-01-03', '2017-01-02']
+    assert all(row['account_id'] == tangerine_credit_card_account['id'] for row in rows)
+
+
+def test_transactions_export___invalid_format(tangerine_credit_card_account):  # noqa
+    response = requests.get('http://localhost:7000/api/accounts/4/transactions/export?format=xml')
+    assert response.status_code == 400
@@ -3,8 +3,10 @@ import base64
 import os
 import requests
 import datetime
+import zipfile
+from StringIO import StringIO
 from florin import db
-from .utils import reset_database
+from .utils import reset_database, wait_for_job
 from .fixtures.accounts import *  # noqa
 from .fixtures.file_uploads import *  # noqa
 
@@ -13,6 +15,10 @@ def setup_function(function):
     reset_database()
 
 
+def _summary(job):
+    return {key: job[key] for key in ('status', 'account_id', 'total_imported', 'total_skipped')}
+
+
 def test_uploads():
     fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures/reports.ofx')
     response = requests.post('http://localhost:7000/api/fileUploads', files=[
@@ -22,7 +28,7 @@ def test_uploads():
     id = response.json()['id']
     file_upload = db.FileUpload.get_by_id(id)
     assert file_upload.filename == 'reports.ofx'
-    assert file_upload.file_content == base64.b64encode(open(fixture_path, 'r').read())
+    assert file_upload.file_content == open(fixture_path, 'r').read()
 
 
 def test_uploads___suggest_account_to_link(td_chequing_account):
@@ -30,7 +36,7 @@ def test_uploads___suggest_account_to_link(td_chequing_account):
     session.add(
         db.FileUpload(filename='foo.ofx',
                       uploaded_at=datetime.datetime.now(),
-                      file_content=base64.b64encode('foo'),
+                      file_content='foo',
                       account_id=td_chequing_account['id'],
                       account_signature='sha256:c88ac2aa7726368e35babe6416886023074b41dc6aade81794e9230a8b655c5c'))
     session.commit()
@@ -45,20 +51,75 @@ def test_uploads___suggest_account_to_link(td_chequing_account):
     }
 
 
-def test_uploads___cannot_upload_more_than_one_file_at_a_time():
+def test_uploads___many_files(td_chequing_account):
+    session = db.FileUpload.session
+    session.add(db.FileUpload(
+        filename='foo.ofx', uploaded_at=datetime.datetime.now(), file_content='foo',
+        account_id=td_chequing_account['id'],
+        account_signature='sha256:c88ac2aa7726368e35babe6416886023074b41dc6aade81794e9230a8b655c5c'))
+    session.commit()
+    fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures/reports.ofx')
+    response = requests.post('http://localhost:7000/api/fileUploads', files=[
+        ('2017-03.ofx', ('2017-03.ofx', open(fixture_path, 'r'), 'application/ofx')),
+        ('notes.txt', ('notes.txt', 'not a statement', 'text/plain')),
+        ('2017-04.qfx', ('2017-04.qfx', '<OFX>garbage', 'application/ofx')),
+        ('2017-05.qfx', ('2017-05.qfx', open(fixture_path, 'r'), 'application/ofx')),
+    ])
+    assert response.status_code == 200
+    reports = response.json()['fileUploads']
+    assert [report['filename'] for report in reports] == ['2017-03.ofx', '2017-04.qfx', '2017-05.qfx', 'notes.txt']
+    assert reports[1]['error'].startswith('Invalid statement')
+    assert reports[3] == {'filename': 'notes.txt', 'error': 'Only .OFX and .QFX files are supported at this time'}
+    for report in (reports[0], reports[2]):
+        assert report['link'] == {'accountId': td_chequing_account['id'], 'confidenceIndex': 1.0}
+        assert db.FileUpload.get_by_id(report['id']).file_content == open(fixture_path, 'r').read()
+
+
+def test_uploads___many_files_in_one_field():
+    fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures/reports.ofx')
+    response = requests.post('http://localhost:7000/api/fileUploads', files=[
+        ('files', ('2017-05.qfx', open(fixture_path, 'r'), 'application/ofx')),
+        ('files', ('notes.txt', 'not a statement', 'text/plain')),
+        ('files', ('2017-03.ofx', open(fixture_path, 'r'), 'application/ofx')),
+    ])
+    assert response.status_code == 200
+    reports = response.json()['fileUploads']
+    assert [(report['filename'], 'id' in report) for report in reports] == [
+        ('2017-03.ofx', True), ('2017-05.qfx', True), ('notes.txt', False)]
+
+
+def test_uploads___zip_archive():
     fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures/reports.ofx')
+    archive = StringIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.write(fixture_path, '2017/03.qfx')
+        zf.writestr('2017/', '')
+        zf.writestr('__MACOSX/2017/._03.qfx', 'resource fork')
+        zf.writestr('README', 'statements')
     response = requests.post('http://localhost:7000/api/fileUploads', files=[
-        ('reports.ofx', ('reports.ofx', open(fixture_path, 'r'), 'application/ofx')),
-        ('another.ofx', ('reports.ofx', open(fixture_path, 'r'), 'application/ofx')),
+        ('history.zip', ('history.zip', archive.getvalue(), 'application/zip')),
+        ('2017-04.ofx', ('2017-04.ofx', open(fixture_path, 'r'), 'application/ofx')),
+    ])
+    assert response.status_code == 200
+    reports = response.json()['fileUploads']
+    assert [(report['filename'], 'id' in report) for report in reports] == [
+        ('2017-04.ofx', True), ('2017/03.qfx', True), ('README', False)]
+    assert reports[1]['link'] == {'accountId': None, 'confidenceIndex': None}
+    assert db.FileUpload.get_by_id(reports[1]['id']).file_content == open(fixture_path, 'r').read()
+
+
+def test_uploads___invalid_zip_archive():
+    response = requests.post('http://localhost:7000/api/fileUploads', files=[
+        ('history.zip', ('history.zip', 'not a zip', 'application/zip')),
     ])
     assert response.status_code == 400
-    assert response.json() == {'error': 'Only one file can be uploaded at a time'}
+    assert response.json() == {'error': 'history.zip is not a valid zip archive'}
 
 
 def test_uploads___wrong_file_extension():
     fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures/reports.ofx')
     response = requests.post('http://localhost:7000/api/fileUploads', files=[
-        ('reports.duh', ('reports.ofx', open(fixture_path, 'r'), 'text/plain')),
+        ('file', ('reports.duh', open(fixture_path, 'r'), 'text/plain')),
     ])
     assert response.status_code == 400
     assert response.json() == {'error': 'Only .OFX and .QFX files are supported at this time'}
@@ -102,8 +163,10 @@ def test_link_upload_with_account(td_chequing_account, td_ofx):
     response = requests.post('http://localhost:7000/api/fileUploads/{}/linkAccount'.format(file_upload.id),
                              headers={'content-type': 'application/json'},
                              data=json.dumps({'accountId': account.id}))
-    assert response.status_code == 200
-    assert response.json() == {'total_skipped': 0, 'total_imported': 6, 'account_id': account.id}
+    assert response.status_code == 202
+    assert response.json()['job']['status'] == 'queued'
+    assert _summary(wait_for_job(response)) == {'status': 'done', 'total_skipped': 0, 'total_imported': 6,
+                                                'account_id': account.id}
     assert account.balances[0].balance == 2935.4
 
     session.expunge_all()
@@ -117,10 +180,96 @@ def test_link_upload_with_account___create_new_account(td_chequing_account, td_o
     response = requests.post('http://localhost:7000/api/fileUploads/{}/linkAccount'.format(file_upload.id),
                              headers={'content-type': 'application/json'},
                              data=json.dumps({'accountId': 'NEW'}))
-    assert response.status_code == 200
-    response_json = response.json()
+    assert response.status_code == 202
+    job = wait_for_job(response)
+    assert job['status'] == 'done'
 
     session.expunge_all()
-    account_id = response_json['account_id']
+    account_id = job['account_id']
     file_upload = db.FileUpload.get_by_id(td_ofx['id'])
     assert file_upload.account_id == account_id
+
+
+def test_link_upload_with_account___skip_already_imported_transactions(td_chequing_account, td_ofx):
+    session = db.FileUpload.session
+    session.add(db.FileUpload(filename='bar.ofx',
+                              uploaded_at=datetime.datetime.utcnow(),
+                              file_content=td_ofx['file_content']))
+    session.commit()
+    second_upload = db.FileUpload.query().filter_by(filename='bar.ofx').one()
+
+    response = requests.post('http://localhost:7000/api/fileUploads/{}/linkAccount'.format(td_ofx['id']),
+                             headers={'content-type': 'application/json'},
+                             data=json.dumps({'accountId': td_chequing_account['id']}))
+    assert _summary(wait_for_job(response)) == {'status': 'done', 'total_skipped': 0, 'total_imported': 6,
+                                                'account_id': td_chequing_account['id']}
+
+    response = requests.post('http://localhost:7000/api/fileUploads/{}/linkAccount'.format(second_upload.id),
+                             headers={'content-type': 'application/json'},
+                             data=json.dumps({'accountId': td_chequing_account['id']}))
+    assert response.status_code == 202
+    assert _summary(wait_for_job(response)) == {'status': 'done', 'total_skipped': 6, 'total_imported': 0,
+                                                'account_id': td_chequing_account['id']}
+    assert 6 == db.Transaction.query().filter_by(account_id=td_chequing_account['id']).count()
+    assert 1 == db.AccountBalance.query().filter_by(account_id=td_chequing_account['id']).count()
+
+
+def test_uploads___stored_compressed():
+    fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures/reports.ofx')
+    response = requests.post('http://localhost:7000/api/fileUploads', files=[
+        ('reports.ofx', ('reports.ofx', open(fixture_path, 'r'), 'application/ofx'))
+    ])
+    assert response.status_code == 200
+    type, length = db.FileUpload.session.execute(
+        'SELECT typeof(file_content), length(file_content) FROM file_uploads WHERE id = :id',
+        {'id': response.json()['id']}).fetchone()
+    assert type == 'blob'
+    assert length < os.path.getsize(fixture_path)
+
+
+def test_import(td_chequing_account):
+    fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures/reports.ofx')
+    response = requests.post('http://localhost:7000/api/import',
+                             params={'account_id': td_chequing_account['id']},
+                             headers={'content-type': 'application/octet-stream'},
+                             data=open(fixture_path, 'r').read())
+    assert response.status_code == 202
+    assert _summary(wait_for_job(response)) == {'status': 'done', 'total_skipped': 0, 'total_imported': 6,
+                                                'account_id': td_chequing_account['id']}
+
+
+def test_import___base64_json(td_chequing_account):
+    fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures/reports.ofx')
+    response = requests.post('http://localhost:7000/api/import',
+                             headers={'content-type': 'application/json'},
+                             data=json.dumps({'account_id': td_chequing_account['id'],
+                                              'data': base64.b64encode(open(fixture_path, 'r').read())}))
+    assert response.status_code == 202
+    assert _summary(wait_for_job(response)) == {'status': 'done', 'total_skipped': 0, 'total_imported': 6,
+                                                'account_id': td_chequing_account['id']}
+
+
+def test_import___no_data(td_chequing_account):
+    response = requests.post('http://localhost:7000/api/import', params={'account_id': td_chequing_account['id']},
+                             headers={'content-type': 'application/octet-stream'})
+    assert response.status_code == 400
+    assert response.json() == {'error': 'data is required'}
+
+
+def test_link_upload_with_account___already_being_imported(td_chequing_account, td_ofx):
+    session = db.Job.session
+    session.add(db.Job(kind='import', status='running', file_upload_id=td_ofx['id'],
+                       account_id=td_chequing_account['id'], progress=0, total_imported=0, total_skipped=0,
+                       created_at=datetime.datetime.utcnow(), updated_at=datetime.datetime.utcnow()))
+    session.commit()
+
+    response = requests.post('http://localhost:7000/api/fileUploads/{}/linkAccount'.format(td_ofx['id']),
+                             headers={'content-type': 'application/json'},
+                             data=json.dumps({'accountId': td_chequing_account['id']}))
+    assert response.status_code == 400
+    assert response.json() == {'error': 'file_upload {} is already being imported'.format(td_ofx['id'])}
+
+
+def test_jobs___not_found():
+    response = requests.get('http://localhost:7000/api/jobs/999')
+    assert response.status_code == 404
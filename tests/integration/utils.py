@@ -1,15 +1,28 @@
+import requests
+import time
 from florin import db
 from tests.integration import app
 
 
 def reset_database():
     session = app.session
-    for clazz in (db.AccountBalance, db.Category, db.Transaction, db.Account, db.FileUpload):
+    for clazz in (db.Job, db.CategorizationRule, db.AccountBalance, db.Category, db.Transaction, db.Account,
+                  db.FileUpload):
         session.query(clazz).delete()
     session.commit()
     session.expunge_all()
 
 
+def wait_for_job(response, timeout=10):
+    """The job of a response that started one, once it is done or failed"""
+    job = response.json()['job']
+    deadline = time.time() + timeout
+    while job['status'] in ('queued', 'running') and time.time() < deadline:
+        time.sleep(0.05)
+        job = requests.get('http://localhost:7000/api/jobs/{}'.format(job['id'])).json()['job']
+    return job
+
+
 def db_fixture(db_class):
     def decorator(fn):
         def wrapper(*args, **kwargs):
@@ -0,0 +1,32 @@
+import pytest
+from florin import db
+
+
+class _App(object):
+    pass
+
+
+def _seed(session):
+    session.add(db.Account(id=1, institution='BANK', name='ACCOUNT', type='chequing'))
+    session.commit()
+
+
+@pytest.fixture
+def session():
+    """A session of a new in-memory database with account 1; tests seed the rest with a `session(session)` fixture"""
+    session = db.make_session(db.get_engine(':memory:'))
+    db.Base.metadata.create_all(session.bind)
+    _seed(session)
+    return session
+
+
+@pytest.fixture
+def app(monkeypatch, tmpdir):
+    """What `florin.app` sets up for the services: `app.session` (also `Base.session`) on a new database file"""
+    monkeypatch.setattr(db.Base, 'session', getattr(db.Base, 'session', None), raising=False)
+    app = _App()
+    db.init(app, str(tmpdir.join('test.sqlite')))
+    db.Base.metadata.create_all(app.session.get_bind())
+    _seed(app.session)
+    yield app
+    app.session.remove()
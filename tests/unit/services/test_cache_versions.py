@@ -0,0 +1,42 @@
+import datetime
+import pytest
+from florin.db import Account, AccountBalance
+from florin.services import cache_versions
+from ..utils import add_transaction
+
+
+@pytest.fixture
+def session(session):
+    session.add(Account(id=2, institution='BANK', name='SAVINGS', type='saving'))
+    session.commit()
+    return session
+
+
+def test_get_generation___follows_writes_to_the_account_only(session):
+    one = cache_versions.get_generation(session, ['account'], 1)
+    two = cache_versions.get_generation(session, ['account'], 2)
+    everything = cache_versions.get_generation(session, ['accounts'])
+
+    transaction = add_transaction(session, account_id=2)
+    session.commit()
+    assert cache_versions.get_generation(session, ['account'], 1) == one
+    assert cache_versions.get_generation(session, ['account'], 2) != two
+    assert cache_versions.get_generation(session, ['accounts']) != everything
+    assert cache_versions.get_generation(session, ['account'], '_all') == \
+        cache_versions.get_generation(session, ['accounts'])
+
+    transaction.account_id = 1
+    session.commit()
+    assert cache_versions.get_generation(session, ['account'], 1) != one
+
+    one = cache_versions.get_generation(session, ['account'], 1)
+    session.add(AccountBalance(account_id=1, date=datetime.date(2017, 1, 1), balance=1))
+    session.commit()
+    assert cache_versions.get_generation(session, ['account'], 1) != one
+
+
+def test_get_generation___ignores_transactions_without_account(session):
+    everything = cache_versions.get_generation(session, ['accounts', 'categories'])
+    add_transaction(session, account_id=None)
+    session.commit()
+    assert cache_versions.get_generation(session, ['accounts', 'categories']) == everything
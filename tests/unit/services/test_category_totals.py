@@ -0,0 +1,125 @@
+import datetime
+import random
+import pytest
+from decimal import Decimal
+from florin.db import Account, Category, CategoryMonthlyTotal, Transaction
+from florin.services import category_totals
+from sqlalchemy import event, func, not_
+from ..utils import add_transaction, date
+
+
+@pytest.fixture
+def session(session):
+    session.add(Account(id=2, institution='BANK', name='SAVINGS', type='saving'))
+    session.add(Category(id=1, name='Groceries', type='expense'))
+    session.add(Category(id=2, name='Rent', type='expense'))
+    session.add(Category(id=3, name='Salary', type='income'))
+    session.add(Category(id=4, name='Produce', parent_id=1, type='expense'))
+    session.commit()
+    return session
+
+
+def _expected_rollup(session):
+    month = func.date(Transaction.date, 'start of month')
+    query = (
+        session.query(Transaction.account_id, Transaction.category_id, month,
+                      func.count(Transaction.id), func.sum(Transaction.amount))
+        .filter(not_(Transaction.deleted))
+        .group_by(Transaction.account_id, Transaction.category_id, month)
+    )
+    return sorted((a, c, m, n, round(s, 2)) for a, c, m, n, s in query.all())
+
+
+def _actual_rollup(session):
+    return sorted((t.account_id, t.category_id, t.month.isoformat(), t.count, round(t.amount_cents / 100.0, 2))
+                  for t in session.query(CategoryMonthlyTotal).all())
+
+
+def _expected_totals(session, start_date, end_date, category_type):
+    query = (
+        session.query(Category.id, func.sum(Transaction.amount))
+        .join(Transaction, Transaction.category_id == Category.id)
+        .filter(Transaction.date >= start_date)
+        .filter(Transaction.date <= end_date)
+        .filter(Category.type == category_type)
+        .filter(not_(Transaction.deleted))
+        .group_by(Category.id)
+    )
+    return sorted((id, round(amount, 2)) for id, amount in query.all())
+
+
+def test_split_date_range():
+    d = datetime.date
+    assert category_totals.split_date_range(d(2017, 1, 1), d(2017, 3, 31)) == ((d(2017, 1, 1), d(2017, 3, 1)), [])
+    assert category_totals.split_date_range(d(2017, 1, 15), d(2017, 4, 10)) == (
+        (d(2017, 2, 1), d(2017, 3, 1)), [(d(2017, 1, 15), d(2017, 1, 31)), (d(2017, 4, 1), d(2017, 4, 10))])
+    assert category_totals.split_date_range(d(2017, 1, 15), d(2017, 2, 10)) == (
+        None, [(d(2017, 1, 15), d(2017, 2, 10))])
+    assert category_totals.split_date_range(d(2017, 2, 1), d(2017, 2, 28)) == ((d(2017, 2, 1), d(2017, 2, 1)), [])
+    assert category_totals.split_date_range(d(1970, 1, 1), d(9999, 12, 31)) == ((d(1970, 1, 1), d(9999, 12, 1)), [])
+    assert category_totals.split_date_range(d(2017, 2, 1), d(2017, 1, 1)) == (None, [])
+
+
+def test_rollup___follows_edits(session):
+    random.seed(0)
+    transactions = [add_transaction(session, random.randint(0, 365), Decimal(random.randint(-5000, 5000)) / 100,
+                                    category_id=random.randint(1, 3), account_id=random.randint(1, 2))
+                    for _ in xrange(200)]
+    session.commit()
+    assert _actual_rollup(session) == _expected_rollup(session)
+
+    for _ in xrange(100):
+        transaction = random.choice(transactions)
+        action = random.choice(['delete', 'undelete', 'move', 'amount', 'category', 'account', 'insert', 'remove'])
+        if action == 'delete':
+            transaction.deleted = True
+        elif action == 'undelete':
+            transaction.deleted = False
+        elif action == 'move':
+            transaction.date = date(random.randint(0, 365))
+        elif action == 'amount':
+            transaction.amount = Decimal(random.randint(-5000, 5000)) / 100
+        elif action == 'category':
+            transaction.category_id = random.randint(1, 3)
+        elif action == 'account':
+            transaction.account_id = random.randint(1, 2)
+        elif action == 'insert':
+            transactions.append(add_transaction(session, random.randint(0, 365), Decimal('12.34')))
+        elif action == 'remove':
+            transactions.remove(transaction)
+            session.delete(transaction)
+        session.commit()
+        assert _actual_rollup(session) == _expected_rollup(session)
+
+
+def test_get_totals___same_as_scanning_transactions(session):
+    random.seed(1)
+    for _ in xrange(300):
+        add_transaction(session, random.randint(0, 730), Decimal(random.randint(-5000, 5000)) / 100,
+                        category_id=random.randint(1, 3), account_id=random.randint(1, 2))
+    session.commit()
+
+    for _ in xrange(50):
+        start_date, end_date = sorted([date(random.randint(-30, 760)), date(random.randint(-30, 760))])
+        for category_type in ('expense', 'income'):
+            totals = category_totals.get_totals(session, start_date, end_date, category_type)
+            actual = sorted((id, round(amount, 2)) for id, _, amount in totals)
+            assert actual == _expected_totals(session, start_date, end_date, category_type)
+
+
+def test_get_parent_totals___rolls_up_subcategories(session):
+    add_transaction(session, 0, Decimal('-0.10'), category_id=1)
+    add_transaction(session, 40, Decimal('-0.20'), category_id=4)
+    add_transaction(session, 41, Decimal('-0.30'), category_id=4, account_id=2)
+    add_transaction(session, 50, Decimal('-1.00'), category_id=2)
+    add_transaction(session, 60, Decimal('5.00'), category_id=3)
+    session.commit()
+
+    statements = []
+    event.listen(session.bind, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    totals = category_totals.get_parent_totals(session, date(0), date(45), 'expense')
+    assert len(statements) == 1
+    assert totals == [(1, Decimal('-0.60'))]
+
+    totals = category_totals.get_parent_totals(session, date(0), date(365), 'expense')
+    assert totals == [(1, Decimal('-0.60')), (2, Decimal('-1.00'))]
@@ -238,3 +238,49 @@ def test_retrofit___both_account_has_missing_points():
         ]),
     ]
     assert actual_histories == expected_histories
+
+
+def test_retrofit___duplicated_dates_in_history():
+    account_histories = [
+        _acct_history(1, [
+            _history_point('2017-01-01', '59.99'),
+            _history_point('2017-02-01', '100'),
+            _history_point('2017-02-01', '90'),
+        ]),
+        _acct_history(2, [
+            _history_point('2017-01-01', '1.99'),
+            _history_point('2017-03-01', '2.99'),
+        ]),
+    ]
+    actual_histories = retrofit(account_histories)
+    expected_histories = [
+        _acct_history(1, [
+            _history_point('2017-01-01', '59.99'),
+            _history_point('2017-02-01', '100'),
+            _history_point('2017-03-01', '100'),
+        ]),
+        _acct_history(2, [
+            _history_point('2017-01-01', '1.99'),
+            _history_point('2017-02-01', '1.99'),
+            _history_point('2017-03-01', '2.99'),
+        ]),
+    ]
+    assert actual_histories == expected_histories
+
+
+def test_retrofit___many_accounts_many_dates():
+    start = datetime.datetime(2007, 1, 1)
+    all_dates = [start + datetime.timedelta(days=i) for i in xrange(3650)]
+    account_histories = [
+        {'account': _acct(id),
+         'history': [{'date': date, 'balance': decimal.Decimal(i)}
+                     for i, date in enumerate(all_dates) if i % (id + 1) == 0]}
+        for id in xrange(50)
+    ]
+    actual_histories = retrofit(account_histories)
+    assert [h['account']['id'] for h in actual_histories] == range(50)
+    for id, account_history in enumerate(actual_histories):
+        assert [h['date'] for h in account_history['history']] == all_dates
+        assert [h['balance'] for h in account_history['history']] == [
+            decimal.Decimal(i - i % (id + 1)) for i in xrange(3650)
+        ]
@@ -0,0 +1,79 @@
+import random
+from decimal import Decimal
+from florin.db import AccountBalance, DailyBalance, DailyBalanceChange
+from florin.services import daily_balances
+from ..utils import add_transaction, date
+
+
+def _snapshot(session):
+    return sorted((b.date, round(b.balance, 2)) for b in session.query(DailyBalance).all())
+
+
+def test_compute_points():
+    anchors = [(date(10), Decimal('100')), (date(20), Decimal('50'))]
+    deltas = [(date(5), Decimal('-10')), (date(10), Decimal('20')), (date(15), Decimal('5')),
+              (date(21), Decimal('1000'))]
+    assert daily_balances._compute_points(anchors, deltas) == {
+        date(4): Decimal('90'),
+        date(9): Decimal('80'),
+        date(10): Decimal('100'),
+        date(14): Decimal('45'),
+        date(20): Decimal('50'),
+    }
+
+
+def test_refresh___same_as_rebuild_after_edits(session):
+    random.seed(0)
+    for day in (30, 60, 90):
+        session.add(AccountBalance(account_id=1, date=date(day), balance=Decimal(day)))
+    transactions = [add_transaction(session, random.randint(0, 100), Decimal(random.randint(-50, 50)))
+                    for _ in xrange(50)]
+    session.flush()
+    daily_balances.refresh(session)
+    session.commit()
+
+    for _ in xrange(20):
+        transaction = random.choice(transactions)
+        action = random.choice(['delete', 'move', 'amount', 'insert', 'balance'])
+        if action == 'delete':
+            transaction.deleted = not transaction.deleted
+        elif action == 'move':
+            transaction.date = date(random.randint(0, 100))
+        elif action == 'amount':
+            transaction.amount = Decimal(random.randint(-50, 50))
+        elif action == 'insert':
+            transactions.append(add_transaction(session, random.randint(0, 100), Decimal(random.randint(-50, 50))))
+        else:
+            day = random.randint(0, 100)
+            balance = session.query(AccountBalance).filter_by(date=date(day)).first()
+            if balance is None:
+                session.add(AccountBalance(account_id=1, date=date(day), balance=Decimal(day)))
+            else:
+                session.delete(balance)
+        session.flush()
+        daily_balances.refresh(session)
+        session.commit()
+
+        incremental = _snapshot(session)
+        daily_balances.rebuild(session)
+        session.commit()
+        assert incremental == _snapshot(session)
+
+
+def test_refresh___keeps_changes_queued_meanwhile(monkeypatch, session):
+    add_transaction(session, 1, Decimal('10'))
+    session.add(AccountBalance(account_id=1, date=date(30), balance=Decimal('100')))
+    session.flush()
+
+    # another refresh empties the queue and a writer queues a change while this one recomputes
+    refresh_window = daily_balances._refresh_window
+
+    def racing_refresh_window(session, account_id, lo, hi):
+        refresh_window(session, account_id, lo, hi)
+        session.query(DailyBalanceChange).delete(synchronize_session=False)
+        add_transaction(session, 20, Decimal('5'))
+        session.flush()
+
+    monkeypatch.setattr(daily_balances, '_refresh_window', racing_refresh_window)
+    daily_balances.refresh(session)
+    assert [change.date for change in session.query(DailyBalanceChange).all()] == [date(20)]
@@ -0,0 +1,104 @@
+import datetime
+import json
+import pytest
+from florin.db import FileUpload, Job, Transaction
+from florin.serialization import MyJSONEncoder
+from florin.services import jobs, uploads
+from ..utils import add_file_upload
+
+
+@pytest.fixture
+def session(session):
+    add_file_upload(session)
+    session.commit()
+    return session
+
+
+def _enqueue(session, kind='import'):
+    job = jobs.enqueue(session, kind, file_upload_id=1, account_id=1)
+    session.commit()
+    return job.id
+
+
+def test_to_dict___timestamps_to_the_second(session):
+    _enqueue(session)
+    job = jobs.claim(session, now=datetime.datetime(2017, 3, 31, 7, 30, 15, 250))
+    assert json.loads(json.dumps(job.to_dict(), cls=MyJSONEncoder))['updated_at'] == '2017-03-31T07:30:15Z'
+
+
+def test_claim___oldest_queued_job_first(session):
+    first, second = _enqueue(session), _enqueue(session)
+    assert jobs.claim(session).id == first
+    assert jobs.claim(session).id == second
+    assert jobs.claim(session) is None
+    assert [job.status for job in session.query(Job).order_by(Job.id)] == ['running', 'running']
+
+
+def test_claim___takes_over_after_the_lease(session):
+    job_id = _enqueue(session)
+    job = jobs.claim(session)
+    owner = job.owner
+
+    assert jobs.claim(session, now=job.updated_at + datetime.timedelta(seconds=jobs.LEASE - 1)) is None
+    taken_over = jobs.claim(session, now=job.updated_at + datetime.timedelta(seconds=jobs.LEASE + 1))
+    assert taken_over.id == job_id
+    assert taken_over.owner != owner
+
+
+def test_checkpoint___job_lost(session):
+    _enqueue(session)
+    job = jobs.claim(session)
+    jobs.checkpoint(session, job, progress=1)
+    session.query(Job).update({'owner': 'another worker'})
+    session.commit()
+
+    with pytest.raises(jobs.JobLost):
+        jobs.checkpoint(session, job, progress=2)
+    assert session.query(Job.progress).scalar() == 1
+
+
+def test_run___failure_recorded(session):
+    _enqueue(session, kind='boom')
+
+    def boom(session, job):
+        jobs.checkpoint(session, job, progress=1)
+        raise ValueError('bad statement')
+
+    jobs.run(session, jobs.claim(session), {'boom': boom})
+    job = session.query(Job).one()
+    assert (job.status, job.progress, job.owner, job.error) == ('failed', 1, None, 'ValueError: bad statement')
+
+
+def test_run_import_job(session):
+    _enqueue(session)
+    jobs.run(session, jobs.claim(session), {'import': uploads.run_import_job})
+
+    job = session.query(Job).one()
+    assert (job.status, job.progress, job.total_imported, job.total_skipped) == ('done', 6, 6, 0)
+    assert session.query(Transaction).filter_by(account_id=1).count() == 6
+    assert session.query(FileUpload.account_id).scalar() == 1
+
+
+def test_run_import_job___resumes_after_last_checkpoint(monkeypatch, session):
+    monkeypatch.setattr(uploads, 'IMPORT_BATCH_SIZE', 4)
+    _enqueue(session)
+    job = jobs.claim(session)
+
+    # the worker goes away right after its first checkpoint
+    checkpoint = jobs.checkpoint
+
+    def checkpoint_once(session, job, **fields):
+        checkpoint(session, job, **fields)
+        raise SystemExit()
+
+    monkeypatch.setattr(jobs, 'checkpoint', checkpoint_once)
+    with pytest.raises(SystemExit):
+        uploads.run_import_job(session, job)
+    monkeypatch.setattr(jobs, 'checkpoint', checkpoint)
+    session.rollback()
+    assert (job.status, job.progress, job.total_imported) == ('running', 4, 4)
+
+    job = jobs.claim(session, now=job.updated_at + datetime.timedelta(seconds=jobs.LEASE + 1))
+    jobs.run(session, job, {'import': uploads.run_import_job})
+    assert (job.status, job.progress, job.total_imported, job.total_skipped) == ('done', 6, 6, 0)
+    assert session.query(Transaction).filter_by(account_id=1).count() == 6
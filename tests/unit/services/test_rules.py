@@ -0,0 +1,84 @@
+import random
+from decimal import Decimal
+from florin.services import rules
+from florin.services.rules import Matcher, Rule
+
+
+def _rule(id, category_id, payee=None, memo=None, min_amount=None, max_amount=None, account_id=None):
+    return Rule(id=id, category_id=category_id, payee=payee, memo=memo, min_amount=min_amount,
+                max_amount=max_amount, account_id=account_id)
+
+
+def test_normalize():
+    assert rules.normalize('  Tim-Hortons #1234, ') == ('TIM', 'HORTONS', '1234')
+    assert rules.normalize(u'caf\xe9 d\xe9p\xf4t') == (u'CAF\xc9', u'D\xc9P\xd4T')
+    assert rules.normalize('caf\xc3\xa9') == (u'CAF\xc9',)
+    assert rules.normalize(None) == ()
+    assert rules.normalize('_ - _') == ()
+
+
+def test_match___words_in_a_row():
+    matcher = Matcher([_rule(1, 10, payee='tim hortons')])
+    assert matcher.match('TIM HORTONS #1234', '', -5, 1) == 10
+    assert matcher.match('CAFE TIM-HORTONS', '', -5, 1) == 10
+    assert matcher.match('TIM BITS HORTONS', '', -5, 1) is None
+    assert matcher.match('TIMHORTONS', '', -5, 1) is None
+    assert matcher.match('TIM', '', -5, 1) is None
+
+
+def test_match___all_conditions():
+    matcher = Matcher([_rule(1, 10, payee='shell', memo='car wash', min_amount=Decimal('-50'),
+                             max_amount=Decimal('-5'), account_id=2)])
+    assert matcher.match('SHELL 123', 'CAR WASH', Decimal('-20'), 2) == 10
+    assert matcher.match('SHELL 123', 'FUEL', Decimal('-20'), 2) is None
+    assert matcher.match('ESSO', 'CAR WASH', Decimal('-20'), 2) is None
+    assert matcher.match('SHELL 123', 'CAR WASH', Decimal('-60'), 2) is None
+    assert matcher.match('SHELL 123', 'CAR WASH', -4.99, 2) is None
+    assert matcher.match('SHELL 123', 'CAR WASH', Decimal('-20'), 1) is None
+
+
+def test_match___first_rule_wins():
+    matcher = Matcher([
+        _rule(1, 10, payee='amazon', max_amount=0),
+        _rule(2, 20, payee='amazon prime'),
+        _rule(3, 30, min_amount=1000),
+        _rule(4, 40, account_id=7),
+    ])
+    assert matcher.match('AMAZON PRIME', '', -10, 1) == 10
+    assert matcher.match('AMAZON PRIME', '', 10, 1) == 20
+    assert matcher.match('PAYROLL', '', 2000, 7) == 30
+    assert matcher.match('PAYROLL', '', 20, 7) == 40
+    assert matcher.match('PAYROLL', '', 20, 1) is None
+    assert Matcher([]).match('AMAZON', '', -10, 1) is None
+
+
+def test_match___same_as_checking_every_rule():
+    random.seed(0)
+    words = ['SHOP', 'CAFE', 'GAS', 'BAR', 'FOOD', 'MART', 'PAY', 'CITY']
+
+    def text():
+        return ' '.join(random.choice(words) for _ in xrange(random.randint(0, 4)))
+
+    rule_list = [_rule(i, 100 + i, payee=text() or None, memo=random.choice([None, text() or None]),
+                       min_amount=random.choice([None, random.randint(-100, 0)]),
+                       max_amount=random.choice([None, random.randint(0, 100)]),
+                       account_id=random.choice([None, 1, 2]))
+                 for i in xrange(50)]
+    matcher = Matcher(rule_list)
+
+    def contains(text, pattern):
+        words, pattern = rules.normalize(text), rules.normalize(pattern)
+        return any(words[i:i + len(pattern)] == pattern for i in xrange(len(words)))
+
+    def expected(payee, memo, amount, account_id):
+        for rule in rule_list:
+            if ((rule.payee is None or contains(payee, rule.payee)) and
+                    (rule.memo is None or contains(memo, rule.memo)) and
+                    (rule.min_amount is None or amount >= rule.min_amount) and
+                    (rule.max_amount is None or amount <= rule.max_amount) and
+                    (rule.account_id is None or rule.account_id == account_id)):
+                return rule.category_id
+
+    for _ in xrange(2000):
+        transaction = (text(), text(), random.randint(-150, 150), random.choice([1, 2]))
+        assert matcher.match(*transaction) == expected(*transaction)
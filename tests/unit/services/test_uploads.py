@@ -0,0 +1,102 @@
+import datetime
+import pytest
+from StringIO import StringIO
+from florin import db
+from florin.services import jobs, uploads
+from ..utils import OFX_FIXTURE_PATH, add_file_upload
+
+
+@pytest.fixture
+def app(app):
+    add_file_upload(app.session)
+    app.session.commit()
+    return app
+
+
+@pytest.fixture
+def parse_pool(monkeypatch):
+    monkeypatch.setattr(uploads, 'PARALLEL_PARSE_THRESHOLD', 0)
+    uploads.start_parse_pool(2)
+    yield uploads._parse_pool
+    uploads.stop_parse_pool()
+
+
+def test_parse_files___in_parse_pool(monkeypatch, parse_pool):
+    with open(OFX_FIXTURE_PATH) as fh:
+        content = fh.read()
+    files = [('03.ofx', content), ('notes.txt', 'notes'), ('04.qfx', content)]
+    mapped = []
+    monkeypatch.setattr(parse_pool, 'map', lambda fn, files, **kwargs: mapped.append(files) or
+                        type(parse_pool).map(parse_pool, fn, files, **kwargs))
+
+    parsed_files = uploads.parse_files(files)
+    assert mapped == [files]
+    assert parsed_files[1] == (None, 'Only .OFX and .QFX files are supported at this time')
+    expected = uploads.parse_statement(open(OFX_FIXTURE_PATH))
+    for parsed_statement, error in (parsed_files[0], parsed_files[2]):
+        assert error is None
+        assert parsed_statement[:3] == expected[:3]
+        assert [t.__dict__ for t in parsed_statement.transactions] == [t.__dict__ for t in expected.transactions]
+
+
+def test_parse_files___small_upload_in_process(monkeypatch, parse_pool):
+    monkeypatch.setattr(uploads, 'PARALLEL_PARSE_THRESHOLD', 1024)
+    monkeypatch.setattr(parse_pool, 'map', None)
+    assert uploads.parse_files([('notes.txt', 'notes'), ('03.ofx', '<OFX>')])[0] == (
+        None, 'Only .OFX and .QFX files are supported at this time')
+
+
+def test_link___imports_before_answering_without_workers(app):
+    assert not jobs.has_workers()
+    job = uploads.link(app, 1, {'accountId': 1})['job']
+    assert (job['status'], job['total_imported'], job['total_skipped']) == ('done', 6, 0)
+    assert app.session.query(db.Transaction).filter_by(account_id=1).count() == 6
+    assert app.session.query(db.FileUpload.account_id).scalar() == 1
+
+
+def test_link___streams_large_statement_from_the_stored_file(monkeypatch, app):
+    monkeypatch.setattr(uploads, 'STREAMING_PARSE_THRESHOLD', 1024)
+    # the content may only be read through `ZlibReader`, never decompressed all at once
+    monkeypatch.setattr(db.base.ZlibCompressed, 'process_result_value', None)
+    readers = []
+    statement_reader = uploads.StatementReader
+    monkeypatch.setattr(uploads, 'StatementReader', lambda fh: readers.append(fh) or statement_reader(fh))
+
+    job = uploads.link(app, 1, {'accountId': 1})['job']
+    assert (job['status'], job['total_imported'], job['total_skipped']) == ('done', 6, 0)
+    # the statement skeleton when the upload was found missing from the cache, then the transactions
+    assert [type(fh) for fh in readers] == [db.ZlibReader, db.ZlibReader]
+    assert app.session.query(db.Transaction).filter_by(account_id=1).count() == 6
+
+
+def test_link___parses_statement_once_per_upload(monkeypatch, app):
+    parsed = []
+    parse_statement = uploads.parse_statement
+    monkeypatch.setattr(uploads, 'parse_statement', lambda fh: parsed.append(fh) or parse_statement(fh))
+    with open(OFX_FIXTURE_PATH) as fh:
+        content = fh.read()
+
+    file_upload_id = uploads.upload(app, {'03.ofx': StringIO(content)})['id']
+    assert len(parsed) == 1
+
+    # the first import fails; linking again goes on with the statement parsed by the upload
+    get_matcher = uploads.rules.get_matcher
+    monkeypatch.setattr(uploads.rules, 'get_matcher', lambda session: 1 / 0)
+    assert uploads.link(app, file_upload_id, {'accountId': 1})['job']['status'] == 'failed'
+    monkeypatch.setattr(uploads.rules, 'get_matcher', get_matcher)
+    assert uploads.link(app, file_upload_id, {'accountId': 1})['job']['status'] == 'done'
+    assert len(parsed) == 1
+
+    # re-uploaded, then replaced by another process under the same id: what is cached here is stale
+    file_upload_id = uploads.upload(app, {'03.ofx': StringIO(content)})['id']
+    assert len(parsed) == 2
+    file_upload = app.session.query(db.FileUpload).filter_by(id=file_upload_id).one()
+    uploaded_at = file_upload.uploaded_at + datetime.timedelta(seconds=1)
+    app.session.delete(file_upload)
+    app.session.commit()
+    app.session.add(db.FileUpload(id=file_upload_id, filename='04.ofx', uploaded_at=uploaded_at, file_content=content))
+    app.session.commit()
+
+    job = uploads.link(app, file_upload_id, {'accountId': 1})['job']
+    assert (job['status'], job['total_imported'], job['total_skipped']) == ('done', 0, 6)
+    assert len(parsed) == 3
@@ -0,0 +1,29 @@
+from florin.cache import LRUCache
+
+
+def test_lru_cache___get_and_put():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('b', 2) == 2
+
+
+def test_lru_cache___evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert len(cache) == 2
+
+
+def test_lru_cache___discard():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.discard('a')
+    cache.discard('a')
+    assert 'a' not in cache
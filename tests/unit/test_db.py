@@ -0,0 +1,110 @@
+import datetime
+import os
+import random
+import threading
+import zlib
+from florin import db
+from florin.services import daily_balances
+from sqlalchemy import func, not_
+from .utils import add_transaction
+
+
+def test_init___session_per_thread(app):
+    sessions = []
+
+    def worker():
+        sessions.append(app.session())
+        app.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in xrange(2)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+    assert app.session() is app.session()
+    assert app.session() not in sessions
+    assert sessions[0] is not sessions[1]
+
+
+def test_init___remove_discards_session(app):
+    session = app.session()
+    app.session.remove()
+    assert app.session() is not session
+
+
+def _rollup(session):
+    month = func.date(db.Transaction.date, 'start of month')
+    query = (
+        session.query(db.Transaction.account_id, db.Transaction.category_id, month,
+                      func.sum(func.round(db.Transaction.amount * 100)), func.count(db.Transaction.id))
+        .filter(not_(db.Transaction.deleted))
+        .group_by(db.Transaction.account_id, db.Transaction.category_id, month)
+    )
+    return sorted((a, c, m, int(cents), n) for a, c, m, cents, n in query.all())
+
+
+def _daily_balances(session):
+    return sorted((b.account_id, b.date, round(b.balance, 2)) for b in session.query(db.DailyBalance).all())
+
+
+def test_create_all___existing_database(tmpdir):
+    dbfile = str(tmpdir.join('test.sqlite'))
+    for _ in xrange(2):
+        engine = db.get_engine(dbfile)
+        db.Base.metadata.create_all(engine)
+        engine.dispose()
+    assert engine.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'").scalar() > 0
+
+
+def test_zlib_reader(monkeypatch):
+    monkeypatch.setattr(db.ZlibReader, 'CHUNK_SIZE', 7)
+    content = ''.join(str(i) for i in xrange(1000))
+    fh = db.ZlibReader(zlib.compress(content))
+
+    assert fh.read(10) == content[:10]
+    assert fh.read(100) == content[10:110]
+    fh.seek(0, os.SEEK_END)
+    assert fh.tell() == len(content)
+    assert fh.read(10) == ''
+    fh.seek(5)
+    assert fh.read(10) == content[5:15]
+    fh.seek(20, os.SEEK_CUR)
+    assert fh.read() == content[35:]
+
+
+def test_bulk_account_write___derived_tables_as_with_triggers(session):
+    random.seed(0)
+    session.add(db.Account(id=2, institution='BANK', name='ACCOUNT', type='chequing'))
+    for account_id in (1, 2):
+        session.add(db.AccountBalance(account_id=account_id, date=datetime.date(2017, 12, 31), balance=100))
+    for _ in xrange(200):
+        add_transaction(session, random.randint(0, 364), random.randint(-5000, 5000) / 100.0,
+                        category_id=random.randint(1, 3), account_id=random.randint(1, 2))
+    session.commit()
+    with db.db_transaction(session):
+        daily_balances.refresh(session)
+    version = session.query(db.CacheVersion.version).filter_by(key='account:1').scalar()
+
+    with db.db_transaction(session):
+        with db.bulk_account_write(session, 1):
+            assert session.query(db.DailyBalanceChange).count() == 2
+            session.execute('UPDATE transactions SET deleted = 1 WHERE account_id = 1 AND amount < -30')
+            session.execute('UPDATE transactions SET category_id = 4, date = date(date, "+1 month") '
+                            'WHERE account_id = 1 AND amount > 30')
+            # rows leaving the account still go through the triggers
+            session.execute('UPDATE transactions SET account_id = 2 WHERE account_id = 1 AND amount BETWEEN 0 AND 5')
+        daily_balances.refresh(session)
+
+    assert session.query(db.BulkAccountWrite).count() == 0
+    assert [(t.account_id, t.category_id, t.month.isoformat(), t.amount_cents, t.count)
+            for t in session.query(db.CategoryMonthlyTotal).order_by(
+                db.CategoryMonthlyTotal.account_id, db.CategoryMonthlyTotal.category_id,
+                db.CategoryMonthlyTotal.month)] == _rollup(session)
+    refreshed = _daily_balances(session)
+    with db.db_transaction(session):
+        daily_balances.rebuild(session)
+    assert refreshed == _daily_balances(session)
+    assert session.query(db.CacheVersion.version).filter_by(key='account:1').scalar() > version
+
+    with db.db_transaction(session):
+        with db.bulk_account_write(session, 3):
+            pass  # no transactions at all
@@ -0,0 +1,38 @@
+import os
+import pytest
+from StringIO import StringIO
+from ofxparse import OfxParser
+from florin import ofxstream
+
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), '../integration/fixtures/reports.ofx')
+
+
+@pytest.fixture
+def ofx_content():
+    with open(FIXTURE_PATH, 'r') as fh:
+        return fh.read()
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, 64 * 1024])
+def test_statement_reader___same_transactions_as_ofxparse(monkeypatch, ofx_content, chunk_size):
+    monkeypatch.setattr(ofxstream, 'CHUNK_SIZE', chunk_size)
+    expected = OfxParser().parse(StringIO(ofx_content)).account.statement.transactions
+    actual = list(ofxstream.StatementReader(StringIO(ofx_content)).transactions())
+    assert len(actual) == 6
+    assert [vars(t) for t in actual] == [vars(t) for t in expected]
+
+
+def test_statement_reader___statement_without_transactions(ofx_content):
+    expected = OfxParser().parse(StringIO(ofx_content))
+    actual = ofxstream.StatementReader(StringIO(ofx_content)).ofx
+    assert actual.account.statement.transactions == []
+    assert actual.account.statement.balance == expected.account.statement.balance
+    assert actual.account.statement.balance_date == expected.account.statement.balance_date
+    assert actual.account.account_id == expected.account.account_id
+
+
+def test_statement_reader___unterminated_transaction(ofx_content):
+    truncated = ofx_content[:ofx_content.rindex('</STMTTRN>')]
+    with pytest.raises(ofxstream.OfxParserException):
+        list(ofxstream.StatementReader(StringIO(truncated)).transactions())
@@ -0,0 +1,37 @@
+import pytest
+from florin.db import get_engine
+from florin.db.pragmas import get_sqlite_pragmas
+
+
+def test_get_sqlite_pragmas___performance_profile_by_default():
+    pragmas = dict(get_sqlite_pragmas({}))
+    assert pragmas['journal_mode'] == 'WAL'
+    assert pragmas['synchronous'] == 'NORMAL'
+    assert pragmas['temp_store'] == 'MEMORY'
+
+
+def test_get_sqlite_pragmas___default_profile():
+    assert get_sqlite_pragmas({'SQLITE_PROFILE': 'default'}) == []
+
+
+def test_get_sqlite_pragmas___overrides():
+    pragmas = dict(get_sqlite_pragmas({'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': ''}))
+    assert pragmas['synchronous'] == 'FULL'
+    assert 'mmap_size' not in pragmas
+
+
+@pytest.mark.parametrize('environ', [
+    {'SQLITE_PROFILE': 'turbo'},
+    {'SQLITE_JOURNAL_MODE': 'WAL; DROP TABLE transactions'},
+])
+def test_get_sqlite_pragmas___invalid(environ):
+    with pytest.raises(ValueError):
+        get_sqlite_pragmas(environ)
+
+
+def test_get_engine___pragmas_applied_on_connect(tmpdir):
+    engine = get_engine(str(tmpdir.join('test.sqlite')),
+                        pragmas=[('journal_mode', 'WAL'), ('synchronous', 'NORMAL')])
+    with engine.connect() as conn:
+        assert conn.execute('PRAGMA journal_mode').scalar() == 'wal'
+        assert conn.execute('PRAGMA synchronous').scalar() == 1
@@ -0,0 +1,36 @@
+import datetime
+import pytest
+from florin.db import AccountBalance, Transaction, get_read_model
+
+
+@pytest.fixture
+def session(session):
+    session.add(AccountBalance(account_id=1, date=datetime.date(2017, 1, 31), balance=12.5))
+    session.add_all(Transaction(date=datetime.date(2017, 1, 1) + datetime.timedelta(days=i), info=None,
+                                payee='PAYEE {}'.format(i), memo=u'MEMO \xe9', amount=i - 2.25, category_id=65535,
+                                transaction_type='debit', account_id=1, checksum=str(i))
+                    for i in xrange(5))
+    session.commit()
+    return session
+
+
+@pytest.mark.parametrize('model', [Transaction, AccountBalance])
+def test_to_dict___same_as_model(session, model):
+    read_model = get_read_model(model)
+    query = read_model.query(session).order_by(model.id)
+    assert [read_model.to_dict(row) for row in read_model.all(session, query)] == [
+        instance.to_dict() for instance in session.query(model).order_by(model.id)]
+
+
+def test_all___namedtuples(session):
+    read_model = get_read_model(Transaction, ['id', 'payee'])
+    rows = read_model.all(session, read_model.query(session).filter(Transaction.id <= 2).order_by(Transaction.id))
+    assert rows == [(1, 'PAYEE 0'), (2, 'PAYEE 1')]
+    assert [row.payee for row in rows] == ['PAYEE 0', 'PAYEE 1']
+    assert get_read_model(Transaction, ['id', 'payee']) is read_model
+
+
+def test_iter_batches(session):
+    read_model = get_read_model(Transaction)
+    batches = read_model.iter_batches(session, read_model.query(session).order_by(Transaction.id), 2)
+    assert [[row.id for row in rows] for rows in batches] == [[1, 2], [3, 4], [5]]
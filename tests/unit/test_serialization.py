@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import pytest
+from decimal import Decimal
+from florin import serialization
+from florin.serialization import MyJSONEncoder
+from florin.db import Transaction
+
+
+def _data():
+    transaction = Transaction(id=1, date=datetime.date(2017, 3, 31), info=None, payee='Cafe', memo='memo',
+                              amount=-12.3, transaction_type='debit', category_id=65535)
+    return {
+        'transactions': [transaction, transaction.to_dict()],
+        'numbers': [0, -1, 2 ** 70, 0.1, 1e-7, 1.0 / 3, float('nan'), float('inf'), -float('inf'), True, False],
+        'decimals': [Decimal('0'), Decimal('1.005'), Decimal('-3.14159')],
+        'dates': [datetime.date(2017, 1, 1), datetime.datetime(2017, 1, 2, 3, 4, 5), datetime.date(2017, 1, 1)],
+        'empty': [[], {}, (), ''],
+        'strings': [u'Caf\xe9', u'\u2603', '\x00\t'],
+        'nested': {'b': [{'z': None, 'a': ('x', u'☃')}], 'a': {1: 'int key', 'c': '"quoted"\n'}},
+    }
+
+
+@pytest.mark.parametrize('indent, separators', [(2, (', ', ': ')), (None, (',', ':')), (None, None)])
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+def test_dumps___same_as_json(indent, separators, ensure_ascii):
+    expected = json.dumps(_data(), cls=MyJSONEncoder, indent=indent, separators=separators, sort_keys=True,
+                          ensure_ascii=ensure_ascii)
+    actual = serialization.dumps(_data(), default=serialization.make_default(MyJSONEncoder().default),
+                                 indent=indent, separators=separators, sort_keys=True, ensure_ascii=ensure_ascii)
+    assert actual == expected
+    assert type(actual) == type(expected)
+
+
+def test_dumps___unknown_objects_go_to_fallback():
+    with pytest.raises(TypeError):
+        serialization.dumps({'a': object()}, default=serialization.make_default(MyJSONEncoder().default))
+
+
+@pytest.mark.parametrize('indent, separators', [(2, (', ', ': ')), (None, (',', ':'))])
+def test_iterdumps___same_as_dumps(indent, separators):
+    def data():
+        return dict(_data(),
+                    stream=serialization.Stream(iter(_data()['numbers'])),
+                    empty_stream=serialization.Stream(iter([])),
+                    nested=[{'stream': serialization.Stream({'i': i, 's': serialization.Stream([i])}
+                                                            for i in xrange(5))}])
+
+    kwargs = dict(default=serialization.make_default(MyJSONEncoder().default), indent=indent,
+                  separators=separators, sort_keys=True)
+    expected = json.dumps(dict(data(), stream=_data()['numbers'], empty_stream=[],
+                               nested=[{'stream': [{'i': i, 's': [i]} for i in xrange(5)]}]),
+                          cls=MyJSONEncoder, indent=indent, separators=separators, sort_keys=True)
+    assert serialization.dumps(data(), **kwargs) == expected
+    assert ''.join(serialization.iterdumps(data(), batch_size=2, **kwargs)) == expected
+
+
+def test_iterdumps___consumes_streams_a_batch_at_a_time():
+    consumed = []
+
+    def rows():
+        for i in xrange(10):
+            consumed.append(i)
+            yield {'id': i}
+
+    chunks = serialization.iterdumps({'total': 10, 'rows': serialization.Stream(rows())},
+                                     default=serialization.make_default(MyJSONEncoder().default), batch_size=4)
+    assert next(chunks) == '{"rows": '
+    assert consumed == []
+    next(chunks)
+    assert consumed == [0, 1, 2, 3]
+    assert ''.join(chunks).endswith('], "total": 10}')
+    assert len(consumed) == 10
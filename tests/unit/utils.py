@@ -0,0 +1,27 @@
+import datetime
+import os
+import uuid
+from florin import db
+
+
+OFX_FIXTURE_PATH = os.path.join(os.path.dirname(__file__), '../integration/fixtures/reports.ofx')
+
+
+def date(day):
+    return datetime.date(2017, 1, 1) + datetime.timedelta(days=day)
+
+
+def add_transaction(session, day=0, amount=1, category_id=1, account_id=1):
+    transaction = db.Transaction(date=date(day), payee='PAYEE', amount=amount, category_id=category_id,
+                                 transaction_type='debit', account_id=account_id, checksum=uuid.uuid4().hex)
+    session.add(transaction)
+    return transaction
+
+
+def add_file_upload(session, id=1):
+    """An upload of the OFX fixture, not linked to any account yet"""
+    with open(OFX_FIXTURE_PATH) as fh:
+        file_upload = db.FileUpload(id=id, filename='reports.ofx', uploaded_at=datetime.datetime.utcnow(),
+                                    file_content=fh.read())
+    session.add(file_upload)
+    return file_upload